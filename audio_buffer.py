@@ -0,0 +1,59 @@
+import numpy as np
+import soundfile
+
+
+def read_audio(path):
+    ''' Decode an audio file into a sample buffer.
+    Args:
+        path (str): The path to the audio file.
+    Returns:
+        numpy.ndarray: float32 samples in [-1.0, 1.0], shaped (frames,) for mono or (frames, channels).
+        int: Sample rate
+    '''
+    samples, sample_rate = soundfile.read(path, dtype='float32')
+    return samples, sample_rate
+
+
+def write_audio(path, samples, sample_rate):
+    ''' Encode a sample buffer as a 16-bits wav file.
+    Args:
+        path (str): The path to the wav file.
+        samples (numpy.ndarray): float samples in [-1.0, 1.0], values outside the range are clipped.
+        sample_rate (int): The sample rate of the samples.
+    '''
+    soundfile.write(path, to_pcm16(samples), sample_rate, subtype='PCM_16')
+
+
+def to_mono(samples):
+    ''' Down-mix a sample buffer to a single channel by averaging the channels.
+    Args:
+        samples (numpy.ndarray): Samples shaped (frames,) or (frames, channels).
+    Returns:
+        numpy.ndarray: Samples shaped (frames,).
+    '''
+    if samples.ndim == 1:
+        return samples
+    return samples.mean(axis=1, dtype=np.float32)
+
+
+def to_pcm16(samples):
+    ''' Convert float samples in [-1.0, 1.0] to 16-bits pcm samples.
+    Args:
+        samples (numpy.ndarray): float samples, values outside the range are clipped.
+    Returns:
+        numpy.ndarray: int16 samples with the same shape.
+    '''
+    scaled = np.clip(samples, -1.0, 32767 / 32768) * 32768
+    return np.rint(scaled).astype(np.int16)
+
+
+def from_pcm16(pcm):
+    ''' Convert 16-bits pcm data to float samples in [-1.0, 1.0].
+    Args:
+        pcm (bytes or numpy.ndarray): Raw little-endian pcm data or int16 samples.
+    Returns:
+        numpy.ndarray: float32 samples.
+    '''
+    if not isinstance(pcm, np.ndarray):
+        pcm = np.frombuffer(pcm, dtype=np.int16)
+    return pcm.astype(np.float32) / 32768
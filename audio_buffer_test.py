@@ -0,0 +1,38 @@
+import audio_buffer
+import numpy as np
+import os
+import tempfile
+import unittest
+
+
+class TestAudioBuffer(unittest.TestCase):
+    def test_pcm16_round_trip(self):
+        pcm = np.array([-32768, -1, 0, 1, 32767], dtype=np.int16)
+        samples = audio_buffer.from_pcm16(pcm.tobytes())
+
+        self.assertEqual(np.float32, samples.dtype)
+        self.assertTrue((audio_buffer.to_pcm16(samples) == pcm).all())
+
+    def test_to_pcm16_clips(self):
+        pcm = audio_buffer.to_pcm16(np.array([-2.0, 2.0], dtype=np.float32))
+        self.assertEqual([-32768, 32767], pcm.tolist())
+
+    def test_to_mono(self):
+        samples = np.array([[0.5, -0.5], [0.25, 0.75]], dtype=np.float32)
+        self.assertEqual([0.0, 0.5], audio_buffer.to_mono(samples).tolist())
+        self.assertIs(audio_buffer.to_mono(samples[:, 0]).base, samples)
+
+    def test_write_and_read_audio(self):
+        samples = np.linspace(-1, 1, 400, dtype=np.float32).reshape(-1, 2)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'output.wav')
+            audio_buffer.write_audio(path, samples, 16000)
+            read_samples, sample_rate = audio_buffer.read_audio(path)
+
+        self.assertEqual(16000, sample_rate)
+        self.assertEqual(samples.shape, read_samples.shape)
+        self.assertTrue(np.allclose(samples, read_samples, atol=1 / 32768))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,17 +1,150 @@
 import argparse
 import sys
+import threading
 
-from spleeter.separator import Separator
+import numpy as np
+
+SAMPLE_RATE = 44100
+# Silence between the inputs of a batch, a few STFT windows so the stems of one input do not bleed into the next.
+BATCH_GAP = 4 * 4096
+
+_parser = argparse.ArgumentParser(description="Do something.")
+_parser.add_argument("-input_path", "--input_path", type=str, default='', required=True)
+_parser.add_argument("-output_directory", "--output_directory", type=str, default='', required=True)
+
+_separators = {}
+_separators_lock = threading.Lock()
 
 
 def main(args):
-    parser = argparse.ArgumentParser(description="Do something.")
-    parser.add_argument("-input_path", "--input_path", type=str, default='', required=True)
-    parser.add_argument("-output_directory", "--output_directory", type=str, default='', required=True)
-    separator = Separator('spleeter:2stems')
-    args = parser.parse_args(args)
+    args = _parser.parse_args(args)
+    separator = get_separator()
     separator.separate_to_file(args.input_path, args.output_directory)
 
 
+def get_separator(model='spleeter:2stems'):
+    ''' Get the shared Separator of the given model.
+    The first call creates it, so the TensorFlow graph and the model weights are loaded once per process and every
+    following separation reuses the same model session. spleeter, and TensorFlow with it, is only imported then,
+    so importing this module stays cheap.
+
+    Args:
+        model (str): The spleeter model configuration.
+    Returns:
+        SeparatorService: The shared separator.
+    '''
+    with _separators_lock:
+        if model not in _separators:
+            from spleeter.separator import Separator
+            _separators[model] = SeparatorService(Separator(model))
+        return _separators[model]
+
+
+class SeparatorService(object):
+    ''' A loaded Separator that serves many separation requests.
+    The model session is not thread-safe, so concurrent requests are run one after another.
+
+    Args:
+        separator (spleeter.separator.Separator): The separator to share.
+    '''
+
+    def __init__(self, separator):
+        from spleeter.audio.adapter import AudioAdapter
+        self.separator = separator
+        self.audio_adapter = AudioAdapter.default()
+        self.lock = threading.Lock()
+
+    def separate_to_file(self, input_path, output_directory):
+        with self.lock:
+            self.separator.separate_to_file(input_path, output_directory)
+
+    def separate_vocals(self, input_path):
+        ''' Separate the vocals of one audio file, see separate_vocals. '''
+        return self.separate_vocals_batch([input_path])[0]
+
+    def separate_vocals_batch(self, input_paths):
+        ''' Separate the vocals of several audio files with a single pass through the model.
+        The waveforms are joined with a short silence between them, separated together and split again.
+
+        Args:
+            input_paths (list(str)): The paths to the original audio files.
+        Returns:
+            list((numpy.ndarray, int)): float32 vocal samples shaped (frames, 2) and the sample rate, per input.
+        '''
+        waveforms = [self.audio_adapter.load(input_path, sample_rate=SAMPLE_RATE)[0] for input_path in input_paths]
+        if not waveforms:
+            return []
+        gap = np.zeros((BATCH_GAP, waveforms[0].shape[1]), dtype=np.float32)
+        batch = [waveforms[0]]
+        for waveform in waveforms[1:]:
+            batch.extend([gap, waveform])
+        with self.lock:
+            vocals = self.separator.separate(np.concatenate(batch))['vocals']
+
+        results = []
+        offset = 0
+        for waveform in waveforms:
+            results.append((vocals[offset:offset + len(waveform)].astype(np.float32), SAMPLE_RATE))
+            offset += len(waveform) + BATCH_GAP
+        return results
+
+    def separate_vocals_chunked(self, input_path, chunk_duration=30.0, overlap_duration=1.0):
+        ''' Separate the vocals of a long audio file window by window.
+        Windows of chunk_duration seconds that overlap by overlap_duration seconds are separated one at a time, and
+        the overlapping parts are crossfaded together. Only one window is decoded and separated at a time, and each
+        completed part is yielded as soon as it is ready.
+
+        Args:
+            input_path (str): The path to the original audio file.
+            chunk_duration (float): The duration of each window in seconds.
+            overlap_duration (float): The duration shared by consecutive windows in seconds.
+        Yields:
+            numpy.ndarray: The next float32 vocal samples shaped (frames, 2), at SAMPLE_RATE.
+        '''
+        chunk_size = int(chunk_duration * SAMPLE_RATE)
+        overlap = int(overlap_duration * SAMPLE_RATE)
+        step = chunk_size - overlap
+        previous_tail = None
+        index = 0
+        while True:
+            waveform, _ = self.audio_adapter.load(input_path, offset=index * step / SAMPLE_RATE,
+                                                  duration=chunk_duration, sample_rate=SAMPLE_RATE)
+            if len(waveform) == 0:
+                if previous_tail is not None and len(previous_tail) > 0:
+                    yield previous_tail
+                return
+            with self.lock:
+                vocals = self.separator.separate(waveform)['vocals'].astype(np.float32)
+            if previous_tail is not None:
+                crossfade = min(len(previous_tail), len(vocals))
+                fade_in = np.linspace(0, 1, crossfade, dtype=np.float32)[:, np.newaxis]
+                vocals[:crossfade] = previous_tail[:crossfade] * (1 - fade_in) + vocals[:crossfade] * fade_in
+            if len(waveform) < chunk_size:
+                yield vocals
+                return
+            yield vocals[:len(vocals) - overlap]
+            previous_tail = vocals[len(vocals) - overlap:]
+            index += 1
+
+
+def separate_vocals_chunked(input_path, chunk_duration=30.0, overlap_duration=1.0):
+    ''' Separate the vocals of a long audio file in overlapping windows, see
+    SeparatorService.separate_vocals_chunked.
+    '''
+    return get_separator().separate_vocals_chunked(input_path, chunk_duration, overlap_duration)
+
+
+def separate_vocals(input_path):
+    ''' Separate the vocals from the background music without writing any file.
+
+    Args:
+        input_path (str): The path to the original audio file.
+    Returns:
+        numpy.ndarray: float32 vocal samples shaped (frames, 2).
+        int: Sample rate
+    '''
+    return get_separator().separate_vocals(input_path)
+
+
 if __name__ == '__main__':
     main(sys.argv[1:])
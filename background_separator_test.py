@@ -1,3 +1,4 @@
+import numpy as np
 import unittest
 import background_separator
 
@@ -19,6 +20,46 @@ class TestNormalizer(unittest.TestCase):
             background_separator.main('-input_path', 'input.wav')
             self.assertTrue('the following arguments are required: -input_path/--input_path' in context.exception)
 
+    def test_get_separator_is_shared(self):
+        self.assertIs(background_separator.get_separator(), background_separator.get_separator())
+        self.assertIsNot(background_separator.get_separator(), background_separator.get_separator('spleeter:4stems'))
+
+    def test_separate_vocals_batch(self):
+        waveforms = {
+            'first.mp3': np.ones((100, 2), dtype=np.float32),
+            'second.mp3': np.full((50, 2), 2, dtype=np.float32),
+        }
+        service = background_separator.get_separator()
+        with patch.object(service.audio_adapter, 'load', side_effect=lambda path, sample_rate: (waveforms[path], 0)):
+            with patch('spleeter.separator.Separator.separate', side_effect=lambda waveform: {'vocals': waveform / 2}
+                       ) as mock_separate:
+                results = service.separate_vocals_batch(['first.mp3', 'second.mp3'])
+                mock_separate.assert_called_once()
+
+        self.assertEqual(2, len(results))
+        self.assertTrue((results[0][0] == 0.5).all())
+        self.assertTrue((results[1][0] == 1).all())
+        self.assertEqual((50, 2), results[1][0].shape)
+        self.assertEqual(background_separator.SAMPLE_RATE, results[1][1])
+
+    def test_separate_vocals_chunked(self):
+        sample_rate = background_separator.SAMPLE_RATE
+        waveform = np.random.RandomState(0).rand(sample_rate * 5, 2).astype(np.float32)
+
+        def load(path, offset, duration, sample_rate):
+            start = int(round(offset * sample_rate))
+            return waveform[start:start + int(duration * sample_rate)], sample_rate
+
+        service = background_separator.get_separator()
+        with patch.object(service.audio_adapter, 'load', side_effect=load):
+            with patch('spleeter.separator.Separator.separate', side_effect=lambda w: {'vocals': w.copy()}
+                       ) as mock_separate:
+                chunks = list(service.separate_vocals_chunked('input.mp3', chunk_duration=2.0, overlap_duration=0.5))
+
+        self.assertEqual(4, mock_separate.call_count)
+        self.assertEqual(4, len(chunks))
+        self.assertTrue(np.allclose(waveform, np.concatenate(chunks), atol=1e-6))
+
 
 if __name__ == '__main__':
     unittest.main()
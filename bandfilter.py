@@ -1,8 +1,31 @@
+import contextlib
+import functools
+import wave
+
 import numpy as np
-from scipy.signal import butter, lfilter
+from scipy.signal import butter, iirnotch, lfilter, sosfilt, tf2sos
 from scipy.io import wavfile
 
 
+def memoized_design(design):
+    ''' Memoize a filter design function.
+    Every call returns its own copy of the cached coefficients, so a caller can not change the design of the others.
+    '''
+    cached_design = functools.lru_cache(maxsize=64)(design)
+
+    @functools.wraps(design)
+    def wrapper(*args, **kwargs):
+        coefficients = cached_design(*args, **kwargs)
+        if isinstance(coefficients, tuple):
+            return tuple(c.copy() for c in coefficients)
+        return coefficients.copy()
+
+    wrapper.cache_info = cached_design.cache_info
+    wrapper.cache_clear = cached_design.cache_clear
+    return wrapper
+
+
+@memoized_design
 def butter_bandpass(lowcut, highcut, samplerate, order=5):
     nyq = 0.5 * samplerate
     low = lowcut / nyq
@@ -11,6 +34,120 @@ def butter_bandpass(lowcut, highcut, samplerate, order=5):
     return b, a
 
 
+@memoized_design
+def butter_bandpass_sos(lowcut, highcut, samplerate, order=5):
+    ''' Same design as butter_bandpass, as second-order sections.
+    Cascaded biquads stay stable at low cutoffs and high orders, where the (b, a) polynomials lose precision.
+    '''
+    nyq = 0.5 * samplerate
+    low = lowcut / nyq
+    high = highcut / nyq
+    return butter(order, [low, high], btype='band', output='sos')
+
+
+@memoized_design
+def butter_highpass_sos(cutoff, samplerate, order=2):
+    ''' High-pass Butterworth design as second-order sections, e.g. to remove rumble. '''
+    return butter(order, cutoff / (0.5 * samplerate), btype='high', output='sos')
+
+
+@memoized_design
+def notch_sos(frequency, samplerate, quality=5.0):
+    ''' Notch design as second-order sections, e.g. a de-esser around the sibilance band. '''
+    b, a = iirnotch(frequency, quality, fs=samplerate)
+    return tf2sos(b, a)
+
+
+FILTER_DESIGNS = {
+    'bandpass': butter_bandpass_sos,
+    'highpass': butter_highpass_sos,
+    'notch': notch_sos,
+}
+
+
+class FilterBank(object):
+    ''' Several filters applied in a single pass over the data.
+    The second-order sections of every filter are cascaded into one design, so the data is read and filtered once
+    however many filters are configured. The designs are memoized per sample rate.
+
+    Args:
+        filters (list((str, dict))): The kind of each filter, one of FILTER_DESIGNS, and the keyword arguments of
+                                     its design function other than samplerate. For example
+                                     [('highpass', {'cutoff': 80}), ('bandpass', {'lowcut': 100, 'highcut': 6000})].
+    '''
+
+    def __init__(self, filters):
+        for kind, _ in filters:
+            if kind not in FILTER_DESIGNS:
+                raise ValueError('Unknown filter kind: %s' % kind)
+        self.filters = filters
+
+    def sos(self, samplerate):
+        ''' The cascaded second-order sections of every filter at the given sample rate. '''
+        return np.vstack([FILTER_DESIGNS[kind](samplerate=samplerate, **params) for kind, params in self.filters])
+
+    def block_filter(self, samplerate, channel_shape=()):
+        ''' Create the state for filtering consecutive blocks.
+        Args:
+            samplerate (int): The sample rate of the blocks.
+            channel_shape (tuple): The shape of a block after the time axis, () for mono or (channels,).
+        Returns:
+            BlockFilter: A filter with zeroed state.
+        '''
+        return BlockFilter(self.sos(samplerate), channel_shape)
+
+    def filter_file(self, input_path, output_path, block_size=65536):
+        ''' Filter a wav file in bounded memory.
+        The input is memory-mapped and filtered block by block, carrying the filter state from one block to the
+        next, so the output equals filtering the whole signal at once. Every block is converted into a reused int16
+        buffer and appended to the output, so peak memory depends on block_size only.
+        The output path must differ from the input path.
+
+        Args:
+            input_path (str): The path to the original wav file, in 16-bits, 32-bits or float format.
+            output_path (str): The path to the new 16-bits wav file.
+            block_size (int): The number of frames filtered at a time.
+        '''
+        samplerate, data = wavfile.read(input_path, mmap=True)
+        block_filter = self.block_filter(samplerate, data.shape[1:])
+        scale = pcm16_scale(data.dtype)
+        output = np.empty((block_size,) + data.shape[1:], dtype=np.int16)
+        with contextlib.closing(wave.open(output_path, 'wb')) as wf:
+            wf.setnchannels(1 if data.ndim == 1 else data.shape[1])
+            wf.setsampwidth(2)
+            wf.setframerate(samplerate)
+            for start in range(0, len(data), block_size):
+                block = data[start:start + block_size]
+                filtered = block_filter.process(block)
+                if scale != 1:
+                    filtered *= scale
+                np.clip(filtered, -32768, 32767, out=filtered)
+                block_output = output[:len(block)]
+                np.copyto(block_output, filtered, casting='unsafe')
+                wf.writeframesraw(block_output)
+
+
+class BlockFilter(object):
+    ''' Second-order sections filtering of consecutive blocks of one signal.
+    Args:
+        sos (numpy.ndarray): The second-order sections.
+        channel_shape (tuple): The shape of a block after the time axis, () for mono or (channels,).
+    '''
+
+    def __init__(self, sos, channel_shape=()):
+        self.sos = sos
+        # sosfilt works on every channel at once when the state has one column per channel.
+        self.zi = np.zeros((sos.shape[0], 2) + tuple(channel_shape))
+
+    def process(self, block):
+        ''' Filter the next block along its time axis.
+        Returns:
+            numpy.ndarray: The filtered float64 block.
+        '''
+        filtered, self.zi = sosfilt(self.sos, block, axis=0, zi=self.zi)
+        return filtered
+
+
 def butter_bandpass_filter(data, lowcut, highcut, samplerate, order=5):
     b, a = butter_bandpass(lowcut, highcut, samplerate, order=order)
     y = lfilter(b, a, data)
@@ -31,5 +168,49 @@ def filter_noise(input_path, output_path, lowcut, highcut):
         highcut (ing): High-end Hz rate of the filter.
     '''
     samplerate, data = wavfile.read(input_path)
-    filtered_data = np.apply_along_axis(bandpass_filter, 0, data, lowcut, highcut, samplerate).astype('int16')
+    filtered_data = filter_noise_samples(data, samplerate, lowcut, highcut).astype('int16')
     wavfile.write(output_path, samplerate, filtered_data)
+
+
+def filter_noise_samples(samples, samplerate, lowcut, highcut):
+    ''' Use band-pass filter to filter noise from a sample buffer.
+    Every channel is filtered independently along the time axis.
+
+    Args:
+        samples (numpy.ndarray): Samples shaped (frames,) or (frames, channels).
+        samplerate (int): The sample rate of the samples.
+        lowcut (int): Low-end Hz rate of the filter.
+        highcut (int): High-end Hz rate of the filter.
+    Returns:
+        numpy.ndarray: The filtered samples as float64.
+    '''
+    b, a = butter_bandpass(lowcut, highcut, samplerate, order=6)
+    return lfilter(b, a, samples, axis=0)
+
+
+def filter_noise_blocks(input_path, output_path, lowcut, highcut, block_size=65536, order=6):
+    ''' Use band-pass filter to filter noise, in bounded memory.
+    Second-order sections version of filter_noise that works block by block on the memory-mapped input, see
+    FilterBank.filter_file.
+
+    Args:
+        input_path (str): The path to the original wav file, in 16-bits, 32-bits or float format.
+        output_path (str): The path to the new 16-bits wav file.
+        lowcut (int): Low-end Hz rate of the filter.
+        highcut (int): High-end Hz rate of the filter.
+        block_size (int): The number of frames filtered at a time.
+        order (int): The order of the Butterworth filter.
+    '''
+    filter_bank = FilterBank([('bandpass', {'lowcut': lowcut, 'highcut': highcut, 'order': order})])
+    filter_bank.filter_file(input_path, output_path, block_size)
+
+
+def pcm16_scale(dtype):
+    ''' The factor that maps samples of the given wav dtype to the 16-bits range. '''
+    if np.issubdtype(dtype, np.floating):
+        return 32768.0
+    if dtype == np.int32:
+        return 1.0 / 65536
+    if dtype == np.int16:
+        return 1
+    raise ValueError('Unsupported wav sample format: %s' % dtype)
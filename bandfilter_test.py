@@ -1,7 +1,11 @@
 import bandfilter
+import numpy as np
+import os
+import tempfile
 import unittest
 
 from scipy.io import wavfile
+from scipy.signal import sosfilt
 
 
 class TestBandfilter(unittest.TestCase):
@@ -26,3 +30,82 @@ class TestBandfilter(unittest.TestCase):
 
         with self.assertRaises(FileNotFoundError):
             bandfilter.filter_noise(input_path, output_path, lowcut, highcut)
+
+    def test_filter_noise_samples(self):
+        samplerate = 16000
+        data = np.random.RandomState(0).randint(-10000, 10000, size=(samplerate, 2)).astype('int16')
+
+        filtered_data = bandfilter.filter_noise_samples(data, samplerate, 100, 6000)
+        expected_data = np.apply_along_axis(bandfilter.bandpass_filter, 0, data, 100, 6000, samplerate)
+
+        self.assertEqual(data.shape, filtered_data.shape)
+        self.assertTrue((expected_data.astype('int16') == filtered_data.astype('int16')).all())
+
+    def test_filter_noise_blocks(self):
+        samplerate = 16000
+        data = np.random.RandomState(0).randint(-10000, 10000, size=(samplerate, 2)).astype('int16')
+        sos = bandfilter.butter_bandpass_sos(100, 6000, samplerate, order=6)
+        expected_data = np.clip(sosfilt(sos, data, axis=0), -32768, 32767).astype('int16')
+
+        with tempfile.TemporaryDirectory() as directory:
+            input_path = os.path.join(directory, 'input.wav')
+            output_path = os.path.join(directory, 'output.wav')
+            wavfile.write(input_path, samplerate, data)
+            bandfilter.filter_noise_blocks(input_path, output_path, 100, 6000, block_size=1000)
+            output_samplerate, output_data = wavfile.read(output_path)
+
+        self.assertEqual(samplerate, output_samplerate)
+        self.assertEqual(data.shape, output_data.shape)
+        self.assertTrue((expected_data == output_data).all())
+        lfilter_data = bandfilter.filter_noise_samples(data, samplerate, 100, 6000)
+        self.assertLessEqual(np.abs(lfilter_data - output_data).max(), 2)
+
+    def test_filter_noise_blocks_mono_float(self):
+        samplerate = 8000
+        data = np.random.RandomState(0).uniform(-0.5, 0.5, size=samplerate).astype('float32')
+
+        with tempfile.TemporaryDirectory() as directory:
+            input_path = os.path.join(directory, 'input.wav')
+            output_path = os.path.join(directory, 'output.wav')
+            wavfile.write(input_path, samplerate, data)
+            bandfilter.filter_noise_blocks(input_path, output_path, 100, 3000, block_size=777)
+            _, output_data = wavfile.read(output_path)
+
+        sos = bandfilter.butter_bandpass_sos(100, 3000, samplerate, order=6)
+        expected_data = sosfilt(sos, data.astype('float64')) * 32768
+        self.assertEqual(np.int16, output_data.dtype)
+        self.assertEqual(data.shape, output_data.shape)
+        self.assertLessEqual(np.abs(expected_data - output_data).max(), 1)
+
+    def test_filter_designs_are_memoized(self):
+        bandfilter.butter_bandpass_sos.cache_clear()
+        sos = bandfilter.butter_bandpass_sos(100, 6000, 16000, order=6)
+        sos[0, 0] = 0
+        cached_sos = bandfilter.butter_bandpass_sos(100, 6000, 16000, order=6)
+
+        self.assertEqual(1, bandfilter.butter_bandpass_sos.cache_info().hits)
+        self.assertNotEqual(0, cached_sos[0, 0])
+        b, a = bandfilter.butter_bandpass(100, 6000, 16000, order=6)
+        self.assertEqual(13, len(b))
+
+    def test_filter_bank(self):
+        samplerate = 16000
+        data = np.random.RandomState(0).randn(samplerate, 2)
+        filter_bank = bandfilter.FilterBank([
+            ('highpass', {'cutoff': 80}),
+            ('bandpass', {'lowcut': 100, 'highcut': 6000, 'order': 6}),
+            ('notch', {'frequency': 5000, 'quality': 5.0}),
+        ])
+        expected_data = sosfilt(bandfilter.butter_highpass_sos(80, samplerate), data, axis=0)
+        expected_data = sosfilt(bandfilter.butter_bandpass_sos(100, 6000, samplerate, order=6), expected_data, axis=0)
+        expected_data = sosfilt(bandfilter.notch_sos(5000, samplerate, quality=5.0), expected_data, axis=0)
+
+        block_filter = filter_bank.block_filter(samplerate, (2,))
+        filtered_data = np.concatenate([block_filter.process(data[start:start + 1000])
+                                        for start in range(0, len(data), 1000)])
+
+        self.assertTrue(np.allclose(expected_data, filtered_data))
+
+    def test_filter_bank_unknown_kind(self):
+        with self.assertRaises(ValueError):
+            bandfilter.FilterBank([('lowshelf', {})])
@@ -0,0 +1,226 @@
+''' Throughput and memory benchmarks of the audio stages on synthetic episodes.
+
+Usage:
+    python benchmark.py --durations 60,600 --sample_rates 16000,44100 --cases vad.generate_solo_audio
+    python benchmark.py --compare HEAD~1
+
+Every case runs on generated speech-like audio of each duration and sample rate. It is timed once with
+instrumentation.StageTimer, then run again under tracemalloc for its peak traced memory, which counts numpy buffers
+but not memory allocated by C libraries such as libsndfile. The results are appended to benchmark_results.jsonl
+with the current commit, so runs of different commits can be compared.
+'''
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+import bandfilter
+import instrumentation
+import normalizer
+import numpy as np
+import postprocess
+import resampler
+import soundfile
+import vad
+
+DURATIONS = (60, 600, 3600, 10800)
+SAMPLE_RATES = (16000, 44100, 48000)
+RESULTS_PATH = 'benchmark_results.jsonl'
+
+CASES = {
+    'vad.generate_solo_audio': lambda i, o: vad.generate_solo_audio(i, o, 3),
+    'vad.generate_solo_audio_streaming': lambda i, o: vad.generate_solo_audio_streaming(i, o, 3),
+    'vad.convert_wave_to_meet_vad': vad.convert_wave_to_meet_vad,
+    'vad.convert_to_mono': vad.convert_to_mono,
+    'vad.convert_to_16bit': vad.convert_to_16bit,
+    'resampler.convert_file': lambda i, o: resampler.convert_file(i, o, sample_rate=16000, mono=True),
+    'normalizer.normalize_audio_with_target_dBFS': lambda i, o: normalizer.normalize_audio_with_target_dBFS(
+        i, o, 'wav', -20.0),
+    'normalizer.normalize_audio_streaming': lambda i, o: normalizer.normalize_audio_streaming(i, o, -20.0),
+    'bandfilter.filter_noise': lambda i, o: bandfilter.filter_noise(i, o, 100, 6000),
+    'bandfilter.filter_noise_blocks': lambda i, o: bandfilter.filter_noise_blocks(i, o, 100, 6000),
+    'postprocess.postprocess_file': lambda i, o: postprocess.postprocess_file(i, o, -20.0),
+}
+
+_parser = argparse.ArgumentParser(description='Benchmark the audio stages on synthetic episodes.')
+_parser.add_argument('-durations', '--durations', type=str, default=','.join(str(d) for d in DURATIONS),
+                     help='Comma-separated episode lengths in seconds.')
+_parser.add_argument('-sample_rates', '--sample_rates', type=str, default=','.join(str(r) for r in SAMPLE_RATES))
+_parser.add_argument('-channels', '--channels', type=int, default=2)
+_parser.add_argument('-cases', '--cases', type=str, default=','.join(CASES))
+_parser.add_argument('-no_memory', '--no_memory', action='store_true', help='Skip the tracemalloc runs.')
+_parser.add_argument('-results', '--results', type=str, default=RESULTS_PATH)
+_parser.add_argument('-compare', '--compare', type=str, default=None,
+                     help='Only compare the stored results of the current commit to the ones of this commit.')
+_parser.add_argument('-tolerance', '--tolerance', type=float, default=0.2,
+                     help='Slowdown ratio above which a case is reported as a regression.')
+
+
+def speech_schedule(duration, rng):
+    ''' Alternate talking spells of 2 to 8 seconds with pauses of 0.5 to 3 seconds.
+    Returns:
+        numpy.ndarray: The boundaries in seconds, talking from boundaries[2k] to boundaries[2k + 1].
+        numpy.ndarray: The pitch in Hz of every talking spell.
+    '''
+    boundaries = [rng.uniform(0.5, 3.0)]
+    while boundaries[-1] < duration:
+        boundaries.append(boundaries[-1] + rng.uniform(2.0, 8.0))
+        boundaries.append(boundaries[-1] + rng.uniform(0.5, 3.0))
+    return np.array(boundaries), rng.uniform(100.0, 250.0, len(boundaries) // 2 + 1)
+
+
+def synthesize_block(start, frames, sample_rate, channels, boundaries, pitches, rng):
+    ''' The samples from frame start on of a synthetic episode, see generate_episode. '''
+    time = (start + np.arange(frames)) / sample_rate
+    spell = np.searchsorted(boundaries, time, side='right')
+    talking = spell % 2 == 1
+    pitch = pitches[spell // 2]
+    phase = 2 * np.pi * pitch * time
+    # A few harmonics of the pitch, modulated at a syllable rate of 4 Hz.
+    voice = (np.sin(phase) + 0.5 * np.sin(2 * phase) + 0.25 * np.sin(3 * phase)) / 1.75
+    voice *= 0.3 * (0.5 + 0.5 * np.sin(2 * np.pi * 4 * time))
+    mono = np.where(talking, voice, 0.0) + 0.003 * rng.randn(frames)
+    return np.repeat(mono[:, np.newaxis], channels, axis=1).astype(np.float32)
+
+
+def generate_episode(path, duration, sample_rate, channels=2, seed=0, block_duration=60):
+    ''' Write a synthetic episode: talking spells with harmonic, syllable-modulated voice, pauses, and a noise floor
+    of about -50 dBFS. It is written in blocks, so even 3 hours take little memory.
+    Args:
+        path (str): The path of the 16-bits wav file.
+        duration (float): The length in seconds.
+        sample_rate (int): The sample rate.
+        channels (int): The number of channels, all carrying the same voice.
+        seed (int): The seed of the random schedule and noise.
+        block_duration (float): The seconds generated at a time.
+    '''
+    rng = np.random.RandomState(seed)
+    boundaries, pitches = speech_schedule(duration, rng)
+    total = int(duration * sample_rate)
+    block_size = int(block_duration * sample_rate)
+    with soundfile.SoundFile(path, 'w', sample_rate, channels, subtype='PCM_16') as output:
+        for start in range(0, total, block_size):
+            frames = min(block_size, total - start)
+            output.write(synthesize_block(start, frames, sample_rate, channels, boundaries, pitches, rng))
+
+
+def current_commit():
+    ''' The current git commit, 'unknown' outside of a git checkout. '''
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def resolve_commit(name):
+    try:
+        return subprocess.check_output(['git', 'rev-parse', name], stderr=subprocess.DEVNULL,
+                                       universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return name
+
+
+def run_case(case, input_path, output_path, duration, memory=True):
+    ''' Run one case on one episode.
+    Args:
+        case (str): The name of the case, a key of CASES.
+        input_path (str): The episode.
+        output_path (str): Where the case writes its output.
+        duration (float): The length of the episode in seconds.
+        memory (bool): Whether to run the case a second time under tracemalloc.
+    Returns:
+        dict: The measurements, see instrumentation.StageTimer, plus peak_traced_bytes.
+    '''
+    with instrumentation.StageTimer(case, audio_duration=duration) as timer:
+        CASES[case](input_path, output_path)
+    result = dict(timer.event)
+    result['peak_traced_bytes'] = None
+    if memory:
+        tracemalloc.start()
+        try:
+            CASES[case](input_path, output_path)
+            result['peak_traced_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def run(durations, sample_rates, channels, cases, results_path, memory=True, stream=sys.stdout):
+    ''' Run every case on an episode of every duration and sample rate, and append the results to results_path. '''
+    commit = current_commit()
+    with tempfile.TemporaryDirectory() as directory:
+        for sample_rate in sample_rates:
+            for duration in durations:
+                input_path = os.path.join(directory, 'episode.wav')
+                generate_episode(input_path, duration, sample_rate, channels)
+                for case in cases:
+                    result = run_case(case, input_path, os.path.join(directory, 'output.wav'), duration, memory)
+                    result.update({
+                        'case': case,
+                        'commit': commit,
+                        'duration': duration,
+                        'sample_rate': sample_rate,
+                        'channels': channels,
+                        'python': platform.python_version(),
+                        'machine': platform.machine(),
+                    })
+                    with open(results_path, 'a') as f:
+                        f.write(json.dumps(result, sort_keys=True) + '\n')
+                    stream.write('{case} {duration}s {sample_rate}Hz: {wall_time:.2f}s, {realtime:.1f}x realtime, '
+                                 'peak traced {memory}\n'.format(realtime=result['realtime_factor'] or 0,
+                                                                 memory=result['peak_traced_bytes'], **result))
+
+
+def load_results(results_path, commit):
+    ''' The last result of every (case, duration, sample rate, channels) stored for a commit. '''
+    results = {}
+    if not os.path.exists(results_path):
+        return results
+    with open(results_path) as f:
+        for line in f:
+            result = json.loads(line)
+            if result['commit'] == commit:
+                key = (result['case'], result['duration'], result['sample_rate'], result['channels'])
+                results[key] = result
+    return results
+
+
+def compare(results_path, reference_commit, commit, tolerance=0.2, stream=sys.stdout):
+    ''' Compare the wall times of two commits.
+    Returns:
+        list(tuple): The keys of the cases that got slower than the tolerance allows.
+    '''
+    reference = load_results(results_path, reference_commit)
+    current = load_results(results_path, commit)
+    regressions = []
+    for key in sorted(set(reference) & set(current)):
+        ratio = current[key]['wall_time'] / reference[key]['wall_time']
+        regressed = ratio > 1 + tolerance
+        if regressed:
+            regressions.append(key)
+        stream.write('{} {}s {}Hz {}ch: {:.2f}x the time of {}{}\n'.format(
+            key[0], key[1], key[2], key[3], ratio, reference_commit[:8], ' REGRESSION' if regressed else ''))
+    return regressions
+
+
+def main(args):
+    args = _parser.parse_args(args)
+    if args.compare is not None:
+        regressions = compare(args.results, resolve_commit(args.compare), current_commit(), args.tolerance)
+        return 1 if regressions else 0
+    cases = args.cases.split(',')
+    unknown = [case for case in cases if case not in CASES]
+    if unknown:
+        _parser.error('unknown cases: ' + ', '.join(unknown))
+    run([float(d) for d in args.durations.split(',')], [int(r) for r in args.sample_rates.split(',')],
+        args.channels, cases, args.results, not args.no_memory)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
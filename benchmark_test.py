@@ -0,0 +1,45 @@
+import benchmark
+import io
+import json
+import numpy as np
+import os
+import soundfile
+import tempfile
+import unittest
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_generate_episode(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'episode.wav')
+            benchmark.generate_episode(path, 20, 16000, channels=2, block_duration=3)
+            samples, sample_rate = soundfile.read(path)
+
+        self.assertEqual(16000, sample_rate)
+        self.assertEqual((20 * 16000, 2), samples.shape)
+        frame_rms = np.sqrt(np.mean(samples[:, 0].reshape(-1, 1600) ** 2, axis=1))
+        # Both pauses at the noise floor and talking spells.
+        self.assertLess(frame_rms.min(), 0.01)
+        self.assertGreater(frame_rms.max(), 0.05)
+
+    def test_run_and_compare(self):
+        with tempfile.TemporaryDirectory() as directory:
+            results_path = os.path.join(directory, 'results.jsonl')
+            benchmark.run([2], [16000], 1, ['bandfilter.filter_noise_blocks'], results_path, stream=io.StringIO())
+            with open(results_path) as f:
+                result = json.loads(f.readline())
+            self.assertEqual('bandfilter.filter_noise_blocks', result['case'])
+            self.assertEqual(2, result['duration'])
+            self.assertGreater(result['wall_time'], 0)
+            self.assertGreater(result['peak_traced_bytes'], 0)
+
+            slower = dict(result, commit='slower', wall_time=result['wall_time'] * 2)
+            with open(results_path, 'a') as f:
+                f.write(json.dumps(slower) + '\n')
+            self.assertEqual([('bandfilter.filter_noise_blocks', 2, 16000, 1)],
+                             benchmark.compare(results_path, result['commit'], 'slower', stream=io.StringIO()))
+            self.assertEqual([], benchmark.compare(results_path, 'slower', result['commit'], stream=io.StringIO()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,212 @@
+''' Download and process podcasts without the GUI.
+
+Usage:
+    python -m cli https://www.youtube.com/watch?v=... episode.mp3 --playlist urls.txt
+
+Every input is a YouTube video, playlist or channel url, or a local audio file. The videos of playlists and channels
+are queued as they are listed, and the ones in --download_archive are skipped. Progress is printed to stdout as one JSON object per line.
+'''
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+import downloader
+import instrumentation
+import pipeline
+import result_cache
+import scheduler
+
+_parser = argparse.ArgumentParser(description='Download and process podcasts without the GUI.')
+_parser.add_argument('inputs', nargs='*', help='YouTube urls or local audio files.')
+_parser.add_argument('-playlist', '--playlist', type=str, default=None,
+                     help='A text file with one url or local file per line.')
+_parser.add_argument('-download_directory', '--download_directory', type=str, default=downloader.DOWNLOAD_DIRECTORY)
+_parser.add_argument('-audio_codec', '--audio_codec', type=str, choices=downloader.AUDIO_CODECS, default='wav',
+                     help='The codec the downloaded audio is converted to, wav skips the lossy mp3 round trip.')
+_parser.add_argument('-min_abr', '--min_abr', type=int, default=downloader.MIN_AUDIO_BITRATE,
+                     help='The lowest audio bitrate in kbps to download, lower ones are only used if nothing is better.')
+_parser.add_argument('-download_archive', '--download_archive', type=str, default=None,
+                     help='A file of the processed video ids, which are skipped. Finished videos are added to it.')
+_parser.add_argument('-ratelimit', '--ratelimit', type=int, default=None,
+                     help='The maximum download rate of every download worker in bytes per second.')
+_parser.add_argument('-sleep_interval', '--sleep_interval', type=float, default=None,
+                     help='The seconds every download worker waits before a download.')
+_parser.add_argument('-output_directory', '--output_directory', type=str, default='denoised/')
+_parser.add_argument('-cache_directory', '--cache_directory', type=str, default='cache/',
+                     help='Where the stage results are cached, an empty string disables the cache.')
+_parser.add_argument('-download_workers', '--download_workers', type=int, default=2)
+_parser.add_argument('-process_workers', '--process_workers', type=int, default=1)
+_parser.add_argument('-vad_workers', '--vad_workers', type=int, default=None)
+_parser.add_argument('-chunk_duration', '--chunk_duration', type=float, default=None)
+_parser.add_argument('-aggressiveness', '--aggressiveness', type=int, default=3)
+_parser.add_argument('-target_dBFS', '--target_dBFS', type=float, default=-20.0)
+_parser.add_argument('-target_LUFS', '--target_LUFS', type=float, default=None)
+_parser.add_argument('-lowcut', '--lowcut', type=int, default=100)
+_parser.add_argument('-highcut', '--highcut', type=int, default=6000)
+_parser.add_argument('-limit', '--limit', action='store_true',
+                     help='Soft-limit the peaks after normalizing instead of clipping them.')
+_parser.add_argument('-metrics_jsonl', '--metrics_jsonl', type=str, default=None,
+                     help='Also append the stage measurements to this JSON lines file.')
+_parser.add_argument('-metrics_prometheus', '--metrics_prometheus', type=str, default=None,
+                     help='Keep the stage totals in this Prometheus text file.')
+
+
+def read_playlist(path):
+    ''' Read the inputs of a playlist file, one per line. Empty lines and lines starting with '#' are skipped. '''
+    with open(path) as f:
+        lines = [line.strip() for line in f]
+    return [line for line in lines if line and not line.startswith('#')]
+
+
+class ProgressPrinter(object):
+    ''' Writes progress events as JSON lines, one complete line at a time from any thread.
+    Args:
+        stream (file): The stream the events are written to.
+    '''
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.lock = threading.Lock()
+
+    def emit(self, event, **values):
+        line = json.dumps(dict(values, event=event, time=time.time()), sort_keys=True)
+        with self.lock:
+            self.stream.write(line + '\n')
+            self.stream.flush()
+
+
+class BatchRunner(object):
+    ''' Runs the inputs through the download and process stages of a scheduler.Scheduler.
+    Args:
+        args (argparse.Namespace): The parsed command line.
+        printer (ProgressPrinter): Where the progress goes.
+    '''
+
+    def __init__(self, args, printer):
+        self.args = args
+        self.printer = printer
+        self.cache = result_cache.ResultCache(args.cache_directory) if args.cache_directory else None
+        sinks = []
+        if args.metrics_jsonl:
+            sinks.append(instrumentation.JsonLinesSink(args.metrics_jsonl))
+        if args.metrics_prometheus:
+            sinks.append(instrumentation.PrometheusSink(args.metrics_prometheus))
+        self.metrics_sink = instrumentation.MultiSink(sinks)
+        self.archive = downloader.DownloadArchive(args.download_archive) if args.download_archive else None
+        self.scheduler = scheduler.Scheduler([
+            scheduler.Stage('download', self.download_job, args.download_workers),
+            scheduler.Stage('process', self.process_job, args.process_workers),
+        ], on_update=self.on_job_update)
+
+    def run(self, inputs):
+        ''' Process the inputs and wait until all of them finished.
+        Returns:
+            list(scheduler.Job): The jobs, in the order of the inputs.
+        '''
+        self.scheduler.start()
+        jobs = []
+        for value in inputs:
+            if os.path.isfile(value):
+                jobs.append(self.scheduler.submit(value))
+                continue
+            for url, video_id in self.expand(value):
+                if self.archive is not None and video_id in self.archive:
+                    self.printer.emit('skipped', url=url, video_id=video_id)
+                    continue
+                jobs.append(self.scheduler.submit(url, data={'video_id': video_id} if video_id else None))
+        self.scheduler.shutdown()
+        return jobs
+
+    def expand(self, url):
+        ''' The videos of a url, see downloader.expand_url. If the url cannot be expanded at all it is yielded as it
+        is, and its download reports the error.
+        '''
+        expanded = False
+        try:
+            for video in downloader.expand_url(url):
+                expanded = True
+                yield video
+        except Exception as e:
+            self.printer.emit('expand_error', url=url, error=repr(e))
+            if not expanded:
+                yield url, None
+
+    def download_job(self, job):
+        if os.path.isfile(job.url):
+            stat = os.stat(job.url)
+            job.data['title'] = os.path.splitext(os.path.basename(job.url))[0]
+            job.data['input_path'] = job.url
+            job.data['cache_key'] = 'file:{}:{}:{}'.format(os.path.abspath(job.url), stat.st_size, stat.st_mtime)
+            return job.url
+
+        def progress_hook(response):
+            job.check_cancelled()
+            self.printer.emit('download', job_id=job.job_id, status=response['status'],
+                              percent=response.get('_percent_str', '').strip())
+
+        with instrumentation.StageTimer('Downloading', self.job_sink(job)):
+            download = downloader.extract_download(job.url, self.args.download_directory, job.data.get('video_id'),
+                                                   codec=self.args.audio_codec)
+            job.data['title'] = download.title
+            job.data['video_id'] = download.video_id
+            job.data['input_path'] = download.path
+            job.data['cache_key'] = download.video_id
+            downloader.download_audio(download, [progress_hook], self.args.min_abr, self.args.ratelimit,
+                                      self.args.sleep_interval)
+        return download.path
+
+    def process_job(self, job):
+        def on_stage(stage):
+            job.check_cancelled()
+            self.printer.emit('stage', job_id=job.job_id, stage=stage)
+
+        os.makedirs(self.args.output_directory, exist_ok=True)
+        output_path = os.path.join(self.args.output_directory, job.data['title'] + '.wav')
+        pipeline.run_pipeline(job.data['input_path'], output_path, self.args.aggressiveness, self.args.target_dBFS,
+                              self.args.lowcut, self.args.highcut, on_stage=on_stage,
+                              vad_workers=self.args.vad_workers, chunk_duration=self.args.chunk_duration,
+                              cache=self.cache, cache_key=job.data.get('cache_key'),
+                              target_LUFS=self.args.target_LUFS, limit=self.args.limit, sink=self.job_sink(job))
+        job.data['output_path'] = output_path
+        if self.archive is not None and job.data.get('video_id'):
+            self.archive.add(job.data['video_id'])
+        return output_path
+
+    def job_sink(self, job):
+        ''' The sink of the stage measurements of a job, printed as 'timing' events and sent to the metrics files. '''
+        def emit(event):
+            event = dict(event, job_id=job.job_id)
+            self.printer.emit('timing', **event)
+            self.metrics_sink.emit(event)
+        return instrumentation.CallbackSink(emit)
+
+    def on_job_update(self, job):
+        stage = self.scheduler.stages[min(job.stage_index, len(self.scheduler.stages) - 1)].name
+        values = {'job_id': job.job_id, 'url': job.url, 'state': job.state, 'stage': stage}
+        if job.error is not None:
+            values['error'] = repr(job.error)
+        if job.state == 'finished':
+            values['output_path'] = job.data.get('output_path')
+        self.printer.emit('job', **values)
+
+
+def main(args, stream=None):
+    ''' Run the command line.
+    Returns:
+        int: The exit status, 1 if any input failed.
+    '''
+    args = _parser.parse_args(args)
+    inputs = list(args.inputs)
+    if args.playlist is not None:
+        inputs += read_playlist(args.playlist)
+    if not inputs:
+        _parser.error('no inputs, give urls, local files or --playlist')
+    jobs = BatchRunner(args, ProgressPrinter(stream or sys.stdout)).run(inputs)
+    return 0 if all(job.state == 'finished' for job in jobs) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,91 @@
+import cli
+import downloader
+import io
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+from unittest.mock import patch
+
+
+class TestCli(unittest.TestCase):
+    def test_read_playlist(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'playlist.txt')
+            with open(path, 'w') as f:
+                f.write('# episodes\nurl1\n\n  url2  \n')
+            self.assertEqual(['url1', 'url2'], cli.read_playlist(path))
+
+    def test_main(self):
+        with tempfile.TemporaryDirectory() as directory:
+            local_path = os.path.join(directory, 'local.mp3')
+            open(local_path, 'w').close()
+            playlist_path = os.path.join(directory, 'playlist.txt')
+            with open(playlist_path, 'w') as f:
+                f.write('url\n')
+            output_directory = os.path.join(directory, 'denoised')
+
+            def run_pipeline(input_path, output_path, *args, **kwargs):
+                kwargs['on_stage']('Removing_Silence')
+
+            stream = io.StringIO()
+            download = downloader.Download('url', 'title', 'abc', directory)
+            with patch('downloader.expand_url', return_value=[('url', 'abc')]), \
+                    patch('downloader.extract_download', return_value=download), \
+                    patch('downloader.download_audio') as mock_download_audio, \
+                    patch('pipeline.run_pipeline', side_effect=run_pipeline) as mock_run_pipeline:
+                status = cli.main([local_path, '--playlist', playlist_path, '--output_directory', output_directory,
+                                   '--cache_directory', ''], stream)
+                mock_download_audio.assert_called_once()
+                input_paths = sorted(call[0][0] for call in mock_run_pipeline.call_args_list)
+
+        events = [json.loads(line) for line in stream.getvalue().splitlines()]
+        finished = [event for event in events if event['event'] == 'job' and event['state'] == 'finished']
+        self.assertEqual(0, status)
+        self.assertEqual(sorted([local_path, download.path]), input_paths)
+        self.assertEqual(sorted([os.path.join(output_directory, 'local.wav'),
+                                 os.path.join(output_directory, 'title.wav')]),
+                         sorted(event['output_path'] for event in finished))
+        self.assertEqual(2, len([event for event in events if event['event'] == 'stage']))
+
+    def test_main_channel_with_archive(self):
+        with tempfile.TemporaryDirectory() as directory:
+            archive_path = os.path.join(directory, 'archive.txt')
+            with open(archive_path, 'w') as f:
+                f.write('youtube a\n')
+            videos = [('url_a', 'a'), ('url_b', 'b')]
+            stream = io.StringIO()
+            with patch('downloader.expand_url', return_value=videos), \
+                    patch('downloader.extract_download',
+                          side_effect=lambda url, directory, video_id, **kwargs: downloader.Download(
+                              url, video_id, video_id, directory)) as mock_extract_download, \
+                    patch('downloader.download_audio'), \
+                    patch('pipeline.run_pipeline'):
+                status = cli.main(['channel', '--download_archive', archive_path, '--output_directory', directory,
+                                   '--cache_directory', ''], stream)
+                mock_extract_download.assert_called_once()
+                self.assertEqual(('url_b', downloader.DOWNLOAD_DIRECTORY, 'b'), mock_extract_download.call_args[0])
+            with open(archive_path) as f:
+                self.assertEqual('youtube a\nyoutube b\n', f.read())
+
+        skipped = [json.loads(line) for line in stream.getvalue().splitlines() if '"skipped"' in line]
+        self.assertEqual(0, status)
+        self.assertEqual(['a'], [event['video_id'] for event in skipped])
+
+    def test_main_failed_input(self):
+        stream = io.StringIO()
+        with patch('downloader.extract_download', side_effect=ValueError('invalid')):
+            status = cli.main(['url', '--cache_directory', ''], stream)
+        failed = [json.loads(line) for line in stream.getvalue().splitlines() if '"failed"' in line]
+
+        self.assertEqual(1, status)
+        self.assertEqual(1, len(failed))
+
+    def test_no_gui_imports(self):
+        self.assertFalse([name for name in sys.modules if name.split('.')[0] in ('kivy', 'kivymd')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,268 @@
+import copy
+import os
+import re
+import threading
+import time
+
+from youtube_dl import YoutubeDL
+
+DOWNLOAD_DIRECTORY = 'download/'
+# The smallest audio-only stream of at least MIN_AUDIO_BITRATE kbps, the best audio-only stream if none is that good,
+# and the best muxed video for sites without audio-only streams.
+MIN_AUDIO_BITRATE = 64
+AUDIO_FORMAT = 'worstaudio[abr>={min_abr}]/bestaudio/best'
+# wav decodes the stream once to the PCM the pipeline works on, mp3 keeps the old smaller but lossy downloads.
+AUDIO_CODECS = ('wav', 'mp3')
+# The youtube_dl extractors of the entries of a channel that are playlists themselves.
+PLAYLIST_EXTRACTORS = ('YoutubeTab', 'YoutubePlaylist', 'YoutubeChannel', 'YoutubeUser')
+# The format urls in the extracted metadata expire after a few hours, so the metadata is not kept longer than this.
+METADATA_TTL = 1800
+
+
+def remove_special_char(text):
+    return re.sub('[^A-Za-z0-9]+', '', text)
+
+
+class Download(object):
+    ''' The audio of one video, before or after it is downloaded.
+    Args:
+        url (str): The url of the video.
+        title (str): The title of the video without special characters, used as the file name.
+        video_id (str): The id of the video.
+        directory (str): The directory the audio is downloaded to.
+        info (dict): The metadata extracted by youtube_dl, the audio is downloaded without extracting it again.
+        codec (str): The codec the audio is converted to, one of AUDIO_CODECS.
+    '''
+
+    def __init__(self, url, title, video_id, directory=DOWNLOAD_DIRECTORY, info=None, codec='wav'):
+        self.url = url
+        self.title = title
+        self.video_id = video_id
+        self.directory = directory
+        self.info = info
+        self.codec = codec
+
+    @property
+    def path(self):
+        ''' The path of the downloaded audio file. '''
+        return os.path.join(self.directory, self.title + '.' + self.codec)
+
+    def exists(self):
+        ''' Whether the audio was already downloaded, by an earlier run for example. '''
+        return os.path.exists(self.path)
+
+
+def youtube_dl_options(outtmpl, progress_hooks=(), codec='wav', min_abr=MIN_AUDIO_BITRATE, ratelimit=None,
+                       sleep_interval=None):
+    ''' The options of a YoutubeDL.
+    Args:
+        outtmpl (str): The output template of the downloaded file.
+        progress_hooks (list(callable)): youtube_dl progress hooks.
+        codec (str): The codec the audio is converted to, one of AUDIO_CODECS.
+        min_abr (int): The lowest audio bitrate in kbps preferred over better streams, see AUDIO_FORMAT.
+        ratelimit (int): The maximum download rate in bytes per second, unlimited if None.
+        sleep_interval (float): The seconds to wait before every download, not at all if None.
+    '''
+    return {
+        'format': AUDIO_FORMAT.format(min_abr=min_abr),
+        'postprocessors': [{
+            'key': 'FFmpegExtractAudio',
+            'preferredcodec': codec,
+        }],
+        'duration': 120,
+        'outtmpl': outtmpl,
+        'progress_hooks': list(progress_hooks),
+        'ratelimit': ratelimit,
+        'sleep_interval': sleep_interval,
+    }
+
+
+class MetadataCache(object):
+    ''' The metadata extracted by youtube_dl, by video id and by url, for ttl seconds.
+    Args:
+        ttl (float): The seconds an entry is kept.
+        clock (callable): Returns the current time in seconds.
+    '''
+
+    def __init__(self, ttl=METADATA_TTL, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    def get(self, key):
+        ''' The metadata of a video id or url, None if it is not cached or expired. '''
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, info = entry
+            if expires <= self.clock():
+                del self.entries[key]
+                return None
+            return info
+
+    def put(self, info, *urls):
+        ''' Cache the metadata of a video under its id and the given urls. '''
+        with self.lock:
+            entry = (self.clock() + self.ttl, info)
+            for key in (info.get('id'),) + urls:
+                if key is not None:
+                    self.entries[key] = entry
+
+
+METADATA_CACHE = MetadataCache()
+
+
+def extract_video_info(youtube_downloader, url, ie_key=None):
+    ''' The metadata of a video as its extractor returns it, before any format is selected, so download_audio selects
+    the format with its own options. Urls that only point to another url are followed.
+    Args:
+        youtube_downloader (YoutubeDL): The downloader extracting the metadata.
+        url (str): The url of the video.
+        ie_key (str): The extractor of the url, found from the url if None.
+    Returns:
+        dict: The unprocessed metadata.
+    '''
+    info = youtube_downloader.extract_info(url, download=False, ie_key=ie_key, process=False)
+    while info.get('_type') in ('url', 'url_transparent'):
+        info = youtube_downloader.extract_info(info['url'], download=False, ie_key=info.get('ie_key'), process=False)
+    return info
+
+
+def extract_download(url, directory=DOWNLOAD_DIRECTORY, video_id=None, cache=METADATA_CACHE, codec='wav'):
+    ''' Look up the title and id of a video, extracting its metadata once.
+    Args:
+        url (str): The url of the video.
+        directory (str): The directory the audio is going to be downloaded to.
+        video_id (str): The id of the video if it is known, from a playlist for example.
+        cache (MetadataCache): Where the extracted metadata is looked up and kept, None to always extract it.
+        codec (str): The codec the audio is going to be converted to, one of AUDIO_CODECS.
+    Returns:
+        Download: The download of the video audio.
+    '''
+    video_info = None
+    if cache is not None:
+        video_info = cache.get(video_id) if video_id is not None else None
+        video_info = video_info or cache.get(url)
+    if video_info is None:
+        video_info = extract_video_info(YoutubeDL({'quiet': True}), url)
+        if cache is not None:
+            cache.put(video_info, url)
+    return Download(url, remove_special_char(video_info.get('title', None)), video_info.get('id'), directory,
+                    video_info, codec)
+
+
+def download_audio(download, progress_hooks=(), min_abr=MIN_AUDIO_BITRATE, ratelimit=None, sleep_interval=None):
+    ''' Download the audio stream of a video and convert it to the codec of download, unless an earlier run already
+    did. Only the audio is downloaded where the site has audio-only streams.
+    The metadata of download is reused, so the page and formats of the video are not extracted a second time.
+    Args:
+        download (Download): The download, from extract_download.
+        progress_hooks (list(callable)): youtube_dl progress hooks.
+        min_abr (int): The lowest audio bitrate in kbps preferred over better streams, see AUDIO_FORMAT.
+        ratelimit (int): The maximum download rate in bytes per second, unlimited if None.
+        sleep_interval (float): The seconds to wait before the download, not at all if None.
+    Returns:
+        bool: False if the audio was already downloaded.
+    '''
+    if download.exists():
+        return False
+    youtube_downloader = YoutubeDL(youtube_dl_options(os.path.join(download.directory, download.title + '.%(ext)s'),
+                                                      progress_hooks, download.codec, min_abr, ratelimit,
+                                                      sleep_interval))
+    if download.info is not None:
+        # process_ie_result changes the metadata, which can be cached and downloaded again.
+        youtube_downloader.process_ie_result(copy.deepcopy(download.info), download=True)
+    else:
+        youtube_downloader.download([download.url])
+    return True
+
+
+def entry_url(entry):
+    ''' The url of a video entry of a playlist extracted with extract_flat, where the url is often only the id. '''
+    if entry.get('ie_key') == 'Youtube':
+        return 'https://www.youtube.com/watch?v=' + entry['id']
+    return entry.get('webpage_url') or entry['url']
+
+
+def expand_url(url, cache=METADATA_CACHE):
+    ''' The videos of a url. The url is extracted without processing it, so the entries of playlists and channels
+    stay the lazy generators of their extractors: the videos are yielded page by page as the extractor fetches them,
+    and can be queued before the whole list is known. Playlists in playlists, such as the tabs of a channel, are
+    expanded as well.
+    Args:
+        url (str): The url of a video, playlist or channel.
+        cache (MetadataCache): Where the metadata of a single video is kept, so it is not extracted again.
+    Yields:
+        (str, str): The url and id of every video.
+    '''
+    youtube_downloader = YoutubeDL({'quiet': True})
+    for video in expand_info(youtube_downloader, youtube_downloader.extract_info(url, download=False, process=False),
+                             url, cache):
+        yield video
+
+
+def expand_info(youtube_downloader, info, url, cache=METADATA_CACHE):
+    ''' The videos of unprocessed metadata, see expand_url.
+    Args:
+        youtube_downloader (YoutubeDL): The downloader extracting nested playlists.
+        info (dict): The metadata, extracted with process=False.
+        url (str): The url of the metadata, None if it is not known.
+        cache (MetadataCache): Where the metadata of videos is kept.
+    '''
+    result_type = info.get('_type', 'video')
+    if result_type == 'video':
+        url = url or info.get('webpage_url')
+        if cache is not None:
+            cache.put(info, url)
+        yield url, info.get('id')
+    elif result_type in ('url', 'url_transparent'):
+        if info.get('ie_key') in PLAYLIST_EXTRACTORS:
+            nested = youtube_downloader.extract_info(info['url'], download=False, ie_key=info['ie_key'], process=False)
+            for video in expand_info(youtube_downloader, nested, info['url'], cache):
+                yield video
+        else:
+            # A video, whose metadata is only extracted when it is downloaded.
+            yield entry_url(info), info.get('id')
+    else:
+        for entry in info['entries']:
+            if entry is None:
+                # Unavailable videos.
+                continue
+            for video in expand_info(youtube_downloader, entry, entry.get('webpage_url'), cache):
+                yield video
+
+
+class DownloadArchive(object):
+    ''' The ids of the videos that were processed, kept in a text file in the format of the youtube_dl
+    --download-archive option, one '<extractor> <id>' line per video.
+    Args:
+        path (str): The path of the archive file.
+        extractor (str): The extractor written in front of the ids.
+    '''
+
+    def __init__(self, path, extractor='youtube'):
+        self.path = path
+        self.extractor = extractor
+        self.lock = threading.Lock()
+        self.video_ids = set()
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    fields = line.split()
+                    if len(fields) == 2:
+                        self.video_ids.add(fields[1])
+
+    def __contains__(self, video_id):
+        with self.lock:
+            return video_id in self.video_ids
+
+    def add(self, video_id):
+        ''' Record a processed video. '''
+        with self.lock:
+            if video_id in self.video_ids:
+                return
+            self.video_ids.add(video_id)
+            with open(self.path, 'a') as f:
+                f.write('{} {}\n'.format(self.extractor, video_id))
@@ -0,0 +1,138 @@
+import downloader
+import os
+import tempfile
+import unittest
+
+from unittest.mock import patch
+
+
+class TestDownloader(unittest.TestCase):
+    def test_extract_download(self):
+        with patch('downloader.YoutubeDL') as mock_youtube_dl:
+            mock_youtube_dl.return_value.extract_info.return_value = {'title': 'A Title: Part 1!', 'id': 'abc'}
+            download = downloader.extract_download('url', 'directory', cache=downloader.MetadataCache())
+            mock_youtube_dl.return_value.extract_info.assert_called_once_with('url', download=False, ie_key=None,
+                                                                              process=False)
+
+        self.assertEqual('ATitlePart1', download.title)
+        self.assertEqual('abc', download.video_id)
+        self.assertEqual(os.path.join('directory', 'ATitlePart1.wav'), download.path)
+        self.assertEqual('abc', download.info['id'])
+
+    def test_extract_download_follows_url_results(self):
+        results = {
+            'short url': {'_type': 'url', 'url': 'url', 'ie_key': 'Youtube'},
+            'url': {'title': 'title', 'id': 'abc', 'formats': []},
+        }
+        with patch('downloader.YoutubeDL') as mock_youtube_dl:
+            mock_youtube_dl.return_value.extract_info.side_effect = lambda url, **kwargs: results[url]
+            download = downloader.extract_download('short url', 'directory', cache=None)
+
+        self.assertEqual('abc', download.video_id)
+        self.assertEqual(results['url'], download.info)
+
+    def test_download_mp3(self):
+        download = downloader.Download('url', 'title', 'abc', 'directory', codec='mp3')
+        self.assertEqual(os.path.join('directory', 'title.mp3'), download.path)
+        with patch('downloader.YoutubeDL') as mock_youtube_dl:
+            downloader.download_audio(download, min_abr=128)
+            options = mock_youtube_dl.call_args[0][0]
+        self.assertEqual('worstaudio[abr>=128]/bestaudio/best', options['format'])
+        self.assertEqual('mp3', options['postprocessors'][0]['preferredcodec'])
+
+    def test_extract_download_cached(self):
+        cache = downloader.MetadataCache()
+        with patch('downloader.YoutubeDL') as mock_youtube_dl:
+            mock_youtube_dl.return_value.extract_info.return_value = {'title': 'title', 'id': 'abc'}
+            downloader.extract_download('url', 'directory', cache=cache)
+            self.assertEqual('abc', downloader.extract_download('url', 'directory', cache=cache).video_id)
+            self.assertEqual('abc', downloader.extract_download('other url', 'directory', 'abc', cache).video_id)
+            mock_youtube_dl.return_value.extract_info.assert_called_once()
+
+    def test_metadata_cache_expires(self):
+        now = [0]
+        cache = downloader.MetadataCache(ttl=10, clock=lambda: now[0])
+        cache.put({'id': 'abc'}, 'url')
+        now[0] = 9
+        self.assertEqual({'id': 'abc'}, cache.get('abc'))
+        self.assertEqual({'id': 'abc'}, cache.get('url'))
+        now[0] = 10
+        self.assertIsNone(cache.get('abc'))
+        self.assertIsNone(cache.get('url'))
+
+    def test_download_audio(self):
+        with tempfile.TemporaryDirectory() as directory:
+            download = downloader.Download('url', 'title', 'abc', directory)
+            hook = lambda response: None
+            with patch('downloader.YoutubeDL') as mock_youtube_dl:
+                self.assertTrue(downloader.download_audio(download, [hook]))
+                mock_youtube_dl.return_value.download.assert_called_once_with(['url'])
+                options = mock_youtube_dl.call_args[0][0]
+                self.assertEqual(os.path.join(directory, 'title.%(ext)s'), options['outtmpl'])
+                self.assertEqual([hook], options['progress_hooks'])
+                self.assertEqual('worstaudio[abr>=64]/bestaudio/best', options['format'])
+                self.assertEqual('wav', options['postprocessors'][0]['preferredcodec'])
+
+                info = {'id': 'abc'}
+                self.assertTrue(downloader.download_audio(downloader.Download('url', 'other', 'abc', directory, info)))
+                mock_youtube_dl.return_value.process_ie_result.assert_called_once_with(info, download=True)
+                self.assertIsNot(info, mock_youtube_dl.return_value.process_ie_result.call_args[0][0])
+
+                open(download.path, 'w').close()
+                self.assertFalse(downloader.download_audio(download))
+                mock_youtube_dl.return_value.download.assert_called_once()
+
+    def test_expand_url_video(self):
+        cache = downloader.MetadataCache()
+        with patch('downloader.YoutubeDL') as mock_youtube_dl:
+            mock_youtube_dl.return_value.extract_info.return_value = {'title': 'title', 'id': 'abc', 'formats': []}
+            self.assertEqual([('url', 'abc')], list(downloader.expand_url('url', cache)))
+            mock_youtube_dl.return_value.extract_info.assert_called_once_with('url', download=False, process=False)
+        # The metadata is cached before any format is selected.
+        self.assertNotIn('requested_formats', cache.get('url'))
+        self.assertEqual('title', cache.get('url')['title'])
+
+    def test_expand_url_channel(self):
+        listed = []
+
+        def entries(ids):
+            # Like the extractors, fetch the next page only when the generator is advanced.
+            for video_id in ids:
+                listed.append(video_id)
+                yield {'_type': 'url', 'ie_key': 'Youtube', 'id': video_id, 'url': video_id, 'title': video_id}
+
+        def tab_entries():
+            yield {'_type': 'url', 'ie_key': 'YoutubeTab', 'url': 'videos tab'}
+            yield None
+            for entry in entries(['c']):
+                yield entry
+
+        results = {
+            'channel': {'_type': 'playlist', 'id': 'channel', 'entries': tab_entries()},
+            'videos tab': {'_type': 'playlist', 'id': 'videos', 'entries': entries(['a', 'b'])},
+        }
+        with patch('downloader.YoutubeDL') as mock_youtube_dl:
+            mock_youtube_dl.return_value.extract_info.side_effect = lambda url, **kwargs: results[url]
+            videos = downloader.expand_url('channel')
+            self.assertEqual(('https://www.youtube.com/watch?v=a', 'a'), next(videos))
+            self.assertEqual(['a'], listed)
+            videos = list(videos)
+
+        self.assertEqual([('https://www.youtube.com/watch?v=b', 'b'), ('https://www.youtube.com/watch?v=c', 'c')],
+                         videos)
+
+    def test_download_archive(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'archive.txt')
+            archive = downloader.DownloadArchive(path)
+            self.assertNotIn('abc', archive)
+            archive.add('abc')
+            archive.add('abc')
+            self.assertIn('abc', archive)
+            self.assertIn('abc', downloader.DownloadArchive(path))
+            with open(path) as f:
+                self.assertEqual('youtube abc\n', f.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
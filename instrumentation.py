@@ -0,0 +1,232 @@
+import json
+import logging
+import os
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+
+def read_io_counters():
+    ''' The bytes this process read and wrote so far, through read and write calls, including the ones served from
+    the page cache. Zeros where /proc/self/io does not exist.
+    Returns:
+        (int, int): The bytes read and the bytes written.
+    '''
+    try:
+        with open('/proc/self/io') as f:
+            counters = dict(line.split(':', 1) for line in f if ':' in line)
+    except OSError:
+        return 0, 0
+    return int(counters.get('rchar', 0)), int(counters.get('wchar', 0))
+
+
+def current_rss():
+    ''' The resident set size of the process in bytes, None where /proc/self/status does not exist. '''
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+class RssSampler(object):
+    ''' Samples the resident set size of the process on a background thread and keeps the highest sample.
+    The peak the kernel keeps can only be reset for the whole process, which would erase the peak of the other stages
+    running at the same time, so every stage samples its own.
+    Args:
+        interval (float): The seconds between samples.
+    '''
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = None
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.sample()
+        if self.peak is not None:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        rss = current_rss()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def stop(self):
+        ''' Stop sampling.
+        Returns:
+            int: The highest resident set size sampled in bytes, None if it is not known.
+        '''
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.sample()
+        return self.peak
+
+
+class StageTimer(object):
+    ''' Measures one run of a stage and sends the measurement to a sink when it ends.
+    CPU time, bytes and peak RSS are counted for the whole process, so they include other stages that run at the
+    same time. The peak RSS is the highest RSS sampled while the stage ran, see RssSampler.
+
+    Usage:
+        with StageTimer('Removing_Silence', sink, job_id=job_id) as timer:
+            samples, sample_rate = remove_silence(samples, sample_rate)
+            timer.audio_duration = len(samples) / sample_rate
+
+    Args:
+        stage (str): The name of the stage.
+        sink (object): Anything with an emit(event) method, nothing is emitted if None.
+        audio_duration (float): The seconds of audio the stage processes, can also be set while it runs.
+        labels: Extra values added to the event, such as the job id.
+    '''
+
+    def __init__(self, stage, sink=None, audio_duration=None, **labels):
+        self.stage = stage
+        self.sink = sink
+        self.audio_duration = audio_duration
+        self.labels = labels
+        self.event = None
+
+    def __enter__(self):
+        self.rss_sampler = RssSampler()
+        self.rss_sampler.start()
+        self.start_read, self.start_written = read_io_counters()
+        self.start_cpu = time.process_time()
+        self.start_wall = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall_time = time.perf_counter() - self.start_wall
+        peak_rss = self.rss_sampler.stop()
+        read_bytes, written_bytes = read_io_counters()
+        self.event = dict(self.labels, **{
+            'stage': self.stage,
+            'time': time.time(),
+            'wall_time': wall_time,
+            'cpu_time': time.process_time() - self.start_cpu,
+            'peak_rss': peak_rss,
+            'read_bytes': read_bytes - self.start_read,
+            'written_bytes': written_bytes - self.start_written,
+            'audio_duration': self.audio_duration,
+            'realtime_factor': self.audio_duration / wall_time if self.audio_duration and wall_time else None,
+            'error': None if exc_type is None else exc_type.__name__,
+        })
+        if self.sink is not None:
+            self.sink.emit(self.event)
+        return False
+
+
+def format_event(event):
+    ''' A short human-readable summary of a StageTimer event, such as 'Removing_Silence 2.1s 35.0x realtime'. '''
+    text = '{} {:.1f}s'.format(event['stage'], event['wall_time'])
+    if event['realtime_factor'] is not None:
+        text += ' {:.1f}x realtime'.format(event['realtime_factor'])
+    return text
+
+
+class LogSink(object):
+    ''' Writes every event as a summary line to a logger. '''
+
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger or _logger
+        self.level = level
+
+    def emit(self, event):
+        self.logger.log(self.level, '%s cpu=%.1fs peak_rss=%s read=%d written=%d', format_event(event),
+                        event['cpu_time'], event['peak_rss'], event['read_bytes'], event['written_bytes'])
+
+
+class JsonLinesSink(object):
+    ''' Appends every event as one JSON object per line to a file. '''
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def emit(self, event):
+        line = json.dumps(event, sort_keys=True)
+        with self.lock, open(self.path, 'a') as f:
+            f.write(line + '\n')
+
+
+class PrometheusSink(object):
+    ''' Keeps per-stage totals and rewrites them to a file in the Prometheus text format after every event, for
+    the textfile collector of node_exporter for example.
+    '''
+
+    METRICS = (
+        ('stage_runs_total', 'counter', 'Number of stage runs.'),
+        ('stage_errors_total', 'counter', 'Number of stage runs that raised an exception.'),
+        ('stage_wall_seconds_total', 'counter', 'Wall time spent in the stage.'),
+        ('stage_cpu_seconds_total', 'counter', 'Process CPU time spent in the stage.'),
+        ('stage_read_bytes_total', 'counter', 'Bytes read while the stage ran.'),
+        ('stage_written_bytes_total', 'counter', 'Bytes written while the stage ran.'),
+        ('stage_audio_seconds_total', 'counter', 'Seconds of audio processed by the stage.'),
+        ('stage_peak_rss_bytes', 'gauge', 'Highest resident set size sampled during the last run of the stage.'),
+        ('stage_realtime_factor', 'gauge', 'Seconds of audio per second of processing in the last run of the stage.'),
+    )
+
+    def __init__(self, path, prefix='youtube2podcast_'):
+        self.path = path
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def emit(self, event):
+        with self.lock:
+            values = self.values.setdefault(event['stage'], dict.fromkeys([name for name, _, _ in self.METRICS], 0))
+            values['stage_runs_total'] += 1
+            values['stage_errors_total'] += event['error'] is not None
+            values['stage_wall_seconds_total'] += event['wall_time']
+            values['stage_cpu_seconds_total'] += event['cpu_time']
+            values['stage_read_bytes_total'] += event['read_bytes']
+            values['stage_written_bytes_total'] += event['written_bytes']
+            values['stage_audio_seconds_total'] += event['audio_duration'] or 0
+            values['stage_peak_rss_bytes'] = event['peak_rss'] or 0
+            values['stage_realtime_factor'] = event['realtime_factor'] or 0
+            text = self.format()
+            temporary_path = self.path + '.tmp'
+            with open(temporary_path, 'w') as f:
+                f.write(text)
+            os.replace(temporary_path, self.path)
+
+    def format(self):
+        lines = []
+        for name, metric_type, description in self.METRICS:
+            lines.append('# HELP {}{} {}'.format(self.prefix, name, description))
+            lines.append('# TYPE {}{} {}'.format(self.prefix, name, metric_type))
+            for stage in sorted(self.values):
+                lines.append('{}{}{{stage="{}"}} {}'.format(self.prefix, name, stage, self.values[stage][name]))
+        return '\n'.join(lines) + '\n'
+
+
+class CallbackSink(object):
+    ''' Calls a function with every event. '''
+
+    def __init__(self, func):
+        self.func = func
+
+    def emit(self, event):
+        self.func(event)
+
+
+class MultiSink(object):
+    ''' Sends every event to several sinks. '''
+
+    def __init__(self, sinks):
+        self.sinks = list(sinks)
+
+    def emit(self, event):
+        for sink in self.sinks:
+            sink.emit(event)
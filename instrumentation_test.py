@@ -0,0 +1,77 @@
+import instrumentation
+import json
+import os
+import tempfile
+import time
+import unittest
+
+
+class TestInstrumentation(unittest.TestCase):
+    def test_stage_timer(self):
+        events = []
+        with instrumentation.StageTimer('Filter_Noise', instrumentation.CallbackSink(events.append),
+                                        job_id='job') as timer:
+            sum(range(100000))
+            timer.audio_duration = 60.0
+
+        event = events[0]
+        self.assertIs(timer.event, event)
+        self.assertEqual('Filter_Noise', event['stage'])
+        self.assertEqual('job', event['job_id'])
+        self.assertGreater(event['wall_time'], 0)
+        self.assertGreaterEqual(event['cpu_time'], 0)
+        self.assertAlmostEqual(60.0 / event['wall_time'], event['realtime_factor'])
+        self.assertGreaterEqual(event['read_bytes'], 0)
+        self.assertIsNone(event['error'])
+
+    def test_stage_timer_error(self):
+        events = []
+        with self.assertRaises(ValueError):
+            with instrumentation.StageTimer('Filter_Noise', instrumentation.CallbackSink(events.append)):
+                raise ValueError('invalid')
+
+        self.assertEqual('ValueError', events[0]['error'])
+        self.assertIsNone(events[0]['realtime_factor'])
+
+    def test_rss_sampler(self):
+        if instrumentation.current_rss() is None:
+            self.skipTest('/proc/self/status is not available')
+        rss_sampler = instrumentation.RssSampler(interval=0.01)
+        rss_sampler.start()
+        before = instrumentation.current_rss()
+        # Written, so every page is resident.
+        buffer = b'x' * (64 * 1024 * 1024)
+        time.sleep(0.05)
+        del buffer
+        peak = rss_sampler.stop()
+
+        self.assertGreater(peak, before + 32 * 1024 * 1024)
+        self.assertFalse(rss_sampler.thread.is_alive())
+
+    def test_format_event(self):
+        event = {'stage': 'Removing_Silence', 'wall_time': 2.06, 'realtime_factor': 35.0}
+        self.assertEqual('Removing_Silence 2.1s 35.0x realtime', instrumentation.format_event(event))
+
+    def test_sinks(self):
+        with tempfile.TemporaryDirectory() as directory:
+            jsonl_path = os.path.join(directory, 'metrics.jsonl')
+            prometheus_path = os.path.join(directory, 'metrics.prom')
+            sink = instrumentation.MultiSink([instrumentation.JsonLinesSink(jsonl_path),
+                                              instrumentation.PrometheusSink(prometheus_path),
+                                              instrumentation.LogSink()])
+            for _ in range(2):
+                with instrumentation.StageTimer('Normalizing_Volume', sink, audio_duration=10.0):
+                    pass
+            with open(jsonl_path) as f:
+                events = [json.loads(line) for line in f]
+            with open(prometheus_path) as f:
+                metrics = f.read()
+
+        self.assertEqual(['Normalizing_Volume'] * 2, [event['stage'] for event in events])
+        self.assertIn('# TYPE youtube2podcast_stage_runs_total counter', metrics)
+        self.assertIn('youtube2podcast_stage_runs_total{stage="Normalizing_Volume"} 2', metrics)
+        self.assertIn('youtube2podcast_stage_audio_seconds_total{stage="Normalizing_Volume"} 20.0', metrics)
+
+
+if __name__ == '__main__':
+    unittest.main()
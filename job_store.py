@@ -0,0 +1,120 @@
+import json
+import sqlite3
+import threading
+import time
+
+
+class JobStore(object):
+    ''' SQLite store of the scheduler jobs and of the stages they completed.
+    Every state change and every completed stage is committed as it happens, so after a crash or a kill the jobs
+    that did not finish are found again, along with the output artifact of each stage they got through.
+
+    Args:
+        path (str): The database file, ':memory:' for a store that is not persisted.
+    '''
+
+    def __init__(self, path='jobs.db'):
+        self.path = path
+        self.lock = threading.Lock()
+        # The scheduler calls the store from its worker threads, every access goes through the lock.
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    priority INTEGER NOT NULL,
+                    stage_index INTEGER NOT NULL,
+                    data TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    error TEXT,
+                    created REAL NOT NULL,
+                    updated REAL NOT NULL
+                )''')
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS stages (
+                    job_id TEXT NOT NULL REFERENCES jobs (job_id),
+                    stage TEXT NOT NULL,
+                    artifact TEXT,
+                    completed REAL NOT NULL,
+                    PRIMARY KEY (job_id, stage)
+                )''')
+
+    def save_job(self, job):
+        ''' Insert or update a scheduler.Job. '''
+        now = time.time()
+        error = None if job.error is None else repr(job.error)
+        with self.lock, self.connection:
+            self.connection.execute('''
+                INSERT INTO jobs (job_id, url, priority, stage_index, data, state, error, created, updated)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (job_id) DO UPDATE SET
+                    priority = excluded.priority, stage_index = excluded.stage_index, data = excluded.data,
+                    state = excluded.state, error = excluded.error, updated = excluded.updated''',
+                (job.job_id, job.url, job.priority, job.stage_index, json.dumps(job.data), job.state, error, now,
+                 now))
+
+    def complete_stage(self, job_id, stage, artifact=None):
+        ''' Record that a job completed a stage.
+        Args:
+            job_id (str): The id of the job.
+            stage (str): The name of the stage.
+            artifact (str): What the stage produced, such as the path of its output file.
+        '''
+        with self.lock, self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO stages (job_id, stage, artifact, completed) VALUES (?, ?, ?, ?)',
+                (job_id, stage, artifact, time.time()))
+
+    def completed_stages(self, job_id):
+        ''' The stages a job completed.
+        Returns:
+            dict: The artifact of each completed stage, by stage name.
+        '''
+        with self.lock:
+            rows = self.connection.execute('SELECT stage, artifact FROM stages WHERE job_id = ?', (job_id,))
+            return dict(rows.fetchall())
+
+    def first_incomplete_stage(self, job_id, stage_names):
+        ''' The index of the first of the given stages the job has not completed, len(stage_names) if none. '''
+        completed = self.completed_stages(job_id)
+        for stage_index, stage in enumerate(stage_names):
+            if stage not in completed:
+                return stage_index
+        return len(stage_names)
+
+    def job(self, job_id):
+        ''' The stored values of a job, or None if there is no such job.
+        Returns:
+            dict: job_id, url, priority, stage_index, data, state and error.
+        '''
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT job_id, url, priority, stage_index, data, state, error FROM jobs WHERE job_id = ?',
+                (job_id,)).fetchone()
+        return None if row is None else self._job_values(row)
+
+    def unfinished_jobs(self):
+        ''' The stored values of the jobs that were queued or running, in the order they were created. '''
+        with self.lock:
+            rows = self.connection.execute('''
+                SELECT job_id, url, priority, stage_index, data, state, error FROM jobs
+                WHERE state IN ('queued', 'running') ORDER BY created, rowid''').fetchall()
+        return [self._job_values(row) for row in rows]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    @staticmethod
+    def _job_values(row):
+        job_id, url, priority, stage_index, data, state, error = row
+        return {
+            'job_id': job_id,
+            'url': url,
+            'priority': priority,
+            'stage_index': stage_index,
+            'data': json.loads(data),
+            'state': state,
+            'error': error,
+        }
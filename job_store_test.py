@@ -0,0 +1,68 @@
+import job_store
+import os
+import scheduler
+import tempfile
+import unittest
+
+
+class TestJobStore(unittest.TestCase):
+    def test_save_job(self):
+        store = job_store.JobStore(':memory:')
+        job = scheduler.Job('id', 'url', priority=2, data={'title': 'title'})
+        store.save_job(job)
+        job.state = 'running'
+        job.stage_index = 1
+        store.save_job(job)
+
+        self.assertEqual({'job_id': 'id', 'url': 'url', 'priority': 2, 'stage_index': 1, 'data': {'title': 'title'},
+                          'state': 'running', 'error': None}, store.job('id'))
+        self.assertEqual(['id'], [values['job_id'] for values in store.unfinished_jobs()])
+        job.state = 'finished'
+        store.save_job(job)
+        self.assertEqual([], store.unfinished_jobs())
+        self.assertIsNone(store.job('unknown'))
+
+    def test_completed_stages(self):
+        store = job_store.JobStore(':memory:')
+        store.save_job(scheduler.Job('id', 'url'))
+        store.complete_stage('id', 'download', 'download/title.mp3')
+
+        self.assertEqual({'download': 'download/title.mp3'}, store.completed_stages('id'))
+        self.assertEqual(1, store.first_incomplete_stage('id', ['download', 'process']))
+        store.complete_stage('id', 'process')
+        self.assertEqual(2, store.first_incomplete_stage('id', ['download', 'process']))
+
+    def test_scheduler_resumes_at_first_incomplete_stage(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'jobs.db')
+            store = job_store.JobStore(path)
+            job_scheduler = scheduler.Scheduler([scheduler.Stage('download', lambda job: 'download/a.mp3', 1)],
+                                                store=store)
+            job_scheduler.start()
+            job = job_scheduler.submit('a', data={'title': 'a'})
+            job_scheduler.shutdown()
+            # A job that was running when the process died.
+            store.save_job(scheduler.Job('killed', 'b', data={'title': 'b'}))
+            store.complete_stage('killed', 'download', 'download/b.mp3')
+            store.close()
+
+            processed = []
+            downloaded = []
+            store = job_store.JobStore(path)
+            restarted_scheduler = scheduler.Scheduler(
+                [scheduler.Stage('download', lambda job: downloaded.append(job.url), 1),
+                 scheduler.Stage('process', lambda job: processed.append(job.data['title']), 1)], store=store)
+            restored = restarted_scheduler.start()
+            restarted_scheduler.shutdown()
+
+            self.assertEqual(['killed'], [restored_job.job_id for restored_job in restored])
+            self.assertEqual([], downloaded)
+            self.assertEqual(['b'], processed)
+            self.assertEqual({'download': 'download/a.mp3'}, store.completed_stages(job.job_id))
+            self.assertEqual('finished', store.job('killed')['state'])
+            self.assertEqual([], store.unfinished_jobs())
+            store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
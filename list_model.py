@@ -0,0 +1,82 @@
+import threading
+
+
+class ListModel(object):
+    ''' The rows of a RecycleView, updated from any thread and applied on the Kivy main thread.
+    Updates only change plain dicts and remember which rows changed. flush, called from a Clock event, copies the
+    changed rows into the RecycleView data, so the view refreshes those rows only, at most once per flush however
+    many updates came in between.
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.keys = []
+        self.positions = {}
+        self.rows = {}
+        self.changed = set()
+        self.reordered = False
+
+    def __len__(self):
+        with self.lock:
+            return len(self.keys)
+
+    def set(self, key, **values):
+        ''' Add a row, or update the given values of an existing one.
+        Args:
+            key: Any hashable identity of the row.
+            values: The properties of the row, passed to the view class.
+        '''
+        with self.lock:
+            row = self.rows.get(key)
+            if row is None:
+                self.positions[key] = len(self.keys)
+                self.keys.append(key)
+                self.rows[key] = dict(values)
+                self.reordered = True
+                return
+            if any(row.get(name) != value for name, value in values.items()):
+                row.update(values)
+                self.changed.add(key)
+
+    def get(self, key):
+        ''' A copy of a row, None if there is no such row. '''
+        with self.lock:
+            row = self.rows.get(key)
+            return None if row is None else dict(row)
+
+    def replace(self, rows):
+        ''' Replace every row, keeping the rows that did not change as they are.
+        Args:
+            rows (list((key, dict))): The new rows, in order.
+        '''
+        with self.lock:
+            keys = [key for key, _ in rows]
+            if keys != self.keys:
+                self.keys = keys
+                self.positions = {key: position for position, key in enumerate(keys)}
+                self.reordered = True
+            new_rows = {}
+            for key, values in rows:
+                if key in self.rows and self.rows[key] != values:
+                    self.changed.add(key)
+                new_rows[key] = dict(values)
+            self.rows = new_rows
+
+    def flush(self, data):
+        ''' Apply the updates since the last flush to the data of a view.
+        Args:
+            data (list(dict)): The data of the RecycleView, or any list.
+        Returns:
+            int: The number of rows written to data.
+        '''
+        with self.lock:
+            if self.reordered:
+                data[:] = [dict(self.rows[key]) for key in self.keys]
+                written = len(self.keys)
+            else:
+                for key in self.changed:
+                    data[self.positions[key]] = dict(self.rows[key])
+                written = len(self.changed)
+            self.changed = set()
+            self.reordered = False
+            return written
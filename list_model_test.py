@@ -0,0 +1,55 @@
+import list_model
+import unittest
+
+
+class RecordingList(list):
+    ''' A list that records which items were assigned. '''
+
+    def __init__(self):
+        super(RecordingList, self).__init__()
+        self.assigned = []
+
+    def __setitem__(self, index, value):
+        self.assigned.append(index)
+        super(RecordingList, self).__setitem__(index, value)
+
+
+class TestListModel(unittest.TestCase):
+    def test_set_and_flush(self):
+        model = list_model.ListModel()
+        data = RecordingList()
+        model.set('a', text='a', secondary_text='Downloading')
+        model.set('b', text='b', secondary_text='Downloading')
+        self.assertEqual(2, model.flush(data))
+        self.assertEqual(['a', 'b'], [row['text'] for row in data])
+
+        data.assigned = []
+        for percentage in ('1%', '2%', '3%'):
+            model.set('b', progress=percentage)
+        model.set('a', secondary_text='Downloading')
+        self.assertEqual(1, model.flush(data))
+        self.assertEqual([1], data.assigned)
+        self.assertEqual({'text': 'b', 'secondary_text': 'Downloading', 'progress': '3%'}, data[1])
+        self.assertEqual(0, model.flush(data))
+
+    def test_replace(self):
+        model = list_model.ListModel()
+        data = RecordingList()
+        model.replace([('a.mp3', {'text': 'a.mp3', 'icon': 'play'}), ('b.mp3', {'text': 'b.mp3', 'icon': 'play'})])
+        model.flush(data)
+
+        data.assigned = []
+        model.replace([('a.mp3', {'text': 'a.mp3', 'icon': 'play'}), ('b.mp3', {'text': 'b.mp3', 'icon': 'stop'})])
+        self.assertEqual(1, model.flush(data))
+        self.assertEqual([1], data.assigned)
+        self.assertEqual('stop', data[1]['icon'])
+
+        model.replace([('b.mp3', {'text': 'b.mp3', 'icon': 'stop'})])
+        model.flush(data)
+        self.assertEqual([{'text': 'b.mp3', 'icon': 'stop'}], list(data))
+        self.assertEqual({'text': 'b.mp3', 'icon': 'stop'}, model.get('b.mp3'))
+        self.assertIsNone(model.get('a.mp3'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,16 +1,21 @@
 import os
 
-import bandfilter
 import enum
-import normalizer
-import re
-import vad
+import functools
+import importlib
+import instrumentation
+import job_store
+import list_model
+import result_cache
+import scheduler
+import sys
+import threading
+import time
 
-import background_separator
 from kivy.clock import Clock
 from kivy.core.audio import SoundLoader
 from kivy.core.window import Window
-from kivy.properties import ObjectProperty
+from kivy.properties import ObjectProperty, StringProperty
 from kivy.uix.anchorlayout import AnchorLayout
 from kivy.uix.label import Label
 from kivy.uix.popup import Popup
@@ -18,10 +23,21 @@ from kivymd.app import MDApp
 from kivymd.uix.button import Button
 from kivymd.uix.boxlayout import MDBoxLayout
 from kivymd.uix.label import MDLabel
-from kivymd.uix.list import IconRightWidget, OneLineRightIconListItem, TwoLineRightIconListItem, IRightBody
+from kivymd.uix.list import OneLineRightIconListItem, TwoLineRightIconListItem, IRightBody
 from kivymd.uix.slider import MDSlider
-from threading import Thread
-from youtube_dl import YoutubeDL
+
+# Modules that are slow to import, spleeter brings in TensorFlow. They are only needed once a download has finished,
+# so they are imported after the window is up instead of before, see preload_modules.
+PRELOADED_MODULES = ('downloader', 'pipeline', 'spleeter.separator')
+
+
+def preload_modules():
+    ''' Import the slow modules, so the first download does not wait for them. '''
+    for name in PRELOADED_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            print(e)
 
 
 class MyApp(MDApp):
@@ -32,6 +48,17 @@ class MyApp(MDApp):
     def build(self):
         return BL()
 
+    def on_start(self):
+        threading.Thread(target=preload_modules, daemon=True).start()
+        if os.environ.get('STARTUP_BENCHMARK'):
+            # Runs on the next clock tick, once the first frame has been drawn. See startup_benchmark.py.
+            Clock.schedule_once(self.report_first_frame, 0)
+
+    def report_first_frame(self, dt):
+        print('first_frame {:.6f}'.format(time.time()))
+        sys.stdout.flush()
+        self.stop()
+
 
 class DownloadAlert(Popup):
     def __init__(self, title, text):
@@ -57,6 +84,12 @@ class DownloadAlert(Popup):
 
 class ListItemWithPercentage(TwoLineRightIconListItem):
     '''Custom list item.'''
+    progress = StringProperty('')
+
+
+class PodcastListItem(OneLineRightIconListItem):
+    '''Podcast list item with a play or stop icon.'''
+    icon = StringProperty('')
 
 
 class RightLabel(IRightBody, MDLabel):
@@ -64,20 +97,26 @@ class RightLabel(IRightBody, MDLabel):
 
 
 class DownloadStatus(enum.Enum):
+    # The noise filter runs in the Normalizing_Volume stage, see postprocess.PostProcessor.
     Downloading = 1
     Separating_Background = 2
     Removing_Silence = 3
-    Filter_Noise = 4
     Normalizing_Volume = 5
     Finish = 6
     Error = 7
 
 
 class DownloadingPodcast:
-    def __init__(self, title, download_status):
+    def __init__(self, title, download_status, video_id=None, job_id=None):
         self.title = title
         self.download_status = download_status
         self.download_percentage = '0%'
+        self.video_id = video_id
+        # The id of the scheduler job of the podcast, which keys its row of the download list.
+        self.job_id = job_id
+        self.path = None
+        # Summaries of the stage measurements, see instrumentation.format_event.
+        self.timings = []
 
 
 class AudioSlider(MDSlider):
@@ -97,11 +136,13 @@ class AudioSlider(MDSlider):
 
 
 class BL(MDBoxLayout):
+    LIST_REFRESH_INTERVAL = 0.25
+    PODCAST_EXTENSIONS = ('.wav', '.mp3')
+
     def __init__(self):
         super(BL, self).__init__()
 
         self.sound = SoundLoader.load('')
-        self.downloading_podcast_list = []
         self.play_screen_slider_layout = self.ids.play_screen_slider_layout
         self.slider = AudioSlider(min=0, max=0, value=0, sound_loader=self.sound,
                                   pos_hint={'center_x': 0.5, 'center_y': 0.5})
@@ -114,6 +155,26 @@ class BL(MDBoxLayout):
         self.PLAY_ICON = 'play-circle-outline'
         self.PAUSE_ICON = 'pause-circle-outline'
         self.separator = None
+        self.downloading_podcasts_by_job = {}
+        # The podcasts being downloaded by video id, for callable_hook.
+        self.downloading_podcasts_by_video_id = {}
+        self.download_archive = None
+        self.download_archive_lock = threading.Lock()
+        self.result_cache = result_cache.ResultCache('cache/')
+        self.metrics_sink = instrumentation.JsonLinesSink('metrics.jsonl')
+        # The rows of the lists are updated from the worker threads and applied to the views on the main thread at
+        # most LIST_REFRESH_INTERVAL times a second, see list_model.ListModel.
+        self.download_list_model = list_model.ListModel()
+        self.podcast_list_model = list_model.ListModel()
+        self.podcast_filenames = []
+        self.podcast_directory_mtime = None
+        Clock.schedule_interval(self.flush_lists, self.LIST_REFRESH_INTERVAL)
+        # Started last, the jobs restored from jobs.db update the download list as soon as the workers run them.
+        self.scheduler = scheduler.Scheduler([
+            scheduler.Stage('download', self.download_job, 2),
+            scheduler.Stage('process', self.process_job, 1),
+        ], on_update=self.on_job_update, store=job_store.JobStore('jobs.db'))
+        self.scheduler.start()
 
     def play_btn_onclick(self):
         if self.sound is None:
@@ -128,136 +189,177 @@ class BL(MDBoxLayout):
 
     def download_btn_onclick(self):
         url = self.ids.video_url_textfield.text
-        Thread(target=self.download_podcast, args=(url,)).start()
-
-    def download_podcast(self, url):
-        current_downloading_podcast = self.download_audio(url)
-
-        current_downloading_podcast.download_status = DownloadStatus.Separating_Background
-        self.create_download_list()
-        background_separator.main(
-            ['-input_path', 'download/' + current_downloading_podcast.title + '.mp3', '-output_directory',
-             'separated/'])
-
-        current_downloading_podcast.download_status = DownloadStatus.Removing_Silence
-        self.create_podcast_list()
-        vad.generate_solo_audio('separated/' + current_downloading_podcast.title + '/vocals.wav',
-                                'unsilenced/' + current_downloading_podcast.title + '.wav', 3)
-
-        current_downloading_podcast.download_status = DownloadStatus.Normalizing_Volume
-        self.create_podcast_list()
-        normalizer.normalize_audio_with_target_dBFS('unsilenced/' + current_downloading_podcast.title + '.wav',
-                                                    'normalized/' + current_downloading_podcast.title + '.wav', 'wav',
-                                                    -20.0)
-
-        current_downloading_podcast.download_status = DownloadStatus.Filter_Noise
-        self.create_podcast_list()
-        bandfilter.filter_noise('normalized/' + current_downloading_podcast.title + '.wav',
-                                'denoised/' + current_downloading_podcast.title + '.wav', 100, 6000)
+        # Listing a playlist or channel takes a request per page, so it is done off the main thread.
+        threading.Thread(target=self.submit_videos, args=(url,), daemon=True).start()
 
+    def submit_videos(self, url):
+        ''' Queue a job for every video of a video, playlist or channel url, as the videos are listed, skipping the
+        ones in the download archive.
+        '''
+        import downloader
+        archive = self.get_download_archive()
+        expanded = False
+        try:
+            for video_url, video_id in downloader.expand_url(url):
+                expanded = True
+                if video_id not in archive:
+                    self.scheduler.submit(video_url, data={'video_id': video_id} if video_id else None)
+        except Exception as e:
+            print(e)
+            # Let the download report the error of a url that cannot be listed at all. Once some videos were queued,
+            # the url is a playlist or channel and must not be downloaded as a single video.
+            if not expanded:
+                self.scheduler.submit(url)
+
+    def get_download_archive(self):
+        ''' The ids of the processed videos, loaded on first use as downloader is slow to import. '''
+        import downloader
+        with self.download_archive_lock:
+            if self.download_archive is None:
+                self.download_archive = downloader.DownloadArchive('download_archive.txt')
+            return self.download_archive
+
+    def download_job(self, job):
+        current_downloading_podcast = self.download_audio(job.url, job.data.get('video_id'), job.job_id)
+        if current_downloading_podcast is None:
+            raise ValueError('Failed to download the audio from ' + job.url)
+        job.data['title'] = current_downloading_podcast.title
+        job.data['video_id'] = current_downloading_podcast.video_id
+        job.data['input_path'] = current_downloading_podcast.path
+        self.downloading_podcasts_by_job[job.job_id] = current_downloading_podcast
+        return current_downloading_podcast.path
+
+    def process_job(self, job):
+        import pipeline
+        current_downloading_podcast = self.downloading_podcasts_by_job.get(job.job_id)
+        if current_downloading_podcast is None:
+            # The job was downloaded before the app was restarted.
+            current_downloading_podcast = DownloadingPodcast(job.data['title'], DownloadStatus.Separating_Background,
+                                                             job.data.get('video_id'), job.job_id)
+            self.downloading_podcasts_by_job[job.job_id] = current_downloading_podcast
+
+        def on_stage(stage):
+            job.check_cancelled()
+            current_downloading_podcast.download_status = DownloadStatus[stage]
+            self.update_download_row(current_downloading_podcast)
+
+        output_path = 'denoised/' + current_downloading_podcast.title + '.wav'
+        # Jobs stored before the downloads were converted to wav have no input_path.
+        input_path = job.data.get('input_path', 'download/' + current_downloading_podcast.title + '.mp3')
+        pipeline.run_pipeline(input_path, output_path,
+                              3, -20.0, 100, 6000, on_stage=on_stage, cache=self.result_cache,
+                              cache_key=current_downloading_podcast.video_id,
+                              sink=self.podcast_sink(current_downloading_podcast))
+
+        if current_downloading_podcast.video_id:
+            self.get_download_archive().add(current_downloading_podcast.video_id)
         current_downloading_podcast.download_status = DownloadStatus.Finish
-        self.create_podcast_list()
+        self.update_download_row(current_downloading_podcast)
+        return output_path
 
-    def download_audio(self, url):
+    def podcast_sink(self, downloading_podcast):
+        ''' The sink of the stage measurements of a podcast, shown in its row of the download list and appended to
+        metrics.jsonl.
+        '''
+        def emit(event):
+            downloading_podcast.timings.append(instrumentation.format_event(event))
+            self.metrics_sink.emit(dict(event, title=downloading_podcast.title, video_id=downloading_podcast.video_id))
+            self.update_download_row(downloading_podcast)
+        return instrumentation.CallbackSink(emit)
+
+    def on_job_update(self, job):
+        current_downloading_podcast = self.downloading_podcasts_by_job.get(job.job_id)
+        if current_downloading_podcast is not None and job.state in ('failed', 'cancelled'):
+            current_downloading_podcast.download_status = DownloadStatus.Error
+            self.update_download_row(current_downloading_podcast)
+        if job.state in ('finished', 'failed', 'cancelled'):
+            # The row of the podcast stays in the download list.
+            self.downloading_podcasts_by_job.pop(job.job_id, None)
+
+    def download_audio(self, url, video_id=None, job_id=None):
+        import downloader
         try:
-            ydl_opts = {
-                'format': 'best',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                }],
-                'duration': 120,
-                'outtmpl': 'download/%(title)s.%(ext)s',
-                'progress_hooks': [self.callable_hook],
-            }
-            youtube_downloader = YoutubeDL(ydl_opts)
-            video_info = youtube_downloader.extract_info(url, download=False)
-            video_title = self.remove_special_char(video_info.get('title', None))
-
-            ydl_opts = {
-                'format': 'best',
-                'postprocessors': [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                }],
-                'duration': 120,
-                'outtmpl': 'download/' + video_title + '.%(ext)s',
-                'progress_hooks': [self.callable_hook],
-            }
-            youtube_downloader = YoutubeDL(ydl_opts)
-
-            current_downloading_podcast = DownloadingPodcast(video_title, DownloadStatus.Downloading)
-            self.downloading_podcast_list.append(current_downloading_podcast)
-            self.create_download_list()
-            youtube_downloader.download([url])
+            download = downloader.extract_download(url, video_id=video_id)
+            current_downloading_podcast = DownloadingPodcast(download.title, DownloadStatus.Downloading,
+                                                             download.video_id, job_id)
+            current_downloading_podcast.path = download.path
+            self.downloading_podcasts_by_video_id[download.video_id] = current_downloading_podcast
+            self.update_download_row(current_downloading_podcast)
+            try:
+                with instrumentation.StageTimer('Downloading', self.podcast_sink(current_downloading_podcast)):
+                    downloaded = downloader.download_audio(
+                        download, [functools.partial(self.callable_hook, download.video_id)])
+            finally:
+                self.downloading_podcasts_by_video_id.pop(download.video_id, None)
+            if not downloaded:
+                # Already downloaded by an earlier run.
+                current_downloading_podcast.download_status = DownloadStatus.Finish
+                current_downloading_podcast.download_percentage = ''
+                self.update_download_row(current_downloading_podcast)
             return current_downloading_podcast
         except Exception as e:
             print(e)
-            DownloadAlert(title='Invalid URL',
-                          text='Failed to download the audio from the given url, please try again.')
-
-    def remove_special_char(self, text):
-        return re.sub('[^A-Za-z0-9]+', '', text)
-
-    def callable_hook(self, response):
-        filename = response['filename'].split('\\')
-        title = filename[len(filename) - 1]
-        title = title[:-4]  # remove .mp4
-        current_downloading_podcast = None
-        for downloading_podcast in self.downloading_podcast_list:
-            formated_downloading_podcast_title = self.remove_special_char(downloading_podcast.title)
-            formated_title = self.remove_special_char(title)
-            if formated_downloading_podcast_title == formated_title:
-                current_downloading_podcast = downloading_podcast
-            break
+            # Widgets can only be created on the main thread, and this runs on a download worker.
+            Clock.schedule_once(lambda dt: DownloadAlert(
+                title='Invalid URL', text='Failed to download the audio from the given url, please try again.'))
+
+    def callable_hook(self, video_id, response):
+        ''' youtube_dl progress hook of one download, bound to its video id with functools.partial.
+        Args:
+            video_id (str): The id of the downloaded video.
+            response (dict): The progress reported by youtube_dl.
+        '''
+        current_downloading_podcast = self.downloading_podcasts_by_video_id.get(video_id)
         if current_downloading_podcast is not None:
             if response['status'] == 'downloading':
                 current_downloading_podcast.download_percentage = response['_percent_str']
-                self.create_download_list()
+                self.update_download_row(current_downloading_podcast)
             if response['status'] == 'finished':
                 current_downloading_podcast.download_status = DownloadStatus.Finish
                 current_downloading_podcast.download_percentage = ''
-                self.create_download_list()
+                self.update_download_row(current_downloading_podcast)
             if response['status'] == 'error':
                 pass
 
-    def create_download_list(self):
-        download_list = self.ids.download_list
-        self.remove_children_from_list_widget(download_list)
-        for downloading_podcast in self.downloading_podcast_list:
-            title = downloading_podcast.title
-            status = downloading_podcast.download_status.name
-            list_item = ListItemWithPercentage(text=title, secondary_text=status)
-            if downloading_podcast.download_status == DownloadStatus.Downloading:
-                list_item.ids.download_status_progress.text = downloading_podcast.download_percentage
-            download_list.add_widget(list_item)
-
-    def remove_children_from_list_widget(self, mdList):
-        child_list = []
-        for child in mdList.children:
-            child_list.append(child)
-        for child in child_list:
-            mdList.remove_widget(child)
+    def update_download_row(self, downloading_podcast):
+        ''' Update the row of a podcast in the download list on Download Screen, adding it if it is new.
+        Can be called from any thread, the row is redrawn by the next flush_lists.
+        '''
+        status = downloading_podcast.download_status.name
+        if downloading_podcast.timings:
+            status += ' - ' + ', '.join(downloading_podcast.timings)
+        progress = ''
+        if downloading_podcast.download_status == DownloadStatus.Downloading:
+            progress = downloading_podcast.download_percentage
+        self.download_list_model.set(downloading_podcast.job_id, text=downloading_podcast.title, secondary_text=status,
+                                     progress=progress)
+
+    def flush_lists(self, dt=None):
+        ''' Apply the updates of the list models to the RecycleViews of Download and Podcast Screens.
+        The RecycleViews observe their data, so assigning the changed rows only refreshes those rows.
+        '''
+        self.download_list_model.flush(self.ids.download_list.data)
+        self.podcast_list_model.flush(self.ids.podcast_list.data)
 
     def create_podcast_list(self):
         ''' Create the podcast list on Podcast Screen
 
-        Remove the existing list, create a new list according to the current playing audio
+        The download directory is only listed again when it changed. Only the rows whose icon changed, according to
+        the current playing audio, are redrawn.
         '''
-        podcast_list = self.ids.podcast_list
-        self.remove_children_from_list_widget(podcast_list)
-        arr = os.listdir('download/')
-        for filename in arr:
-            if filename.endswith('.mp3'):
-                icon = IconRightWidget(icon=self.PLAY_ICON)
-                if self.sound is not None:
-                    if self.sound.state == 'play':
-                        current_playing_filename = self.sound.source.split('\\')[-1]
-                        if current_playing_filename == filename:
-                            icon = IconRightWidget(icon=self.STOP_ICON)
-                list_item = OneLineRightIconListItem(text=filename, on_release=self.podcast_list_item_onclick)
-                list_item.add_widget(icon)
-                podcast_list.add_widget(list_item)
+        mtime = os.stat('download/').st_mtime
+        if mtime != self.podcast_directory_mtime:
+            self.podcast_directory_mtime = mtime
+            self.podcast_filenames = sorted(filename for filename in os.listdir('download/')
+                                            if filename.endswith(self.PODCAST_EXTENSIONS))
+        current_playing_filename = None
+        if self.sound is not None and self.sound.state == 'play':
+            current_playing_filename = os.path.basename(self.sound.source)
+        self.podcast_list_model.replace([
+            (filename, {'text': filename,
+                        'icon': self.STOP_ICON if filename == current_playing_filename else self.PLAY_ICON})
+            for filename in self.podcast_filenames])
+        self.flush_lists()
 
     def podcast_list_item_onclick(self, list_item):
         ''' OnClick function of the individual podcast list item on Podcast Screen.
@@ -270,41 +372,23 @@ class BL(MDBoxLayout):
         '''
         self.play_screen_podcast_name_label.text = list_item.text
         if self.sound is None:
-            for layout in list_item.children:
-                for child in layout.children:
-                    if type(child) == IconRightWidget:
-                        layout.remove_widget(child)
-                        icon = IconRightWidget(icon=self.STOP_ICON)
-                        layout.add_widget(icon)
             self.sound = SoundLoader.load(f'download/{list_item.text}')
             self.sound.play()
         else:
-            current_audio = self.sound.source.split('\\')[-1]
+            current_audio = os.path.basename(self.sound.source)
             if self.sound.state == 'play' and list_item.text == current_audio:
                 # The current playing podcast is the same as the clicked list item.
                 self.sound.stop()
                 self.sound.unload()
                 self.sound = None
                 self.play_screen_podcast_name_label.text = ''
-                for layout in list_item.children:
-                    for child in layout.children:
-                        if type(child) == IconRightWidget:
-                            layout.remove_widget(child)
-                            icon = IconRightWidget(icon=self.PLAY_ICON)
-                            layout.add_widget(icon)
             else:
                 # The playback can either be paused or currently playing another podcast.
-                # In both cases, recreate the podcast list and start the clicked podcast from beginning
+                # In both cases, start the clicked podcast from beginning
                 self.sound.unload()
                 self.sound = SoundLoader.load(f'download/{list_item.text}')
                 self.sound.play()
-                self.create_podcast_list()
-                for layout in list_item.children:
-                    for child in layout.children:
-                        if type(child) == IconRightWidget:
-                            layout.remove_widget(child)
-                            icon = IconRightWidget(icon=self.STOP_ICON)
-                            layout.add_widget(icon)
+        self.create_podcast_list()
         self.create_audio_slider()
 
     def create_audio_slider(self):
@@ -1,4 +1,11 @@
+import math
+import numpy as np
+import soundfile
 from pydub import AudioSegment, effects
+from scipy.signal import sosfilt
+
+# ITU-R BS.1770 channel weights for L, R, C, Ls, Rs.
+CHANNEL_WEIGHTS = (1.0, 1.0, 1.0, 1.41, 1.41)
 
 def normalize_audio(path_in, path_out, audio_format):
     ''' Normalize the audio volume.
@@ -22,6 +29,214 @@ def normalize_audio_with_target_dBFS(path_in, path_out, audio_format, target_dBF
         target_dBFS (float): Target dBFS the audio is going to be normalized.
     '''
     data = AudioSegment.from_file(path_in, audio_format)
-    change_in_dBFS = target_dBFS - data.dBFS
-    normalized_data = data.apply_gain(change_in_dBFS)
-    normalized_data.export(path_out, format=audio_format)
\ No newline at end of file
+    normalized_samples = normalize_samples_with_target_dBFS(segment_to_samples(data), target_dBFS)
+    samples_to_segment(normalized_samples, data).export(path_out, format=audio_format)
+
+def normalize_samples_with_target_dBFS(samples, target_dBFS):
+    ''' Normalize a sample buffer to the targeted dBFS.
+
+    Args:
+        samples (numpy.ndarray): float samples in [-1.0, 1.0].
+        target_dBFS (float): Target dBFS the samples are going to be normalized.
+    Returns:
+        numpy.ndarray: The float32 samples after applying the gain. Silent buffers are returned unchanged.
+    '''
+    current_dBFS = samples_dBFS(samples)
+    if current_dBFS == -np.inf:
+        return samples
+    gain = 10 ** ((target_dBFS - current_dBFS) / 20)
+    return (samples * gain).astype(np.float32)
+
+def samples_dBFS(samples):
+    ''' Loudness of a sample buffer in dBFS, measured the same way as AudioSegment.dBFS.
+
+    Args:
+        samples (numpy.ndarray): float samples in [-1.0, 1.0].
+    Returns:
+        float: The RMS level relative to full scale, -inf for silence.
+    '''
+    rms = np.sqrt(np.mean(np.square(samples, dtype=np.float64)))
+    if rms == 0:
+        return -np.inf
+    return 20 * np.log10(rms)
+
+def segment_to_samples(segment):
+    ''' Convert a pydub AudioSegment to float samples shaped (frames, channels). '''
+    samples = np.array(segment.get_array_of_samples(), dtype=np.float32)
+    return samples.reshape(-1, segment.channels) / segment.max_possible_amplitude
+
+def samples_to_segment(samples, template):
+    ''' Convert float samples back to an AudioSegment with the sample format of the template segment. '''
+    max_amplitude = template.max_possible_amplitude
+    pcm = np.clip(np.rint(samples * max_amplitude), -max_amplitude, max_amplitude - 1)
+    return template._spawn(pcm.astype('<i%d' % template.sample_width).tobytes())
+
+
+def k_weighting_sos(samplerate):
+    ''' The ITU-R BS.1770 K-weighting filter, a high shelf followed by a high-pass, for any sample rate.
+    At 48 kHz the coefficients are the ones given in the recommendation.
+    Returns:
+        numpy.ndarray: The two second-order sections.
+    '''
+    f0 = 1681.974450955533
+    gain = 3.999843853973347
+    q = 0.7071752369554196
+    k = math.tan(math.pi * f0 / samplerate)
+    vh = 10 ** (gain / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1.0 + k / q + k * k
+    shelf = [(vh + vb * k / q + k * k) / a0, 2.0 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0,
+             1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / q + k * k) / a0]
+
+    f0 = 38.13547087602444
+    q = 0.5003270373238773
+    k = math.tan(math.pi * f0 / samplerate)
+    a0 = 1.0 + k / q + k * k
+    high_pass = [1.0, -2.0, 1.0, 1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / q + k * k) / a0]
+    return np.array([shelf, high_pass])
+
+class RmsMeter(object):
+    ''' Measures the dBFS of a signal that arrives in blocks, the same way as samples_dBFS. '''
+
+    def __init__(self):
+        self.sum_of_squares = 0.0
+        self.count = 0
+
+    def process(self, block):
+        self.sum_of_squares += np.square(block, dtype=np.float64).sum()
+        self.count += block.size
+
+    def loudness(self):
+        ''' Returns:
+            float: The RMS level relative to full scale, -inf for silence.
+        '''
+        if self.sum_of_squares == 0:
+            return -np.inf
+        return 10 * np.log10(self.sum_of_squares / self.count)
+
+class LoudnessMeter(object):
+    ''' Measures the ITU-R BS.1770 integrated loudness of a signal that arrives in blocks, in LUFS.
+    The K-weighted energy is kept per 100 ms step, which is all the gating needs, so the memory used is a float per
+    100 ms of audio rather than the audio itself.
+
+    Args:
+        samplerate (int): The sample rate of the blocks.
+        channels (int): The number of channels of the blocks.
+    '''
+
+    def __init__(self, samplerate, channels):
+        self.sos = k_weighting_sos(samplerate)
+        self.zi = np.zeros((self.sos.shape[0], 2, channels))
+        self.weights = np.array([CHANNEL_WEIGHTS[i] if i < len(CHANNEL_WEIGHTS) else 1.0 for i in range(channels)])
+        self.step = int(round(0.1 * samplerate))
+        self.step_energy = 0.0
+        self.step_count = 0
+        self.energies = []
+
+    def process(self, block):
+        ''' Feed the next block.
+        Args:
+            block (numpy.ndarray): float samples shaped (frames, channels).
+        '''
+        weighted, self.zi = sosfilt(self.sos, block, axis=0, zi=self.zi)
+        energy = np.square(weighted).dot(self.weights)
+        offset = 0
+        while offset < len(energy):
+            count = min(self.step - self.step_count, len(energy) - offset)
+            self.step_energy += energy[offset:offset + count].sum()
+            self.step_count += count
+            offset += count
+            if self.step_count == self.step:
+                self.energies.append(self.step_energy)
+                self.step_energy = 0.0
+                self.step_count = 0
+
+    def loudness(self):
+        ''' Returns:
+            float: The gated integrated loudness in LUFS, -inf if no 400 ms block passes the gates.
+        '''
+        steps = np.array(self.energies)
+        if len(steps) < 4:
+            return -np.inf
+        # 400 ms gating blocks that overlap by 75%, four 100 ms steps each.
+        blocks = (steps[:-3] + steps[1:-2] + steps[2:-1] + steps[3:]) / (4 * self.step)
+        with np.errstate(divide='ignore'):
+            block_loudness = -0.691 + 10 * np.log10(blocks)
+        gated = blocks[block_loudness > -70.0]
+        if len(gated) == 0:
+            return -np.inf
+        relative_gate = -0.691 + 10 * np.log10(gated.mean()) - 10.0
+        gated = blocks[(block_loudness > -70.0) & (block_loudness > relative_gate)]
+        return -0.691 + 10 * np.log10(gated.mean())
+
+def create_meter(loudness_unit, samplerate, channels):
+    ''' Create the meter of the given unit, either 'dBFS' or 'LUFS'. '''
+    if loudness_unit == 'dBFS':
+        return RmsMeter()
+    if loudness_unit == 'LUFS':
+        return LoudnessMeter(samplerate, channels)
+    raise ValueError('Unknown loudness unit: %s' % loudness_unit)
+
+def samples_loudness(samples, samplerate, loudness_unit='LUFS'):
+    ''' Loudness of a sample buffer in dBFS or LUFS.
+
+    Args:
+        samples (numpy.ndarray): float samples shaped (frames,) or (frames, channels).
+        samplerate (int): The sample rate of the samples.
+        loudness_unit (str): Either 'dBFS' or 'LUFS'.
+    Returns:
+        float: The loudness, -inf for silence.
+    '''
+    if samples.ndim == 1:
+        samples = samples[:, np.newaxis]
+    meter = create_meter(loudness_unit, samplerate, samples.shape[1])
+    meter.process(samples)
+    return meter.loudness()
+
+def normalize_samples_to_target(samples, samplerate, target, loudness_unit='dBFS'):
+    ''' Normalize a sample buffer to the target loudness in dBFS or LUFS.
+
+    Args:
+        samples (numpy.ndarray): float samples shaped (frames,) or (frames, channels).
+        samplerate (int): The sample rate of the samples.
+        target (float): The target loudness, in the given unit.
+        loudness_unit (str): Either 'dBFS' or 'LUFS'.
+    Returns:
+        numpy.ndarray: The float32 samples after applying the gain. Silent buffers are returned unchanged.
+    '''
+    current_loudness = samples_loudness(samples, samplerate, loudness_unit)
+    if current_loudness == -np.inf:
+        return samples
+    gain = 10 ** ((target - current_loudness) / 20)
+    return (samples * gain).astype(np.float32)
+
+def normalize_audio_streaming(path_in, path_out, target, loudness_unit='dBFS', block_size=65536):
+    ''' Normalize the audio volume to the target loudness in constant memory.
+    The first pass measures the loudness block by block, the second pass applies the gain block by block and writes
+    the 16-bits output, so the whole signal is never held in memory.
+
+    Args:
+        path_in (str): The path to the original audio file.
+        path_out (str): The path to the new wav file.
+        target (float): The target loudness, in the given unit. Podcast platforms usually expect -16 LUFS.
+        loudness_unit (str): Either 'dBFS', the RMS level like normalize_audio_with_target_dBFS, or 'LUFS', the
+                             ITU-R BS.1770 integrated loudness.
+        block_size (int): The number of frames processed at a time.
+    Returns:
+        float: The applied gain in dB.
+    '''
+    with soundfile.SoundFile(path_in) as source:
+        meter = create_meter(loudness_unit, source.samplerate, source.channels)
+        for block in source.blocks(blocksize=block_size, dtype='float32', always_2d=True):
+            meter.process(block)
+        current_loudness = meter.loudness()
+        change = 0.0 if current_loudness == -np.inf else target - current_loudness
+        gain = 10 ** (change / 20)
+
+        source.seek(0)
+        with soundfile.SoundFile(path_out, 'w', source.samplerate, source.channels, subtype='PCM_16') as output:
+            for block in source.blocks(blocksize=block_size, dtype='float32', always_2d=True):
+                block *= gain
+                np.clip(block, -1.0, 32767 / 32768, out=block)
+                output.write(block)
+    return change
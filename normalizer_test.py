@@ -1,3 +1,7 @@
+import numpy as np
+import os
+import soundfile
+import tempfile
 import unittest
 import normalizer
 
@@ -28,4 +32,81 @@ class TestNormalizer(unittest.TestCase):
                     normalizer.normalize_audio('path_in', 'path_out', 'audio_format', 20)
                     mock_from_file.assert_called_once_with('path_in', 'audio_format')
                     mock_apply_gain.assert_called_once_with(10)
-                    mock_export.assert_called_once_with('path_out', format='audio_format')
\ No newline at end of file
+                    mock_export.assert_called_once_with('path_out', format='audio_format')
+
+    def test_normalize_samples_with_target_dBFS(self):
+        samples = np.full((1000, 2), 0.1, dtype=np.float32)
+        normalized_samples = normalizer.normalize_samples_with_target_dBFS(samples, -6.0)
+
+        self.assertAlmostEqual(-6.0, normalizer.samples_dBFS(normalized_samples), places=4)
+        self.assertEqual(np.float32, normalized_samples.dtype)
+
+    def test_normalize_samples_with_target_dBFS_silence(self):
+        samples = np.zeros(1000, dtype=np.float32)
+        normalized_samples = normalizer.normalize_samples_with_target_dBFS(samples, -6.0)
+
+        self.assertTrue((samples == normalized_samples).all())
+
+    def test_samples_dBFS_matches_audio_segment(self):
+        pcm = np.random.RandomState(0).randint(-8000, 8000, size=2000).astype(np.int16)
+        data = AudioSegment(pcm.tobytes(), frame_rate=16000, sample_width=2, channels=2)
+
+        self.assertAlmostEqual(data.dBFS, normalizer.samples_dBFS(normalizer.segment_to_samples(data)), places=2)
+
+
+    def test_k_weighting_sos(self):
+        sos = normalizer.k_weighting_sos(48000)
+
+        self.assertTrue(np.allclose([1.53512485958697, -2.69169618940638, 1.19839281085285,
+                                     1.0, -1.69065929318241, 0.73248077421585], sos[0]))
+        self.assertTrue(np.allclose([1.0, -2.0, 1.0, 1.0, -1.99004745483398, 0.99007225036621], sos[1]))
+
+    def test_samples_loudness(self):
+        samplerate = 48000
+        time = np.arange(samplerate * 5) / samplerate
+        sine = 10 ** (-23 / 20) * np.sin(2 * np.pi * 1000 * time)
+        stereo = np.stack([sine, sine], axis=1)
+
+        self.assertAlmostEqual(-23.0, normalizer.samples_loudness(stereo, samplerate), delta=0.1)
+        self.assertEqual(-np.inf, normalizer.samples_loudness(np.zeros(samplerate), samplerate))
+        self.assertAlmostEqual(normalizer.samples_dBFS(stereo), normalizer.samples_loudness(stereo, samplerate, 'dBFS'))
+
+    def test_loudness_meter_blocks(self):
+        samplerate = 16000
+        samples = np.random.RandomState(0).randn(samplerate * 3, 2) * 0.1
+        samples[samplerate:2 * samplerate] *= 0.01
+        meter = normalizer.LoudnessMeter(samplerate, 2)
+        for start in range(0, len(samples), 777):
+            meter.process(samples[start:start + 777])
+
+        self.assertAlmostEqual(normalizer.samples_loudness(samples, samplerate), meter.loudness())
+
+    def test_normalize_audio_streaming(self):
+        samplerate = 16000
+        time = np.arange(samplerate * 3) / samplerate
+        samples = np.stack([0.05 * np.sin(2 * np.pi * 440 * time)] * 2, axis=1)
+        with tempfile.TemporaryDirectory() as directory:
+            path_in = os.path.join(directory, 'input.wav')
+            path_out = os.path.join(directory, 'output.wav')
+            soundfile.write(path_in, samples, samplerate, subtype='PCM_16')
+
+            normalizer.normalize_audio_streaming(path_in, path_out, -20.0, block_size=1000)
+            normalized_samples, output_samplerate = soundfile.read(path_out)
+            self.assertEqual(samplerate, output_samplerate)
+            self.assertAlmostEqual(-20.0, normalizer.samples_dBFS(normalized_samples), delta=0.01)
+
+            normalizer.normalize_audio_streaming(path_in, path_out, -16.0, loudness_unit='LUFS', block_size=1000)
+            normalized_samples, _ = soundfile.read(path_out)
+            self.assertAlmostEqual(-16.0, normalizer.samples_loudness(normalized_samples, samplerate), delta=0.01)
+
+    def test_normalize_samples_to_target(self):
+        samples = np.random.RandomState(0).randn(16000 * 2, 2).astype(np.float32) * 0.01
+        normalized_samples = normalizer.normalize_samples_to_target(samples, 16000, -16.0, 'LUFS')
+
+        self.assertAlmostEqual(-16.0, normalizer.samples_loudness(normalized_samples, 16000), places=4)
+        self.assertTrue(np.allclose(normalizer.normalize_samples_with_target_dBFS(samples, -20.0),
+                                    normalizer.normalize_samples_to_target(samples, 16000, -20.0)))
+
+    def test_normalize_audio_streaming_unknown_unit(self):
+        with self.assertRaises(ValueError):
+            normalizer.create_meter('dB SPL', 16000, 1)
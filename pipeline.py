@@ -0,0 +1,211 @@
+import audio_buffer
+import background_separator
+import instrumentation
+import numpy as np
+import os
+import postprocess
+import queue
+import segments
+import threading
+import vad
+
+
+def run_pipeline(input_path, output_path, aggressiveness=3, target_dBFS=-20.0, lowcut=100, highcut=6000,
+                 on_stage=None, vad_workers=None, chunk_duration=None, cache=None, cache_key=None,
+                 target_LUFS=None, limit=False, sink=None):
+    ''' Turn a downloaded episode into the processed podcast audio.
+    Every stage takes and returns a sample buffer plus its sample rate, so only the final output is written to disk,
+    along with the segments.SegmentIndex of the silence removal. The index is cached with the stage results, so it
+    is written even when the silence removal is not run again.
+
+    Args:
+        input_path (str): The path to the downloaded audio file.
+        output_path (str): The path to the processed wav file.
+        aggressiveness (int): The aggressiveness of the silence detector, from 0 to 3.
+        target_dBFS (float): Target dBFS the audio is going to be normalized.
+        lowcut (int): Low-end Hz rate of the noise filter.
+        highcut (int): High-end Hz rate of the noise filter.
+        on_stage (callable): Called with the name of each stage before it starts. The names match the members of
+                             main.DownloadStatus.
+        vad_workers (int): If more than 1, prepare the audio for the silence detector in that many processes. The
+                           result is the same, see vad.analysis_copy.
+        chunk_duration (float): If set, separate the background in windows of that many seconds and remove the
+                                silence from each window while the next one is being separated, see
+                                vad.remove_silence_stream. Only a few windows of separated vocals are held in memory
+                                instead of the whole episode, but the voiced result is still collected in memory for
+                                the normalization. It is the same as without chunk_duration, at the sample rate and
+                                channels of the separated vocals. on_stage gets 'Removing_Silence' once all windows
+                                are separated.
+        cache (result_cache.ResultCache): If set with cache_key, the stage results are stored in it, and a run
+                                          resumes after the last stage whose input and parameters are unchanged.
+        cache_key (str): The identity of the source, such as the video id.
+        target_LUFS (float): If set, normalize to this ITU-R BS.1770 integrated loudness instead of target_dBFS.
+        limit (bool): Whether to soft-limit the peaks after normalizing and filtering, instead of hard clipping them
+                      when the output is written.
+        sink (object): If set, every stage that runs is measured with an instrumentation.StageTimer reporting to it.
+    '''
+    def enter(stage):
+        if on_stage is not None:
+            on_stage(stage)
+
+    def separate(samples, sample_rate):
+        return background_separator.separate_vocals(input_path)
+
+    # Values of the stage results that are not samples, cached with them. 'segment_index' is the
+    # segments.SegmentIndex.to_dict of the silence removal.
+    metadata = {}
+
+    def separate_and_remove_silence(samples, sample_rate):
+        separated_length = [0]
+
+        def separated_chunks():
+            chunks = background_separator.separate_vocals_chunked(input_path, chunk_duration)
+            try:
+                for chunk in chunks:
+                    separated_length[0] += len(chunk)
+                    yield chunk
+            finally:
+                # Stop the separator when this generator is closed early.
+                close = getattr(chunks, 'close', None)
+                if close is not None:
+                    close()
+            # The silence of the windows separated so far is removed while the next ones are separated, only the
+            # last windows are left.
+            enter('Removing_Silence')
+
+        sample_rate = background_separator.SAMPLE_RATE
+        voiced_ranges = []
+        voiced = list(vad.remove_silence_stream(iterate_in_background(separated_chunks()), sample_rate,
+                                                aggressiveness, crossfade_ms=vad_params['crossfade_ms'],
+                                                voiced_ranges=voiced_ranges))
+        # The separated vocals are stereo.
+        samples = np.concatenate(voiced) if voiced else np.zeros((0, 2), dtype=np.float32)
+        metadata['segment_index'] = segments.SegmentIndex.from_ranges(
+            voiced_ranges, sample_rate, separated_length[0],
+            int(sample_rate * vad_params['crossfade_ms'] / 1000)).to_dict()
+        return samples, sample_rate
+
+    def remove_silence(samples, sample_rate):
+        index = vad.detect_segments(samples, sample_rate, aggressiveness, workers=vad_workers,
+                                    crossfade_ms=vad_params['crossfade_ms'])
+        metadata['segment_index'] = index.to_dict()
+        return vad.splice_segments(samples, index.ranges(), index.crossfade_samples), sample_rate
+
+    if target_LUFS is None:
+        loudness_params = {'target': target_dBFS, 'loudness_unit': 'dBFS'}
+    else:
+        loudness_params = {'target': target_LUFS, 'loudness_unit': 'LUFS'}
+
+    filters = postprocess.default_filters(lowcut, highcut)
+
+    def normalize_and_filter_noise(samples, sample_rate):
+        return postprocess.postprocess_samples(samples, sample_rate, filters=filters, limit=limit,
+                                               **loudness_params), sample_rate
+
+    separation_params = {'model': 'spleeter:2stems'}
+    vad_params = {'aggressiveness': aggressiveness, 'frame_duration_ms': 30, 'padding_duration_ms': 600,
+                  'crossfade_ms': 10}
+    if chunk_duration is None:
+        stages = [
+            ('Separating_Background', separation_params, separate),
+            # vad_workers is not a parameter, the segments do not depend on it.
+            ('Removing_Silence', dict(vad_params, analysis_sample_rate=16000), remove_silence),
+        ]
+    else:
+        separation_params = dict(separation_params, chunk_duration=chunk_duration)
+        stages = [('Separating_Background', dict(separation_params, **vad_params), separate_and_remove_silence)]
+    # Gain, noise filter and limiter run in one loop over the samples, see postprocess.PostProcessor.
+    postprocess_params = dict(loudness_params, filters=filters, limit=limit)
+    stages.append(('Normalizing_Volume', postprocess_params, normalize_and_filter_noise))
+
+    use_cache = cache is not None and cache_key is not None
+    keys = []
+    key = cache_key
+    for stage, params, _ in stages:
+        key = cache.stage_key(key, stage, params) if use_cache else None
+        keys.append(key)
+
+    samples, sample_rate = None, None
+    first_stage = 0
+    if use_cache:
+        for stage_index in reversed(range(len(stages))):
+            cached = cache.get_with_metadata(keys[stage_index])
+            if cached is not None:
+                samples, sample_rate, cached_metadata = cached
+                metadata.update(cached_metadata)
+                first_stage = stage_index + 1
+                break
+
+    for stage_index in range(first_stage, len(stages)):
+        stage, _, func = stages[stage_index]
+        enter(stage)
+        audio_duration = None if samples is None else len(samples) / sample_rate
+        with instrumentation.StageTimer(stage, sink, audio_duration) as timer:
+            samples, sample_rate = func(samples, sample_rate)
+            if timer.audio_duration is None:
+                # The first stage reads the source itself, measure it by its output.
+                timer.audio_duration = len(samples) / sample_rate
+        if use_cache:
+            cache.put(keys[stage_index], samples, sample_rate, metadata)
+
+    audio_buffer.write_audio(output_path, samples, sample_rate)
+    sidecar_path = segments.sidecar_path(output_path)
+    if 'segment_index' in metadata:
+        segments.SegmentIndex.from_dict(metadata['segment_index']).save(sidecar_path)
+    elif os.path.exists(sidecar_path):
+        # Left by an earlier run, it does not describe this output.
+        os.remove(sidecar_path)
+
+
+def iterate_in_background(iterable, max_pending=2, poll_interval=0.1):
+    ''' Produce the items of an iterable on a separate thread.
+    The producer runs at most max_pending items ahead of the consumer, so a slow stage and the stage after it work
+    at the same time without buffering the whole stream. If the consumer stops early or raises, the producer stops
+    within poll_interval seconds and the iterable is closed if it has a close method, like generators do.
+
+    Args:
+        iterable (iterable): The items to produce.
+        max_pending (int): The number of produced items that may wait for the consumer.
+        poll_interval (float): The seconds the producer waits for room in the queue before it checks whether the
+                               consumer stopped.
+    Yields:
+        The items of the iterable, in order. An exception raised by the iterable is raised here.
+    '''
+    items = queue.Queue(maxsize=max_pending)
+    stopped = threading.Event()
+    done = object()
+
+    def put(entry):
+        while not stopped.is_set():
+            try:
+                items.put(entry, timeout=poll_interval)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        iterator = iter(iterable)
+        try:
+            for item in iterator:
+                if not put((item, None)):
+                    return
+            put((done, None))
+        except Exception as e:
+            put((None, e))
+        finally:
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            item, error = items.get()
+            if error is not None:
+                raise error
+            if item is done:
+                return
+            yield item
+    finally:
+        stopped.set()
@@ -0,0 +1,130 @@
+import instrumentation
+import numpy as np
+import os
+import pipeline
+import result_cache
+import segments
+import soundfile
+import tempfile
+import threading
+import unittest
+import vad
+
+from unittest.mock import patch
+
+
+def detect_segments(samples, sample_rate, aggressiveness, **kwargs):
+    ''' Keep the whole input. '''
+    return segments.SegmentIndex.from_ranges([(0, len(samples))], sample_rate, len(samples))
+
+
+class TestPipeline(unittest.TestCase):
+    def test_run_pipeline(self):
+        sample_rate = 16000
+        time = np.arange(sample_rate * 2) / sample_rate
+        vocals = np.stack([0.5 * np.sin(2 * np.pi * 440 * time)] * 2, axis=1).astype(np.float32)
+        stages = []
+        events = []
+        with tempfile.TemporaryDirectory() as directory:
+            output_path = os.path.join(directory, 'output.wav')
+            with patch('background_separator.separate_vocals', return_value=(vocals, sample_rate)) as mock_separate:
+                with patch('vad.detect_segments', side_effect=detect_segments) as mock_detect_segments:
+                    pipeline.run_pipeline('input.mp3', output_path, on_stage=stages.append,
+                                          sink=instrumentation.CallbackSink(events.append))
+                    mock_separate.assert_called_once_with('input.mp3')
+                    mock_detect_segments.assert_called_once()
+            info = soundfile.info(output_path)
+            index = segments.SegmentIndex.load(os.path.join(directory, 'output.segments.json'))
+
+        self.assertEqual([(0, len(time))], index.ranges())
+        self.assertEqual(['Separating_Background', 'Removing_Silence', 'Normalizing_Volume'], stages)
+        self.assertEqual(stages, [event['stage'] for event in events])
+        self.assertEqual([2.0] * 3, [event['audio_duration'] for event in events])
+        self.assertEqual(sample_rate, info.samplerate)
+        self.assertEqual(2, info.channels)
+        self.assertEqual('PCM_16', info.subtype)
+        self.assertEqual(len(time), info.frames)
+
+    def test_run_pipeline_chunked(self):
+        sample_rate = 44100
+        rng = np.random.RandomState(0)
+        time = np.arange(sample_rate) / sample_rate
+        speech = 0.5 * np.sin(2 * np.pi * 300 * time) * (1 + np.sin(2 * np.pi * 4 * time)) / 2
+        silence = np.zeros(sample_rate)
+        vocals = np.concatenate([silence, speech + 0.05 * rng.randn(len(time)), silence])
+        vocals = np.stack([vocals, vocals], axis=1).astype(np.float32)
+        chunks = [vocals[start:start + 20000] for start in range(0, len(vocals), 20000)]
+        with tempfile.TemporaryDirectory() as directory:
+            output_path = os.path.join(directory, 'output.wav')
+            with patch('background_separator.separate_vocals_chunked', return_value=iter(chunks)) as mock_separate:
+                stages = []
+                pipeline.run_pipeline('input.mp3', output_path, 1, chunk_duration=10, on_stage=stages.append)
+                mock_separate.assert_called_once_with('input.mp3', 10)
+            info = soundfile.info(output_path)
+            index = segments.SegmentIndex.load(segments.sidecar_path(output_path))
+
+        # The silence is cut from the separated vocals themselves, as without chunks.
+        expected_index = vad.detect_segments(vocals, sample_rate, 1)
+        self.assertEqual(['Separating_Background', 'Removing_Silence', 'Normalizing_Volume'], stages)
+        self.assertEqual(expected_index.to_dict(), index.to_dict())
+        self.assertEqual(info.frames, index.output_length())
+        self.assertEqual(sample_rate, info.samplerate)
+        self.assertEqual(2, info.channels)
+        self.assertGreater(info.frames, 0)
+        self.assertLess(info.frames, len(vocals))
+
+    def test_run_pipeline_with_cache(self):
+        sample_rate = 16000
+        vocals = np.full((sample_rate, 2), 0.1, dtype=np.float32)
+        with tempfile.TemporaryDirectory() as directory:
+            cache = result_cache.ResultCache(os.path.join(directory, 'cache'))
+            output_path = os.path.join(directory, 'output.wav')
+            with patch('background_separator.separate_vocals', return_value=(vocals, sample_rate)) as mock_separate:
+                with patch('vad.detect_segments', side_effect=detect_segments):
+                    pipeline.run_pipeline('input.mp3', output_path, cache=cache, cache_key='video_id')
+                    sidecar_path = segments.sidecar_path(output_path)
+                    os.remove(sidecar_path)
+                    stages = []
+                    pipeline.run_pipeline('input.mp3', output_path, cache=cache, cache_key='video_id',
+                                          on_stage=stages.append)
+                    self.assertEqual([], stages)
+                    # The index of the cached silence removal is written again.
+                    self.assertEqual([(0, sample_rate)], segments.SegmentIndex.load(sidecar_path).ranges())
+                    pipeline.run_pipeline('input.mp3', output_path, highcut=4000, cache=cache, cache_key='video_id',
+                                          on_stage=stages.append)
+                    self.assertEqual(['Normalizing_Volume'], stages)
+                    stages = []
+                    pipeline.run_pipeline('input.mp3', output_path, aggressiveness=1, cache=cache,
+                                          cache_key='video_id', on_stage=stages.append)
+                    self.assertEqual(['Removing_Silence', 'Normalizing_Volume'], stages)
+                    mock_separate.assert_called_once_with('input.mp3')
+            self.assertTrue(os.path.exists(output_path))
+
+    def test_iterate_in_background_stopped_early(self):
+        closed = threading.Event()
+
+        def endless():
+            try:
+                while True:
+                    yield 1
+            finally:
+                closed.set()
+
+        items = pipeline.iterate_in_background(endless(), poll_interval=0.01)
+        self.assertEqual(1, next(items))
+        items.close()
+        self.assertTrue(closed.wait(5))
+
+    def test_iterate_in_background(self):
+        self.assertEqual(list(range(10)), list(pipeline.iterate_in_background(range(10))))
+
+        def failing():
+            yield 1
+            raise ValueError('invalid')
+
+        with self.assertRaises(ValueError):
+            list(pipeline.iterate_in_background(failing()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import bandfilter
+import normalizer
+import numpy as np
+import os
+import postprocess
+import soundfile
+import tempfile
+import unittest
+
+
+class TestPostprocess(unittest.TestCase):
+    def make_samples(self, samplerate):
+        rng = np.random.RandomState(0)
+        time = np.arange(samplerate * 2) / samplerate
+        tone = 0.1 * np.sin(2 * np.pi * 1000 * time) + 0.02 * rng.randn(len(time))
+        return np.stack([tone, tone[::-1]], axis=1).astype(np.float32)
+
+    def test_soft_limit(self):
+        block = np.array([0.5, -0.95, 3.0, -10.0], dtype=np.float32)
+        postprocess.soft_limit(block)
+
+        self.assertEqual(0.5, block[0])
+        self.assertTrue(np.all(np.abs(block[1:]) > 0.9))
+        self.assertTrue(np.all(np.abs(block) <= 1.0))
+        self.assertEqual([1, -1, 1, -1], list(np.sign(block)))
+
+    def test_postprocess_samples_equals_separate_stages(self):
+        samplerate = 16000
+        samples = self.make_samples(samplerate)
+        output = postprocess.postprocess_samples(samples, samplerate, -20.0, limit=False, block_size=1000)
+
+        normalized = normalizer.normalize_samples_to_target(samples, samplerate, -20.0)
+        expected = bandfilter.FilterBank(postprocess.default_filters()).block_filter(samplerate, (2,)).process(normalized)
+        self.assertEqual(np.float32, output.dtype)
+        np.testing.assert_allclose(expected, output, atol=1e-5)
+
+    def test_postprocess_file(self):
+        samplerate = 16000
+        samples = self.make_samples(samplerate)
+        expected = postprocess.postprocess_samples(samples, samplerate, -3.0, limit=True, block_size=4096)
+        # The blocks of the loudness pass are either kept or decoded again.
+        for max_buffered_frames in (postprocess.MAX_BUFFERED_FRAMES, 0):
+            with tempfile.TemporaryDirectory() as directory:
+                input_path = os.path.join(directory, 'input.wav')
+                output_path = os.path.join(directory, 'output.wav')
+                soundfile.write(input_path, samples, samplerate, subtype='FLOAT')
+                postprocess.postprocess_file(input_path, output_path, -3.0, limit=True, block_size=1000,
+                                             max_buffered_frames=max_buffered_frames)
+                output, output_samplerate = soundfile.read(output_path, dtype='float32')
+                info = soundfile.info(output_path)
+
+            self.assertEqual(samplerate, output_samplerate)
+            self.assertEqual('PCM_16', info.subtype)
+            self.assertEqual(samples.shape, output.shape)
+            self.assertLessEqual(np.max(np.abs(output)), 1.0)
+            np.testing.assert_allclose(expected, output, atol=2 / 32768)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,183 @@
+import audio_buffer
+import functools
+import importlib.util
+import librosa
+import math
+import numpy as np
+import soundfile
+from scipy.signal import firwin, resample_poly
+
+ENGINES = ('poly', 'sinc')
+
+
+def resample(samples, orig_sr, target_sr, engine='poly'):
+    ''' Resample a sample buffer directly from its rate to the target rate.
+    Args:
+        samples (numpy.ndarray): float samples shaped (frames,) or (frames, channels).
+        orig_sr (int): The sample rate of the samples.
+        target_sr (int): The sample rate of the result.
+        engine (str): 'poly' for scipy's polyphase filter over the reduced integer ratio, or 'sinc' for the
+                      fast band-limited sinc resampler of librosa (resampy's kaiser_fast), which needs resampy.
+    Returns:
+        numpy.ndarray: The resampled float32 samples, with the same channel layout.
+    '''
+    if engine not in ENGINES:
+        raise ValueError('Unknown resampling engine: {}'.format(engine))
+    if engine == 'sinc' and importlib.util.find_spec('resampy') is None:
+        raise ImportError("The 'sinc' resampling engine needs resampy, install it or use the 'poly' engine")
+    if orig_sr == target_sr:
+        return samples.astype(np.float32, copy=False)
+    divisor = math.gcd(orig_sr, target_sr)
+    up, down = target_sr // divisor, orig_sr // divisor
+    if engine == 'poly':
+        resampled = resample_poly(samples, up, down, axis=0)
+    else:
+        resampled = librosa.resample(samples.T, orig_sr=orig_sr, target_sr=target_sr, res_type='kaiser_fast').T
+        # librosa rounds the length with a float ratio and can add a sample, keep the length of the poly engine.
+        resampled = resampled[:(len(samples) * up + down - 1) // down]
+    return resampled.astype(np.float32, copy=False)
+
+
+def load(path, sample_rate=None, mono=False, engine='poly'):
+    ''' Decode an audio file once at its native rate, then down-mix and resample it in memory.
+    Unlike librosa.load with its default sr, the audio is never resampled twice.
+    Args:
+        path (str): The path to the audio file, or a file object.
+        sample_rate (int): The sample rate of the result, the native one if None.
+        mono (bool): Whether to down-mix the channels.
+        engine (str): The resampling engine, see resample.
+    Returns:
+        numpy.ndarray: float32 samples shaped (frames,) for mono or (frames, channels).
+        int: The sample rate of the samples.
+        str: The soundfile subtype of the source, such as 'PCM_16'.
+    '''
+    with soundfile.SoundFile(path) as source:
+        subtype = source.subtype
+        native_sample_rate = source.samplerate
+        samples = source.read(dtype='float32')
+    if mono:
+        samples = audio_buffer.to_mono(samples)
+    if sample_rate is not None and sample_rate != native_sample_rate:
+        samples = resample(samples, native_sample_rate, sample_rate, engine)
+    return samples, sample_rate or native_sample_rate, subtype
+
+
+def convert_file(original_path, output_path, sample_rate=None, mono=False, subtype='PCM_16', engine='poly'):
+    ''' Decode an audio file once and write it with any of another rate, a single channel and another sample format.
+    Args:
+        original_path (str): The path to the original audio file, or a file object.
+        output_path (str): The path to the new audio file, or a file object.
+        sample_rate (int): The sample rate of the new file, the original one if None.
+        mono (bool): Whether to down-mix the channels.
+        subtype (str): The soundfile subtype of the new file, the original one if None.
+        engine (str): The resampling engine, see resample.
+    '''
+    samples, sample_rate, original_subtype = load(original_path, sample_rate, mono, engine)
+    soundfile.write(output_path, samples, sample_rate, subtype=subtype or original_subtype)
+
+
+class BlockResampler(object):
+    ''' Polyphase resampler for audio that arrives in blocks.
+    Each block is filtered together with enough of its neighbours that the concatenated output equals
+    scipy.signal.resample_poly over the whole signal, while only a block and a short context are kept in memory.
+    Args:
+        orig_sr (int): The sample rate of the incoming samples.
+        target_sr (int): The sample rate of the produced samples.
+    '''
+
+    def __init__(self, orig_sr, target_sr):
+        divisor = math.gcd(orig_sr, target_sr)
+        self.up = target_sr // divisor
+        self.down = orig_sr // divisor
+        max_rate = max(self.up, self.down)
+        half_len = 10 * max_rate
+        # The same filter resample_poly designs by default.
+        self.fir = firwin(2 * half_len + 1, 1.0 / max_rate, window=('kaiser', 5.0))
+        # Input samples needed on each side of a block, a multiple of down so blocks start on an output sample.
+        self.context = self.down * int(math.ceil((half_len / self.up + 2) / self.down))
+        self.pending = np.zeros(self.context, dtype=np.float32)
+
+    def process(self, samples):
+        ''' Resample the next block of monophonic samples.
+        Args:
+            samples (numpy.ndarray): The next float samples.
+        Returns:
+            numpy.ndarray: The resampled samples that are complete so far.
+        '''
+        self.pending = np.concatenate([self.pending, samples.astype(np.float32)])
+        usable = len(self.pending) - 2 * self.context
+        usable -= usable % self.down
+        if usable <= 0:
+            return np.zeros(0, dtype=np.float32)
+        resampled = self._resample(self.pending[:usable + 2 * self.context], usable * self.up // self.down)
+        self.pending = self.pending[usable:]
+        return resampled
+
+    def flush(self):
+        ''' Resample the samples left after the last block.
+        Returns:
+            numpy.ndarray: The remaining resampled samples.
+        '''
+        remaining = len(self.pending) - self.context
+        padded = np.concatenate([self.pending, np.zeros(self.context, dtype=np.float32)])
+        self.pending = np.zeros(self.context, dtype=np.float32)
+        return self._resample(padded, int(math.ceil(remaining * self.up / self.down)))
+
+    def shards(self, samples, shard_length):
+        ''' Split monophonic samples into shards that can be resampled independently, see resample_shard.
+        Args:
+            samples (numpy.ndarray): The whole float samples.
+            shard_length (int): The number of samples per shard, rounded down to a multiple of the decimation factor
+                                so every shard starts on an output sample.
+        Yields:
+            (numpy.ndarray, int): The samples of a shard with the context on both sides, zero-padded at the edges of
+                                  the signal, and the number of resampled samples it produces.
+        '''
+        shard_length = max(shard_length - shard_length % self.down, self.down)
+        padding = np.zeros(self.context, dtype=np.float32)
+        padded = np.concatenate([padding, samples.astype(np.float32), padding])
+        for start in range(0, len(samples), shard_length):
+            end = min(start + shard_length, len(samples))
+            count = -(-end * self.up // self.down) - start * self.up // self.down
+            yield padded[start:end + 2 * self.context], count
+
+    def resample_shard(self, shard):
+        ''' Resample a shard made by shards.
+        Args:
+            shard ((numpy.ndarray, int)): The samples of the shard with its context, and the resampled length.
+        Returns:
+            numpy.ndarray: The resampled samples of the shard.
+        '''
+        segment, count = shard
+        return self._resample(segment, count)
+
+    def _resample(self, segment, count):
+        start = self.context * self.up // self.down
+        resampled = resample_poly(segment, self.up, self.down, window=self.fir)
+        return resampled[start:start + count].astype(np.float32)
+
+
+def resample_shards(samples, orig_sr, target_sr, shard_length, map_function=map):
+    ''' Resample monophonic samples in shards that do not depend on each other, such as in a process pool.
+    Every shard is filtered with the context of its neighbours, like the blocks of BlockResampler, so the result
+    only depends on the samples and shard_length, and not on where or in which order the shards are resampled.
+    Args:
+        samples (numpy.ndarray): Monophonic float samples.
+        orig_sr (int): The sample rate of the samples.
+        target_sr (int): The sample rate of the result.
+        shard_length (int): The number of samples per shard, see BlockResampler.shards.
+        map_function (callable): Applies a function to every shard, in order, such as the map of a
+                                 concurrent.futures executor.
+    Returns:
+        numpy.ndarray: The resampled float32 samples.
+    '''
+    block_resampler = BlockResampler(orig_sr, target_sr)
+    resampled = list(map_function(functools.partial(_resample_shard, block_resampler),
+                                  block_resampler.shards(samples, shard_length)))
+    if not resampled:
+        return np.zeros(0, dtype=np.float32)
+    return np.concatenate(resampled)
+
+
+def _resample_shard(block_resampler, shard):
+    return block_resampler.resample_shard(shard)
@@ -0,0 +1,92 @@
+import importlib.util
+import numpy as np
+import os
+import resampler
+import soundfile
+import tempfile
+import unittest
+
+from scipy.signal import resample_poly
+
+
+class TestResampler(unittest.TestCase):
+    def test_resample(self):
+        time = np.arange(44100) / 44100
+        tone = np.sin(2 * np.pi * 440 * time).astype(np.float32)
+        samples = np.stack([tone, -tone], axis=1)
+        expected_time = np.arange(48000) / 48000
+        expected = np.sin(2 * np.pi * 440 * expected_time)
+
+        for engine in resampler.ENGINES:
+            if engine == 'sinc' and importlib.util.find_spec('resampy') is None:
+                continue
+            resampled = resampler.resample(samples, 44100, 48000, engine)
+            self.assertEqual(np.float32, resampled.dtype)
+            self.assertEqual((48000, 2), resampled.shape)
+            # Away from the edges both engines reproduce the tone.
+            np.testing.assert_allclose(expected[1000:-1000], resampled[1000:-1000, 0], atol=1e-2)
+            np.testing.assert_allclose(-resampled[:, 0], resampled[:, 1])
+
+    @unittest.skipIf(importlib.util.find_spec('resampy') is not None, 'resampy is installed')
+    def test_resample_sinc_without_resampy(self):
+        with self.assertRaisesRegex(ImportError, 'resampy'):
+            resampler.resample(np.zeros(100), 44100, 48000, 'sinc')
+
+    def test_resample_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            resampler.resample(np.zeros(100), 44100, 48000, 'linear')
+
+    def test_load(self):
+        samples = np.random.RandomState(0).uniform(-0.5, 0.5, (22050, 2)).astype(np.float32)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'input.wav')
+            soundfile.write(path, samples, 22050, subtype='PCM_24')
+            loaded, sample_rate, subtype = resampler.load(path, 16000, mono=True)
+
+        expected = resample_poly(samples.mean(axis=1), 320, 441)
+        self.assertEqual(16000, sample_rate)
+        self.assertEqual('PCM_24', subtype)
+        self.assertEqual(1, loaded.ndim)
+        np.testing.assert_allclose(expected, loaded, atol=1e-5)
+
+    def test_convert_file(self):
+        samples = np.random.RandomState(0).uniform(-0.5, 0.5, (44100, 2)).astype(np.float32)
+        with tempfile.TemporaryDirectory() as directory:
+            input_path = os.path.join(directory, 'input.wav')
+            output_path = os.path.join(directory, 'output.wav')
+            soundfile.write(input_path, samples, 44100, subtype='FLOAT')
+            resampler.convert_file(input_path, output_path, sample_rate=48000, mono=True)
+            info = soundfile.info(output_path)
+
+        self.assertEqual(48000, info.samplerate)
+        self.assertEqual(1, info.channels)
+        self.assertEqual('PCM_16', info.subtype)
+        self.assertEqual(48000, info.frames)
+
+    def test_block_resampler(self):
+        samples = np.random.RandomState(0).randn(20000).astype(np.float32)
+        block_resampler = resampler.BlockResampler(44100, 48000)
+        resampled = [block_resampler.process(samples[i:i + 3000]) for i in range(0, len(samples), 3000)]
+        resampled = np.concatenate(resampled + [block_resampler.flush()])
+
+        expected = resample_poly(samples, 160, 147)
+        self.assertEqual(len(expected), len(resampled))
+        self.assertTrue(np.allclose(expected, resampled, atol=1e-5))
+
+    def test_resample_shards(self):
+        samples = np.random.RandomState(0).randn(20000).astype(np.float32)
+        block_resampler = resampler.BlockResampler(44100, 16000)
+        expected = np.concatenate([block_resampler.process(samples), block_resampler.flush()])
+
+        def map_in_reverse(function, shards):
+            # The shards are independent, so the order they are resampled in does not matter.
+            return reversed([function(shard) for shard in reversed(list(shards))])
+
+        np.testing.assert_array_equal(expected, resampler.resample_shards(samples, 44100, 16000, 3000))
+        np.testing.assert_array_equal(expected, resampler.resample_shards(samples, 44100, 16000, 3000,
+                                                                          map_in_reverse))
+        self.assertEqual(0, len(resampler.resample_shards(np.zeros(0), 44100, 16000, 3000)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+
+class ResultCache(object):
+    ''' Content-addressed store for the sample buffers produced by the pipeline stages.
+    Each result is stored under a key derived from the source video and the parameters of every stage that produced
+    it, see stage_key. The least recently used results are evicted once the stored results exceed max_bytes.
+
+    Args:
+        directory (str): The directory the results and their index are stored in.
+        max_bytes (int): The disk budget of the cache.
+    '''
+
+    def __init__(self, directory='cache/', max_bytes=5 * 1024 ** 3):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(directory, 'index.json')
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.index = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+
+    @staticmethod
+    def stage_key(parent_key, stage, params):
+        ''' The key of a stage result.
+        Args:
+            parent_key (str): The key of the stage input, the video id for the first stage.
+            stage (str): The name of the stage.
+            params (dict): JSON-serializable parameters that change the stage output.
+        Returns:
+            str: A hex digest that changes whenever the input or any of the parameters change.
+        '''
+        description = json.dumps([parent_key, stage, params], sort_keys=True)
+        return hashlib.sha256(description.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        ''' Load a stored result and mark it as recently used.
+        Args:
+            key (str): The key of the result.
+        Returns:
+            (numpy.ndarray, int): The samples and the sample rate, or None if the result is not stored.
+        '''
+        result = self.get_with_metadata(key)
+        return None if result is None else result[:2]
+
+    def get_with_metadata(self, key):
+        ''' Load a stored result with its metadata and mark it as recently used.
+        Args:
+            key (str): The key of the result.
+        Returns:
+            (numpy.ndarray, int, dict): The samples, the sample rate and the metadata given to put, or None if the
+                                        result is not stored.
+        '''
+        with self.lock:
+            entry = self.index.get(key)
+            if entry is None:
+                return None
+            path = self._path(key)
+            if not os.path.exists(path):
+                del self.index[key]
+                self._save_index()
+                return None
+            entry['last_access'] = time.time()
+            self._save_index()
+        try:
+            # Loaded outside of the lock, so a put evicting the result at the same time can remove the file first.
+            samples = np.load(path)
+        except OSError:
+            return None
+        return samples, entry['sample_rate'], entry.get('metadata', {})
+
+    def put(self, key, samples, sample_rate, metadata=None):
+        ''' Store a result, then evict the least recently used results until the cache fits its budget.
+        Args:
+            key (str): The key of the result.
+            samples (numpy.ndarray): The samples.
+            sample_rate (int): The sample rate of the samples.
+            metadata (dict): JSON-serializable values stored with the result, kept in the index.
+        '''
+        path = self._path(key)
+        temporary_path = path + '.tmp.npy'
+        np.save(temporary_path, samples)
+        os.replace(temporary_path, path)
+        with self.lock:
+            self.index[key] = {
+                'size': os.path.getsize(path),
+                'sample_rate': sample_rate,
+                'last_access': time.time(),
+                'metadata': metadata or {},
+            }
+            self._evict()
+            self._save_index()
+
+    def size(self):
+        ''' The number of bytes taken by the stored results. '''
+        with self.lock:
+            return sum(entry['size'] for entry in self.index.values())
+
+    def _evict(self):
+        total = sum(entry['size'] for entry in self.index.values())
+        for key in sorted(self.index, key=lambda k: self.index[k]['last_access']):
+            if total <= self.max_bytes:
+                break
+            total -= self.index.pop(key)['size']
+            if os.path.exists(self._path(key)):
+                os.remove(self._path(key))
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npy')
+
+    def _save_index(self):
+        temporary_path = self.index_path + '.tmp'
+        with open(temporary_path, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(temporary_path, self.index_path)
@@ -0,0 +1,63 @@
+import numpy as np
+import os
+import result_cache
+import tempfile
+import time
+import unittest
+
+from unittest.mock import patch
+
+
+class TestResultCache(unittest.TestCase):
+    def test_stage_key(self):
+        key = result_cache.ResultCache.stage_key('video_id', 'Removing_Silence', {'aggressiveness': 3, 'frame': 30})
+
+        self.assertEqual(key, result_cache.ResultCache.stage_key('video_id', 'Removing_Silence',
+                                                                 {'frame': 30, 'aggressiveness': 3}))
+        self.assertNotEqual(key, result_cache.ResultCache.stage_key('video_id', 'Removing_Silence',
+                                                                    {'aggressiveness': 2, 'frame': 30}))
+        self.assertNotEqual(key, result_cache.ResultCache.stage_key('other_id', 'Removing_Silence',
+                                                                    {'aggressiveness': 3, 'frame': 30}))
+
+    def test_put_and_get(self):
+        samples = np.linspace(-1, 1, 100, dtype=np.float32)
+        with tempfile.TemporaryDirectory() as directory:
+            cache = result_cache.ResultCache(directory)
+            self.assertIsNone(cache.get('key'))
+            cache.put('key', samples, 16000)
+            cached_samples, sample_rate = result_cache.ResultCache(directory).get('key')
+
+        self.assertEqual(16000, sample_rate)
+        self.assertTrue((samples == cached_samples).all())
+
+    def test_get_evicted_while_loading(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = result_cache.ResultCache(directory)
+            cache.put('key', np.zeros(100, dtype=np.float32), 16000)
+            # Like a concurrent put evicting the result between the index lookup and the load.
+            with patch('numpy.load', side_effect=FileNotFoundError):
+                self.assertIsNone(cache.get('key'))
+
+    def test_lru_eviction(self):
+        samples = np.zeros(1000, dtype=np.float32)
+        with tempfile.TemporaryDirectory() as directory:
+            cache = result_cache.ResultCache(directory)
+            cache.put('first', samples, 16000)
+            entry_size = cache.size()
+            cache.max_bytes = 2 * entry_size
+            time.sleep(0.01)
+            cache.put('second', samples, 16000)
+            time.sleep(0.01)
+            cache.get('first')
+            time.sleep(0.01)
+            cache.put('third', samples, 16000)
+
+            self.assertIsNotNone(cache.get('first'))
+            self.assertIsNone(cache.get('second'))
+            self.assertIsNotNone(cache.get('third'))
+            self.assertEqual(2 * entry_size, cache.size())
+            self.assertFalse(os.path.exists(os.path.join(directory, 'second.npy')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,233 @@
+import itertools
+import json
+import os
+import queue
+import sys
+import threading
+import uuid
+
+
+class JobCancelled(Exception):
+    ''' Raised inside a stage function when its job has been cancelled. '''
+
+
+class Job(object):
+    ''' A unit of work that moves through the stages of a Scheduler.
+    Args:
+        job_id (str): The unique id of the job.
+        url (str): The url the job is processing.
+        priority (int): Jobs with a higher priority are taken first within a stage.
+        stage_index (int): The index of the next stage the job has to run.
+        data (dict): JSON-serializable values the stages hand to each other, persisted with the queue.
+    '''
+
+    def __init__(self, job_id, url, priority=0, stage_index=0, data=None):
+        self.job_id = job_id
+        self.url = url
+        self.priority = priority
+        self.stage_index = stage_index
+        self.data = data if data is not None else {}
+        self.state = 'queued'
+        self.error = None
+        self.cancel_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def check_cancelled(self):
+        ''' Stop a running stage of a cancelled job, by raising JobCancelled. '''
+        if self.cancelled:
+            raise JobCancelled(self.job_id)
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'url': self.url,
+            'priority': self.priority,
+            'stage_index': self.stage_index,
+            'data': self.data,
+        }
+
+
+class Stage(object):
+    ''' A step of the processing, with its own bounded pool of worker threads.
+    Args:
+        name (str): The name of the stage.
+        func (callable): Called with the Job. It stores its results in job.data for the following stages, and may
+                         return the path of its output, recorded as the artifact of the stage by a JobStore.
+        workers (int): The number of jobs this stage runs at the same time.
+    '''
+
+    def __init__(self, name, func, workers):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.queue = queue.PriorityQueue()
+        self.threads = []
+
+
+class Scheduler(object):
+    ''' Runs jobs through a sequence of stages, each with a bounded worker pool.
+    Network-bound stages such as downloading can run more jobs in parallel than CPU-bound ones such as background
+    separation, instead of every job starting all of its work at once. Jobs that have not finished are written to
+    queue_path or to store, and are queued again at the first stage they did not complete when the scheduler is
+    started next time.
+    Args:
+        stages (list(Stage)): The stages every job runs through, in order.
+        queue_path (str): The JSON file the unfinished jobs are persisted to. Nothing is persisted if None.
+        on_update (callable): Called with the Job whenever its state or stage changes.
+        store (job_store.JobStore): If set, every job and every completed stage is recorded in it instead of
+                                    queue_path.
+    '''
+
+    def __init__(self, stages, queue_path=None, on_update=None, store=None):
+        self.stages = stages
+        self.queue_path = queue_path
+        self.on_update = on_update
+        self.store = store
+        # The unfinished jobs by id.
+        self.jobs = {}
+        self.lock = threading.Lock()
+        # Keeps jobs of the same priority in submission order.
+        self.counter = itertools.count()
+
+    def start(self):
+        ''' Start the worker threads and queue the jobs persisted by a previous run.
+        Returns:
+            list(Job): The restored jobs.
+        '''
+        for stage_index, stage in enumerate(self.stages):
+            for _ in range(stage.workers):
+                thread = threading.Thread(target=self._work, args=(stage_index,), daemon=True)
+                thread.start()
+                stage.threads.append(thread)
+        return self._restore()
+
+    def submit(self, url, priority=0, job_id=None, data=None):
+        ''' Queue a new job at the first stage.
+        Args:
+            url (str): The url the job is processing.
+            priority (int): Jobs with a higher priority are taken first within a stage.
+            job_id (str): The unique id of the job, a random one is used if None.
+            data (dict): Initial values for job.data.
+        Returns:
+            Job: The queued job.
+        '''
+        job = Job(job_id or uuid.uuid4().hex, url, priority, data=data)
+        with self.lock:
+            self.jobs[job.job_id] = job
+        self._enqueue(job)
+        self._save(job)
+        return job
+
+    def cancel(self, job_id):
+        ''' Cancel a job. A queued job is dropped when a worker reaches it, a running stage stops the next time it
+        calls job.check_cancelled().
+        Args:
+            job_id (str): The id of the job.
+        Returns:
+            bool: False if there is no such unfinished job.
+        '''
+        with self.lock:
+            job = self.jobs.get(job_id)
+        if job is None or job.state in ('finished', 'failed', 'cancelled'):
+            return False
+        job.cancel_event.set()
+        return True
+
+    def shutdown(self):
+        ''' Let every stage finish its queued jobs, then stop the worker threads. '''
+        for stage in self.stages:
+            for _ in stage.threads:
+                # Sorts after every job, so the queue is drained first.
+                stage.queue.put((float('inf'), next(self.counter), None))
+            for thread in stage.threads:
+                thread.join()
+            stage.threads = []
+
+    def _enqueue(self, job):
+        job.state = 'queued'
+        self.stages[job.stage_index].queue.put((-job.priority, next(self.counter), job))
+        self._notify(job)
+
+    def _work(self, stage_index):
+        stage = self.stages[stage_index]
+        while True:
+            _, _, job = stage.queue.get()
+            if job is None:
+                return
+            if job.cancelled:
+                self._finish(job, 'cancelled')
+                continue
+            job.state = 'running'
+            self._notify(job)
+            try:
+                artifact = stage.func(job)
+            except JobCancelled:
+                self._finish(job, 'cancelled')
+                continue
+            except Exception as e:
+                print(e, file=sys.stderr)
+                job.error = e
+                self._finish(job, 'failed')
+                continue
+            if self.store is not None:
+                self.store.complete_stage(job.job_id, stage.name, artifact)
+            job.stage_index += 1
+            if job.stage_index < len(self.stages):
+                self._enqueue(job)
+                self._save(job)
+            else:
+                self._finish(job, 'finished')
+
+    def _finish(self, job, state):
+        job.state = state
+        self._notify(job)
+        self._save(job)
+        # Only unfinished jobs are kept, the store or the caller holds on to the finished ones if it needs them.
+        with self.lock:
+            self.jobs.pop(job.job_id, None)
+
+    def _notify(self, job):
+        if self.on_update is not None:
+            self.on_update(job)
+
+    def _save(self, job):
+        if self.store is not None:
+            self.store.save_job(job)
+            return
+        if self.queue_path is None:
+            return
+        with self.lock:
+            pending = [job.to_dict() for job in self.jobs.values() if job.state in ('queued', 'running')]
+            temporary_path = self.queue_path + '.tmp'
+            with open(temporary_path, 'w') as f:
+                json.dump(pending, f)
+            os.replace(temporary_path, self.queue_path)
+
+    def _restore(self):
+        if self.store is not None:
+            pending = self.store.unfinished_jobs()
+            stage_names = [stage.name for stage in self.stages]
+            for values in pending:
+                values['stage_index'] = self.store.first_incomplete_stage(values['job_id'], stage_names)
+        elif self.queue_path is not None and os.path.exists(self.queue_path):
+            with open(self.queue_path) as f:
+                pending = json.load(f)
+        else:
+            return []
+        restored = []
+        for values in pending:
+            job = Job(values['job_id'], values['url'], values['priority'], values['stage_index'], values['data'])
+            if job.stage_index >= len(self.stages):
+                # Killed after the last stage completed, but before the job was marked as finished.
+                self._finish(job, 'finished')
+                continue
+            with self.lock:
+                if job.job_id in self.jobs:
+                    continue
+                self.jobs[job.job_id] = job
+            self._enqueue(job)
+            restored.append(job)
+        return restored
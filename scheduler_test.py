@@ -0,0 +1,117 @@
+import json
+import os
+import scheduler
+import tempfile
+import threading
+import unittest
+
+
+class TestScheduler(unittest.TestCase):
+    def test_jobs_run_through_every_stage(self):
+        def download(job):
+            job.data['title'] = job.url.upper()
+
+        processed = []
+        stages = [scheduler.Stage('download', download, 2),
+                  scheduler.Stage('process', lambda job: processed.append(job.data['title']), 1)]
+        job_scheduler = scheduler.Scheduler(stages)
+        job_scheduler.start()
+        jobs = [job_scheduler.submit(url) for url in ('a', 'b', 'c')]
+        job_scheduler.shutdown()
+
+        self.assertEqual(['A', 'B', 'C'], sorted(processed))
+        self.assertEqual(['finished'] * 3, [job.state for job in jobs])
+        # Finished jobs are not kept.
+        self.assertEqual({}, job_scheduler.jobs)
+
+    def test_stage_workers_are_bounded(self):
+        lock = threading.Lock()
+        running = [0]
+        peak = [0]
+
+        def process(job):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            threading.Event().wait(0.01)
+            with lock:
+                running[0] -= 1
+
+        job_scheduler = scheduler.Scheduler([scheduler.Stage('process', process, 2)])
+        job_scheduler.start()
+        for index in range(8):
+            job_scheduler.submit(str(index))
+        job_scheduler.shutdown()
+
+        self.assertEqual(2, peak[0])
+
+    def test_priority(self):
+        order = []
+        job_scheduler = scheduler.Scheduler([scheduler.Stage('process', lambda job: order.append(job.url), 1)])
+        for url, priority in (('low', 0), ('high', 5), ('middle', 1)):
+            job_scheduler.submit(url, priority=priority)
+        job_scheduler.start()
+        job_scheduler.shutdown()
+
+        self.assertEqual(['high', 'middle', 'low'], order)
+
+    def test_cancel(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def process(job):
+            started.set()
+            release.wait()
+            job.check_cancelled()
+
+        job_scheduler = scheduler.Scheduler([scheduler.Stage('process', process, 1)])
+        job_scheduler.start()
+        running_job = job_scheduler.submit('running')
+        queued_job = job_scheduler.submit('queued')
+        started.wait()
+        self.assertTrue(job_scheduler.cancel(running_job.job_id))
+        self.assertTrue(job_scheduler.cancel(queued_job.job_id))
+        self.assertFalse(job_scheduler.cancel('unknown'))
+        release.set()
+        job_scheduler.shutdown()
+
+        self.assertEqual('cancelled', running_job.state)
+        self.assertEqual('cancelled', queued_job.state)
+
+    def test_failed_job(self):
+        def process(job):
+            raise ValueError('invalid')
+
+        job_scheduler = scheduler.Scheduler([scheduler.Stage('process', process, 1)])
+        job_scheduler.start()
+        job = job_scheduler.submit('url')
+        job_scheduler.shutdown()
+
+        self.assertEqual('failed', job.state)
+        self.assertIsInstance(job.error, ValueError)
+
+    def test_persistent_queue(self):
+        with tempfile.TemporaryDirectory() as directory:
+            queue_path = os.path.join(directory, 'queue.json')
+            job_scheduler = scheduler.Scheduler([scheduler.Stage('download', lambda job: None, 1),
+                                                 scheduler.Stage('process', lambda job: None, 1)], queue_path)
+            job = job_scheduler.submit('url', priority=3, data={'title': 'title'})
+            with open(queue_path) as f:
+                self.assertEqual([job.to_dict()], json.load(f))
+
+            processed = []
+            restarted_scheduler = scheduler.Scheduler(
+                [scheduler.Stage('download', lambda job: None, 1),
+                 scheduler.Stage('process', lambda job: processed.append(job.data['title']), 1)], queue_path)
+            restored = restarted_scheduler.start()
+            restarted_scheduler.shutdown()
+            with open(queue_path) as f:
+                remaining = json.load(f)
+
+        self.assertEqual([job.job_id], [restored_job.job_id for restored_job in restored])
+        self.assertEqual(['title'], processed)
+        self.assertEqual([], remaining)
+
+
+if __name__ == '__main__':
+    unittest.main()
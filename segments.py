@@ -0,0 +1,134 @@
+import json
+import numpy as np
+import os
+
+
+def sidecar_path(audio_path):
+    ''' The path of the segment index stored next to an audio file, 'name.segments.json' for 'name.wav'. '''
+    return os.path.splitext(audio_path)[0] + '.segments.json'
+
+
+class SegmentIndex(object):
+    ''' The voiced segments found in a source, as sample positions of the source.
+    It is enough to cut the source again, to map positions of the cut audio back to the source and to report how
+    much of the source is speech, without running the silence detector or decoding any audio.
+    Args:
+        starts (list(int)): The first sample of each segment, in order.
+        ends (list(int)): One past the last sample of each segment.
+        sample_rate (int): The sample rate of the source.
+        source_length (int): The number of samples of the source.
+        crossfade_samples (int): The length of the crossfade at every join of the cut audio.
+        padding_ms (int): The padding the silence detector added around the speech.
+    '''
+
+    def __init__(self, starts, ends, sample_rate, source_length, crossfade_samples=0, padding_ms=600):
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+        self.sample_rate = sample_rate
+        self.source_length = source_length
+        self.crossfade_samples = crossfade_samples
+        self.padding_ms = padding_ms
+
+    @classmethod
+    def from_ranges(cls, ranges, sample_rate, source_length, crossfade_samples=0, padding_ms=600):
+        ''' Build an index from (start, end) pairs, such as the ones of vad.detect_speech. '''
+        ranges = list(ranges)
+        return cls([start for start, _ in ranges], [end for _, end in ranges], sample_rate, source_length,
+                   crossfade_samples, padding_ms)
+
+    @classmethod
+    def from_dict(cls, values):
+        ''' Build an index from the JSON-serializable values of to_dict. '''
+        return cls(values['starts'], values['ends'], values['sample_rate'], values['source_length'],
+                   values['crossfade_samples'], values['padding_ms'])
+
+    def to_dict(self):
+        return {
+            'sample_rate': self.sample_rate,
+            'source_length': self.source_length,
+            'crossfade_samples': self.crossfade_samples,
+            'padding_ms': self.padding_ms,
+            'starts': self.starts.tolist(),
+            'ends': self.ends.tolist(),
+        }
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    def save(self, path):
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(temporary_path, path)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def ranges(self):
+        ''' The segments as a list of (start, end) pairs. '''
+        return list(zip(self.starts.tolist(), self.ends.tolist()))
+
+    def overlaps(self):
+        ''' The length of the crossfade at each join, shorter than crossfade_samples next to short segments. '''
+        lengths = self.ends - self.starts
+        return np.minimum(np.minimum(lengths[:-1], lengths[1:]), self.crossfade_samples)
+
+    def output_starts(self):
+        ''' The position of the first sample of each segment in the cut audio. '''
+        lengths = self.ends - self.starts
+        steps = lengths[:-1] - self.overlaps()
+        return np.concatenate([[0], np.cumsum(steps)]).astype(np.int64)
+
+    def output_length(self):
+        ''' The number of samples of the cut audio. '''
+        if not len(self):
+            return 0
+        return int(np.sum(self.ends - self.starts) - np.sum(self.overlaps()))
+
+    def speech_ratio(self):
+        ''' The share of the source kept in the cut audio, from 0 to 1. '''
+        if not self.source_length:
+            return 0.0
+        return float(np.sum(self.ends - self.starts)) / self.source_length
+
+    def to_source_time(self, seconds):
+        ''' Map a position of the cut audio to the position of the same sound in the source.
+        Positions inside a crossfade map to the segment fading in.
+        Args:
+            seconds (float): The position in the cut audio.
+        Returns:
+            float: The position in the source, in seconds.
+        '''
+        if not len(self):
+            return 0.0
+        position = int(round(seconds * self.sample_rate))
+        output_starts = self.output_starts()
+        index = max(int(np.searchsorted(output_starts, position, side='right')) - 1, 0)
+        source_position = self.starts[index] + position - output_starts[index]
+        return float(min(source_position, self.ends[index])) / self.sample_rate
+
+    def with_padding(self, padding_ms):
+        ''' Cut with a different padding without running the silence detector again.
+        Every segment is widened or narrowed on both sides by the difference with the current padding, segments
+        that overlap are merged and segments that disappear are dropped. The silence detector pads both ends of
+        the speech by about its padding, so this approximates running it again with the new padding.
+        Args:
+            padding_ms (int): The new padding.
+        Returns:
+            SegmentIndex: The index of the new cut.
+        '''
+        delta = int(round((padding_ms - self.padding_ms) * self.sample_rate / 1000))
+        starts = np.clip(self.starts - delta, 0, self.source_length)
+        ends = np.clip(self.ends + delta, 0, self.source_length)
+        ranges = []
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            if end <= start:
+                continue
+            if ranges and start <= ranges[-1][1]:
+                ranges[-1] = (ranges[-1][0], max(end, ranges[-1][1]))
+            else:
+                ranges.append((start, end))
+        return SegmentIndex.from_ranges(ranges, self.sample_rate, self.source_length, self.crossfade_samples,
+                                        padding_ms)
@@ -0,0 +1,59 @@
+import json
+import numpy as np
+import os
+import segments
+import tempfile
+import unittest
+import vad
+
+
+class TestSegments(unittest.TestCase):
+    def test_sidecar_path(self):
+        self.assertEqual(os.path.join('denoised', 'title.segments.json'),
+                         segments.sidecar_path(os.path.join('denoised', 'title.wav')))
+
+    def test_save_and_load(self):
+        index = segments.SegmentIndex([10, 200], [100, 400], 16000, 1000, 16, 300)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'output.segments.json')
+            index.save(path)
+            loaded = segments.SegmentIndex.load(path)
+
+        self.assertEqual([(10, 100), (200, 400)], loaded.ranges())
+        self.assertEqual((16000, 1000, 16, 300),
+                         (loaded.sample_rate, loaded.source_length, loaded.crossfade_samples, loaded.padding_ms))
+
+    def test_to_dict_and_from_dict(self):
+        index = segments.SegmentIndex([10, 200], [100, 400], 16000, 1000, 16, 300)
+        values = json.loads(json.dumps(index.to_dict()))
+        self.assertEqual(values, segments.SegmentIndex.from_dict(values).to_dict())
+
+    def test_output_positions_match_splice(self):
+        samples = np.arange(1000, dtype=np.float32)
+        index = segments.SegmentIndex.from_ranges([(0, 100), (300, 305), (400, 600)], 1000, len(samples), 10)
+        spliced = vad.splice_segments(samples, index.ranges(), index.crossfade_samples)
+
+        self.assertEqual(len(spliced), index.output_length())
+        self.assertEqual([0, 95, 95], index.output_starts().tolist())
+        # Past the crossfades, every sample of the cut maps back to the same sample of the source.
+        for position in (0, 50, 89, 150, 294):
+            self.assertEqual(spliced[position], index.to_source_time(position / 1000.0) * 1000)
+
+    def test_speech_ratio(self):
+        index = segments.SegmentIndex.from_ranges([(0, 100), (500, 800)], 16000, 1000)
+        self.assertAlmostEqual(0.4, index.speech_ratio())
+        self.assertEqual(0.0, segments.SegmentIndex([], [], 16000, 0).speech_ratio())
+
+    def test_with_padding(self):
+        index = segments.SegmentIndex.from_ranges([(1000, 2000), (2300, 3000), (5000, 5100)], 1000, 6000,
+                                                  padding_ms=300)
+        wider = index.with_padding(500)
+        narrower = index.with_padding(200)
+
+        self.assertEqual([(800, 3200), (4800, 5300)], wider.ranges())
+        self.assertEqual(500, wider.padding_ms)
+        self.assertEqual([(1100, 1900), (2400, 2900)], narrower.ranges())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,43 @@
+''' Measure the time from starting the app to its first drawn frame.
+
+Usage:
+    python startup_benchmark.py [runs]
+
+Each run starts main.py in a new process with STARTUP_BENCHMARK set, which makes the app print the time of its first
+frame and quit. Cold runs include filling the OS file cache, so the first run is reported separately.
+'''
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+def time_to_first_frame(script='main.py', timeout=120):
+    ''' Start the app once.
+    Args:
+        script (str): The path to the app.
+        timeout (float): Seconds to wait for the first frame.
+    Returns:
+        float: Seconds from starting the process to the first frame.
+    '''
+    environment = dict(os.environ, STARTUP_BENCHMARK='1')
+    start = time.time()
+    output = subprocess.run([sys.executable, script], env=environment, stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL, timeout=timeout, universal_newlines=True, check=True).stdout
+    for line in output.splitlines():
+        if line.startswith('first_frame '):
+            return float(line.split()[1]) - start
+    raise RuntimeError('The app exited without drawing a frame.')
+
+
+def main(args):
+    runs = int(args[0]) if args else 5
+    times = [time_to_first_frame() for _ in range(runs)]
+    print('first run: {:.3f}s'.format(times[0]))
+    if len(times) > 1:
+        print('median of the next {} runs: {:.3f}s'.format(len(times) - 1, statistics.median(times[1:])))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
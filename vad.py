@@ -1,11 +1,18 @@
+import audio_buffer
 import collections
 import contextlib
-import sys
+import concurrent.futures
+import numpy as np
+import resampler
+import segments
 import wave
 import webrtcvad
 import librosa
 import soundfile
-from pydub import AudioSegment
+
+VAD_SAMPLE_RATES = (8000, 16000, 32000, 48000)
+# Speech is detected at this rate at most. Higher webrtcvad rates cost more and do not detect speech better.
+ANALYSIS_SAMPLE_RATE = 16000
 
 
 def read_wave(path):
@@ -43,61 +50,94 @@ def write_wave(path, audio, sample_rate):
 
 def convert_wave_to_meet_vad(original_path, output_path):
     ''' Convert the wav data to the formats that meets webrtc requirements:
-    1. sample rate reformat to either [8000, 16000, 32000, 48000]
+    1. sample rate reformat to either [8000, 16000], see analysis_vad_sample_rate
     2. Convert to mono audio
     3. Convert to 16-bits format
+    The file is decoded once, converted in memory and encoded once.
     Args:
         original_path (str): Path to original wav file.
         output_path (str): Path to output wav file.
     '''
-    resample_wave(original_path, output_path)
-    convert_to_mono(output_path, output_path)
-    convert_to_16bit(output_path, output_path)
+    samples, sample_rate = audio_buffer.read_audio(original_path)
+    pcm, vad_sample_rate = convert_samples_to_meet_vad(samples, sample_rate)
+    write_wave(output_path, pcm.tobytes(), vad_sample_rate)
+
+
+def convert_samples_to_meet_vad(samples, sample_rate, engine='poly', analysis_sample_rate=ANALYSIS_SAMPLE_RATE):
+    ''' In-memory version of convert_wave_to_meet_vad.
+    Args:
+        samples (numpy.ndarray): float samples shaped (frames,) or (frames, channels).
+        sample_rate (int): The sample rate of the samples.
+        engine (str): The resampling engine, see resampler.resample.
+        analysis_sample_rate (int): The highest webrtcvad sample rate used, see vad_sample_rate.
+    Returns:
+        numpy.ndarray: Monophonic int16 samples.
+        int: The webrtcvad sample rate the samples were resampled to.
+    '''
+    samples = audio_buffer.to_mono(samples)
+    vad_sample_rate = analysis_vad_sample_rate(sample_rate, analysis_sample_rate)
+    samples = resampler.resample(samples, sample_rate, vad_sample_rate, engine)
+    return audio_buffer.to_pcm16(samples), vad_sample_rate
+
+
+def closest_vad_sample_rate(sample_rate):
+    ''' Find the webrtcvad sample rate closest to the given one.
+    Args:
+        sample_rate (int): The original sample rate.
+    Returns:
+        int: One of [8000, 16000, 32000, 48000].
+    '''
+    return min(VAD_SAMPLE_RATES, key=lambda sr: abs(sr - sample_rate))
+
+
+def analysis_vad_sample_rate(sample_rate, analysis_sample_rate=ANALYSIS_SAMPLE_RATE):
+    ''' The webrtcvad sample rate speech is detected at, the closest one to the given rate but at most
+    analysis_sample_rate.
+    Args:
+        sample_rate (int): The original sample rate.
+        analysis_sample_rate (int): The highest rate used, either 8000 or 16000.
+    Returns:
+        int: One of [8000, 16000].
+    '''
+    return min(analysis_sample_rate, closest_vad_sample_rate(sample_rate))
 
 
 def convert_to_16bit(original_path, output_path):
     ''' Convert the wav audio file to 16-bits format.
-    This will overwrite the given file.
+    The whole file is decoded before the output is written, so output_path can be original_path.
     Args:
-        path (str): Path to the audio file.
+        original_path (str): Path to the audio file.
+        output_path (str): Path to the 16-bits audio file.
     '''
-    data, samplerate = soundfile.read(original_path)
-    soundfile.write(output_path, data, samplerate, subtype='PCM_16')
+    resampler.convert_file(original_path, output_path, subtype='PCM_16')
 
 
 def convert_to_mono(original_path, output_path):
     ''' Convert the wav file to monophonic records.
-    This will overwrite the given file.
+    The whole file is decoded before the output is opened, so output_path can be original_path.
     Args:
-        path (str): Path to the audio file.
+        original_path (str): Path to the audio file.
+        output_path (str): Path to the monophonic audio file.
     '''
-    print('convert to mono')
-    sound = AudioSegment.from_wav(original_path)
-    sound = sound.set_channels(1)
-    sound.export(output_path, format="wav")
-    print('finish convert to mono')
+    # The files are opened with open, so missing paths raise FileNotFoundError.
+    with open(original_path, 'rb') as source:
+        samples, sample_rate, subtype = resampler.load(source, mono=True)
+    with open(output_path, 'wb') as output:
+        soundfile.write(output, samples, sample_rate, subtype=subtype, format='WAV')
 
 
 def resample_wave(original_path, output_path):
     ''' Resample the wav audio to the sample rate that will meet the webrtcvad requirement.
-    Use Librosa to convert the original sample rate to the closest of either [8000, 16000, 32000, 48000].
+    The audio is decoded once at its native rate, down-mixed and resampled directly to the closest of either
+    [8000, 16000], see analysis_vad_sample_rate.
     The new audio will be written to the given output path.
     Args:
         original_path (str): Path to the original wav file.
         output_path (str): Path to the new wav file.
     '''
-    available_sample_rate = [8000, 16000, 32000, 48000]
-    current_closest = 0
-
-    data, audio_sample_rate = librosa.load(original_path)
-    current_diff = audio_sample_rate
-
-    for sr in available_sample_rate:
-        if abs(sr - audio_sample_rate) < current_diff:
-            current_diff = abs(sr - audio_sample_rate)
-            current_closest = sr
-    data = librosa.resample(data, audio_sample_rate, current_closest)
-    librosa.output.write_wav(output_path, data, current_closest)
+    sample_rate = soundfile.info(original_path).samplerate
+    data, sample_rate, _ = resampler.load(original_path, analysis_vad_sample_rate(sample_rate), mono=True)
+    librosa.output.write_wav(output_path, data, sample_rate)
 
 
 class Frame(object):
@@ -154,81 +194,613 @@ def vad_collector(sample_rate, frame_duration_ms,
          bytes: PCM audio data.
     '''
     num_padding_frames = int(padding_duration_ms / frame_duration_ms)
-    # We use a deque for our sliding window/ring buffer.
-    ring_buffer = collections.deque(maxlen=num_padding_frames)
-    # We have two states: TRIGGERED and NOTTRIGGERED. We start in the
-    # NOTTRIGGERED state.
-    triggered = False
+    trigger = SpeechTrigger(num_padding_frames)
 
     voiced_frames = []
     for frame in frames:
         is_speech = vad.is_speech(frame.bytes, sample_rate)
+        was_triggered = trigger.triggered
+        voiced_frames.extend(trigger.push(frame, is_speech))
+        if was_triggered and not trigger.triggered:
+            yield b''.join([f.bytes for f in voiced_frames])
+            voiced_frames = []
+    # If we have any leftover voiced audio when we run out of input,
+    # yield it.
+    if voiced_frames:
+        yield b''.join([f.bytes for f in voiced_frames])
+
+
+class SpeechTrigger(object):
+    ''' The TRIGGERED/NOTTRIGGERED state machine used by vad_collector, fed one frame at a time.
+    The voiced frames in the ring buffer are counted as they come and go, so every frame costs O(1).
+    Args:
+        num_padding_frames (int): The size of the sliding window in frames.
+    '''
+
+    def __init__(self, num_padding_frames):
+        # We use a deque for our sliding window/ring buffer.
+        self.ring_buffer = collections.deque(maxlen=num_padding_frames)
+        self.num_voiced = 0
+        # We have two states: TRIGGERED and NOTTRIGGERED. We start in the
+        # NOTTRIGGERED state.
+        self.triggered = False
+        # The first frame of the current segment and the frames that were waiting in the ring buffer when it began.
+        self.segment_start = None
+        self.triggered_frames = []
 
-        sys.stdout.write('1' if is_speech else '0')
-        if not triggered:
-            ring_buffer.append((frame, is_speech))
-            num_voiced = len([f for f, speech in ring_buffer if speech])
+    def update(self, frame, is_speech):
+        ''' Feed the next frame and its webrtcvad decision.
+        Args:
+            frame: The next frame of the audio, either a Frame or its index.
+            is_speech (bool): Whether webrtcvad detected voice in the frame.
+        Returns:
+            bool: True if the state changed with this frame. A segment that ends includes this frame.
+        '''
+        self._append(frame, is_speech)
+        if not self.triggered:
             # If we're NOTTRIGGERED and more than 90% of the frames in
             # the ring buffer are voiced frames, then enter the
             # TRIGGERED state.
-            if num_voiced > 0.95 * ring_buffer.maxlen:
-                triggered = True
-                sys.stdout.write('+(%s)' % (ring_buffer[0][0].timestamp,))
-                # We want to yield all the audio we see from now until
+            if self.num_voiced > 0.95 * self.ring_buffer.maxlen:
+                self.triggered = True
+                # We want to keep all the audio we see from now until
                 # we are NOTTRIGGERED, but we have to start with the
                 # audio that's already in the ring buffer.
-                for f, s in ring_buffer:
-                    voiced_frames.append(f)
-                ring_buffer.clear()
+                self.segment_start = self.ring_buffer[0][0]
+                self.triggered_frames = [f for f, s in self.ring_buffer]
+                self._clear()
+                return True
+            return False
+        # If more than 90% of the frames in the ring buffer are
+        # unvoiced, then enter NOTTRIGGERED.
+        num_unvoiced = len(self.ring_buffer) - self.num_voiced
+        if num_unvoiced > 0.95 * self.ring_buffer.maxlen:
+            self.triggered = False
+            self._clear()
+            return True
+        return False
+
+    def push(self, frame, is_speech):
+        ''' Feed the next frame and get the frames that belong to the output.
+        Args:
+            frame (Frame): The next frame of the audio.
+            is_speech (bool): Whether webrtcvad detected voice in the frame.
+        Returns:
+            list(Frame): The frames that belong to the output, in order. When the state changes to TRIGGERED this
+                         includes the frames that were waiting in the ring buffer.
+        '''
+        was_triggered = self.triggered
+        changed = self.update(frame, is_speech)
+        if changed and self.triggered:
+            return self.triggered_frames
+        if was_triggered:
+            return [frame]
+        return []
+
+    def _append(self, frame, is_speech):
+        if self.ring_buffer.maxlen == 0:
+            return
+        if len(self.ring_buffer) == self.ring_buffer.maxlen and self.ring_buffer[0][1]:
+            self.num_voiced -= 1
+        self.ring_buffer.append((frame, is_speech))
+        if is_speech:
+            self.num_voiced += 1
+
+    def _clear(self):
+        self.ring_buffer.clear()
+        self.num_voiced = 0
+
+
+class FrameIndex(object):
+    ''' Array-backed frames of a pcm buffer.
+    Instead of one Frame object and bytes slice per window, the frames are rows of a strided view over the
+    original samples and the timestamps are computed from the frame index. It holds the same frames as
+    frame_generator would yield.
+    Args:
+        audio (bytes or numpy.ndarray): 16-bits pcm audio data.
+        sample_rate (int): The sample rate of the given audio.
+        frame_duration_ms (int): The duration of each frame in milliseconds.
+    '''
+
+    def __init__(self, audio, sample_rate, frame_duration_ms):
+        if not isinstance(audio, np.ndarray):
+            audio = np.frombuffer(audio, dtype=np.int16)
+        self.pcm = audio
+        self.sample_rate = sample_rate
+        self.frame_duration_ms = frame_duration_ms
+        n = int(sample_rate * (frame_duration_ms / 1000.0) * 2)
+        self.frame_length = n // 2
+        self.duration = (float(n) / sample_rate) / 2.0
+        # Like frame_generator, a frame is only complete once there is audio after it.
+        self.count = max(len(audio) - 1, 0) // self.frame_length
+        self.frames = audio[:self.count * self.frame_length].reshape(self.count, self.frame_length)
+        # webrtcvad takes bytes-like frames, so also keep a byte view of every row.
+        self.frame_bytes = self.frames.view(np.uint8)
+
+    def __len__(self):
+        return self.count
+
+    def timestamp(self, index):
+        ''' The starting timestamp in seconds of the frame at the given index. '''
+        return index * self.duration
+
+    def samples(self, start, end):
+        ''' The samples of the frames in [start, end), as a view on the original buffer. '''
+        return self.pcm[start * self.frame_length:end * self.frame_length]
+
+
+def collect_segments(vad, frame_index, padding_duration_ms):
+    ''' Array-backed version of vad_collector.
+    Produces the same segments, but as frame ranges instead of joined pcm data, without copying any audio.
+    Args:
+        vad (webrtcvad.Vad): An instance of Vad.
+        frame_index (FrameIndex): The frames of the audio.
+        padding_duration_ms (int): The duration of the sliding window in milliseconds.
+    Yields:
+        (int, int): The first frame and one past the last frame of each voiced segment.
+    '''
+    frame_bytes = frame_index.frame_bytes
+    sample_rate = frame_index.sample_rate
+    decisions = (vad.is_speech(frame_bytes[index], sample_rate) for index in range(len(frame_index)))
+    return segments_from_decisions(decisions, int(padding_duration_ms / frame_index.frame_duration_ms))
+
+
+def segments_from_decisions(decisions, num_padding_frames):
+    ''' Run the TRIGGERED/NOTTRIGGERED hysteresis over per-frame webrtcvad decisions.
+    Args:
+        decisions (iterable(bool)): Whether each frame, in order, contains voice.
+        num_padding_frames (int): The size of the sliding window in frames.
+    Yields:
+        (int, int): The first frame and one past the last frame of each voiced segment.
+    '''
+    trigger = SpeechTrigger(num_padding_frames)
+    index = -1
+    for index, is_speech in enumerate(decisions):
+        if trigger.update(index, is_speech) and not trigger.triggered:
+            yield trigger.segment_start, index + 1
+    if trigger.triggered:
+        yield trigger.segment_start, index + 1
+
+
+def stream_frame_generator(frame_duration_ms, blocks, sample_rate):
+    ''' Generates audio frames from PCM audio data that arrives in blocks.
+    The frames are the same as frame_generator would produce from the concatenated blocks, but only one block and
+    one partial frame are kept in memory.
+    Args:
+        frame_duration_ms (int): The duration of each frame in milliseconds.
+        blocks (iterable(bytes)): The pcm audio data blocks.
+        sample_rate (int): The sample rate of the given audio.
+    Yields:
+        Frame: The Frames created after separating the audio data.
+    '''
+    n = int(sample_rate * (frame_duration_ms / 1000.0) * 2)
+    timestamp = 0.0
+    duration = (float(n) / sample_rate) / 2.0
+    pending = b''
+    for block in blocks:
+        pending += block
+        offset = 0
+        # Like frame_generator, a frame is only complete once there is audio after it.
+        while offset + n < len(pending):
+            yield Frame(pending[offset:offset + n], timestamp, duration)
+            timestamp += duration
+            offset += n
+        pending = pending[offset:]
+
+
+def analysis_copy(samples, sample_rate, analysis_sample_rate, workers=None, shard_duration_ms=60000):
+    ''' The monophonic 16-bits copy of a sample buffer that webrtcvad classifies, see detect_speech.
+    Resampling the copy is most of the work of the silence detection, so it is done in shards, see
+    resampler.resample_shards. The shards are the same whether they are resampled here or in a process pool, so the
+    copy does not depend on workers.
+    Args:
+        samples (numpy.ndarray): float samples shaped (frames,) or (frames, channels).
+        sample_rate (int): The sample rate of the samples.
+        analysis_sample_rate (int): The sample rate of the copy.
+        workers (int): If more than 1, resample the shards in that many processes.
+        shard_duration_ms (int): The duration of the audio resampled by each task.
+    Returns:
+        numpy.ndarray: The int16 samples of the copy.
+    '''
+    mono = audio_buffer.to_mono(samples)
+    if sample_rate != analysis_sample_rate:
+        shard_length = int(sample_rate * shard_duration_ms / 1000)
+        if workers is not None and workers > 1:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+                mono = resampler.resample_shards(mono, sample_rate, analysis_sample_rate, shard_length, executor.map)
         else:
-            # We're in the TRIGGERED state, so collect the audio data
-            # and add it to the ring buffer.
-            voiced_frames.append(frame)
-            ring_buffer.append((frame, is_speech))
-            num_unvoiced = len([f for f, speech in ring_buffer if not speech])
-            # If more than 90% of the frames in the ring buffer are
-            # unvoiced, then enter NOTTRIGGERED and yield whatever
-            # audio we've collected.
-            if num_unvoiced > 0.95 * ring_buffer.maxlen:
-                sys.stdout.write('-(%s)' % (frame.timestamp + frame.duration))
-                triggered = False
-                yield b''.join([f.bytes for f in voiced_frames])
-                ring_buffer.clear()
-                voiced_frames = []
-    if triggered:
-        sys.stdout.write('-(%s)' % (frame.timestamp + frame.duration))
-    sys.stdout.write('\n')
-    # If we have any leftover voiced audio when we run out of input,
-    # yield it.
-    if voiced_frames:
-        yield b''.join([f.bytes for f in voiced_frames])
+            mono = resampler.resample_shards(mono, sample_rate, analysis_sample_rate, shard_length)
+    return audio_buffer.to_pcm16(mono)
+
+
+def detect_speech(samples, sample_rate, aggressiveness, frame_duration_ms=30, padding_duration_ms=600,
+                  workers=None, analysis_sample_rate=16000, shard_duration_ms=60000):
+    ''' Find the voiced parts of a sample buffer.
+    webrtcvad runs on a monophonic 16-bits analysis copy at a low sample rate, which is much cheaper to produce and
+    classify than the source, and the voiced frame ranges are mapped back to sample positions of the source.
+    The frames are classified in order by a single detector: webrtcvad adapts to all the audio before a frame, so
+    a detector started in the middle of the audio does not reach the same decisions, however long it warms up.
+    Args:
+        samples (numpy.ndarray): float samples shaped (frames,) or (frames, channels).
+        sample_rate (int): The sample rate of the samples.
+        aggressiveness (int): The aggressiveness of the silence detector, from 0 to 3.
+        frame_duration_ms (int): The duration of each frame in milliseconds, either 10, 20 or 30.
+        padding_duration_ms (int): The duration of the sliding window in milliseconds.
+        workers (int): If more than 1, resample the analysis copy in that many processes, see analysis_copy.
+        analysis_sample_rate (int): The rate of the analysis copy, either 8000 or 16000. Sources below it are
+                                    analysed at their closest webrtcvad sample rate instead.
+        shard_duration_ms (int): The duration of the audio resampled by each task.
+    Returns:
+        list((int, int)): The first sample and one past the last sample of each voiced segment of the source.
+    '''
+    analysis_sample_rate = analysis_vad_sample_rate(sample_rate, analysis_sample_rate)
+    analysis = analysis_copy(samples, sample_rate, analysis_sample_rate, workers, shard_duration_ms)
+    frame_index = FrameIndex(analysis, analysis_sample_rate, frame_duration_ms)
+    ranges = collect_segments(webrtcvad.Vad(aggressiveness), frame_index, padding_duration_ms)
+    scale = frame_index.frame_length * sample_rate
+    return [(start * scale // analysis_sample_rate, min(end * scale // analysis_sample_rate, len(samples)))
+            for start, end in ranges]
+
+
+def splice_segments(samples, ranges, crossfade_samples):
+    ''' Join segments of a sample buffer, crossfading every join so the cuts do not click.
+    Each join overlaps the last crossfade_samples of a segment with the first ones of the next, so the result is
+    shorter than the segments by that much per join. Joins between short segments use a shorter crossfade.
+    Args:
+        samples (numpy.ndarray): float samples shaped (frames,) or (frames, channels).
+        ranges (list((int, int))): The first sample and one past the last sample of each segment, in order.
+        crossfade_samples (int): The length of every crossfade.
+    Returns:
+        numpy.ndarray: The joined float32 samples, with the channels of the source.
+    '''
+    overlaps = [min(crossfade_samples, previous_end - previous_start, end - start)
+                for (previous_start, previous_end), (start, end) in zip(ranges, ranges[1:])]
+    length = sum(end - start for start, end in ranges) - sum(overlaps)
+    output = np.zeros((length,) + samples.shape[1:], dtype=np.float32)
+    position = 0
+    for index, (start, end) in enumerate(ranges):
+        segment = samples[start:end]
+        overlap = overlaps[index - 1] if index > 0 else 0
+        if overlap:
+            fade = np.linspace(0.0, 1.0, overlap + 2, dtype=np.float32)[1:-1]
+            fade = fade.reshape((overlap,) + (1,) * (samples.ndim - 1))
+            output[position - overlap:position] *= 1.0 - fade
+            output[position - overlap:position] += segment[:overlap] * fade
+        output[position:position + len(segment) - overlap] = segment[overlap:]
+        position += len(segment) - overlap
+    return output
+
+
+class StreamSplicer(object):
+    ''' splice_segments for segments that arrive piece by piece.
+    The last crossfade_samples of the output are held back until the next segment is joined to them, so the pieces
+    returned by add, end_segment and flush concatenate to the output of splice_segments over the whole segments.
+    Args:
+        crossfade_samples (int): The length of every crossfade.
+    '''
+
+    def __init__(self, crossfade_samples):
+        self.crossfade_samples = crossfade_samples
+        # The end of the output, held back for the next crossfade. None before the first segment.
+        self.tail = None
+        self.previous_length = 0
+        # The start of the current segment, until it is long enough to know the length of its crossfade.
+        self.head = None
+        self.joined = False
+        self.length = 0
 
+    def add(self, samples):
+        ''' Append samples to the current segment.
+        Returns:
+            list(numpy.ndarray): The float32 output that is final.
+        '''
+        if self.joined:
+            self.length += len(samples)
+            return self._emit(samples)
+        self.head = samples if self.head is None else np.concatenate([self.head, samples])
+        if len(self.head) >= self.crossfade_samples:
+            return self._join()
+        return []
 
-def generate_solo_audio(input_path, output_path, aggressiveness):
+    def end_segment(self):
+        ''' End the current segment, the next samples start another one.
+        Returns:
+            list(numpy.ndarray): The float32 output that is final.
+        '''
+        output = [] if self.joined or self.head is None else self._join()
+        if self.joined:
+            self.previous_length = self.length
+        self.head = None
+        self.joined = False
+        self.length = 0
+        return output
+
+    def flush(self):
+        ''' End the output.
+        Returns:
+            list(numpy.ndarray): The rest of the float32 output.
+        '''
+        output = self.end_segment()
+        if self.tail is not None and len(self.tail):
+            output.append(self.tail)
+        self.tail = None
+        return output
+
+    def _join(self):
+        segment = self.head.astype(np.float32, copy=False)
+        self.head = None
+        self.joined = True
+        self.length = len(segment)
+        overlap = 0
+        if self.tail is not None:
+            overlap = min(self.crossfade_samples, self.previous_length, len(segment))
+        if overlap:
+            fade = np.linspace(0.0, 1.0, overlap + 2, dtype=np.float32)[1:-1]
+            fade = fade.reshape((overlap,) + (1,) * (segment.ndim - 1))
+            self.tail[len(self.tail) - overlap:] *= 1.0 - fade
+            self.tail[len(self.tail) - overlap:] += segment[:overlap] * fade
+        return self._emit(segment[overlap:])
+
+    def _emit(self, samples):
+        samples = samples.astype(np.float32, copy=False)
+        output = samples if self.tail is None else np.concatenate([self.tail, samples])
+        kept = min(self.crossfade_samples, len(output))
+        self.tail = output[len(output) - kept:].copy()
+        return [output[:len(output) - kept]] if len(output) > kept else []
+
+
+def detect_segments(samples, sample_rate, aggressiveness, frame_duration_ms=30, padding_duration_ms=600,
+                    workers=None, analysis_sample_rate=16000, crossfade_ms=10, shard_duration_ms=60000):
+    ''' Find the voiced parts of a sample buffer, see detect_speech.
+    Args:
+        samples (numpy.ndarray): float samples shaped (frames,) or (frames, channels).
+        sample_rate (int): The sample rate of the samples.
+        aggressiveness (int): The aggressiveness of the silence detector, from 0 to 3.
+        frame_duration_ms (int): The duration of each frame in milliseconds, either 10, 20 or 30.
+        padding_duration_ms (int): The duration of the sliding window in milliseconds.
+        workers (int): If more than 1, resample the analysis copy in that many processes, see analysis_copy.
+        analysis_sample_rate (int): The rate of the analysis copy, either 8000 or 16000.
+        crossfade_ms (int): The duration of the crossfade at every cut.
+        shard_duration_ms (int): The duration of the audio resampled by each task.
+    Returns:
+        segments.SegmentIndex: The voiced segments, to cut with splice_segments.
+    '''
+    ranges = detect_speech(samples, sample_rate, aggressiveness, frame_duration_ms, padding_duration_ms, workers,
+                           analysis_sample_rate, shard_duration_ms)
+    return segments.SegmentIndex.from_ranges(ranges, sample_rate, len(samples), int(sample_rate * crossfade_ms / 1000),
+                                             padding_duration_ms)
+
+
+def remove_silence(samples, sample_rate, aggressiveness, frame_duration_ms=30, padding_duration_ms=600,
+                   workers=None, analysis_sample_rate=16000, crossfade_ms=10, segment_index_path=None,
+                   shard_duration_ms=60000):
+    ''' Remove the silence audio segments from a sample buffer.
+    The silence is detected on a low-rate analysis copy, see detect_speech, and the voiced parts are cut from the
+    source itself, so the result keeps the sample rate and channels of the source.
+    Args:
+        samples (numpy.ndarray): float samples shaped (frames,) or (frames, channels).
+        sample_rate (int): The sample rate of the samples.
+        aggressiveness (int): The aggressiveness of the silence detector, from 0 to 3.
+        frame_duration_ms (int): The duration of each frame in milliseconds, either 10, 20 or 30.
+        padding_duration_ms (int): The duration of the sliding window in milliseconds.
+        workers (int): If more than 1, resample the analysis copy in that many processes, see analysis_copy.
+        analysis_sample_rate (int): The rate of the analysis copy, either 8000 or 16000.
+        crossfade_ms (int): The duration of the crossfade at every cut.
+        segment_index_path (str): If set, the segments.SegmentIndex of the cut is saved to this JSON file.
+        shard_duration_ms (int): The duration of the audio resampled by each task.
+    Returns:
+        numpy.ndarray: The voiced float samples.
+        int: The sample rate of the voiced samples.
+    '''
+    index = detect_segments(samples, sample_rate, aggressiveness, frame_duration_ms, padding_duration_ms, workers,
+                            analysis_sample_rate, crossfade_ms, shard_duration_ms)
+    if segment_index_path is not None:
+        index.save(segment_index_path)
+    return splice_segments(samples, index.ranges(), index.crossfade_samples), sample_rate
+
+
+def generate_solo_audio(input_path, output_path, aggressiveness, workers=None, crossfade_ms=10):
     ''' Remove the silence audio segments from the audio file.
-    From vocals.wav of the given podcast name, convert the audio file:
-    1. to monophonic sound
-    2. the sample rate to one of [8000, 16000, 32000, 48000]
-    3. to 16-bits format
-    The new audio file will be written into 'non-silenced' directory.
+    The silence is detected on a monophonic 16 kHz copy of the audio, and the voiced parts of the original are
+    written to a 16-bits wav file with the original sample rate and channels. The segments that were kept are
+    saved next to it, see segments.sidecar_path.
 
     Args:
         input_path (str): The path to the original audio file.
         output_path (str): The path to the new audio file.
         aggressiveness (int): The aggressiveness of the silence detector. This must be either 0, 1, 2 or 3, while 3 is
                               the most aggressive mode.
+        workers (int): If more than 1, prepare the audio for the silence detector in that many processes.
+        crossfade_ms (int): The duration of the crossfade at every cut.
+    '''
+    samples, sample_rate = audio_buffer.read_audio(input_path)
+    samples, sample_rate = remove_silence(samples, sample_rate, aggressiveness, workers=workers,
+                                          crossfade_ms=crossfade_ms,
+                                          segment_index_path=segments.sidecar_path(output_path))
+    audio_buffer.write_audio(output_path, samples, sample_rate)
+
+
+def convert_blocks_to_meet_vad(blocks, sample_rate):
+    ''' Convert sample blocks to the format that meets webrtc requirements as they arrive.
+    Args:
+        blocks (iterable(numpy.ndarray)): float samples shaped (frames,) or (frames, channels).
+        sample_rate (int): The sample rate of the blocks.
+    Yields:
+        bytes: Monophonic 16-bits pcm audio data at analysis_vad_sample_rate(sample_rate).
+    '''
+    vad_sample_rate = analysis_vad_sample_rate(sample_rate)
+    block_resampler = None
+    if sample_rate != vad_sample_rate:
+        block_resampler = resampler.BlockResampler(sample_rate, vad_sample_rate)
+    for block in blocks:
+        samples = audio_buffer.to_mono(block)
+        if block_resampler is not None:
+            samples = block_resampler.process(samples)
+        yield audio_buffer.to_pcm16(samples).tobytes()
+    if block_resampler is not None:
+        yield audio_buffer.to_pcm16(block_resampler.flush()).tobytes()
+
+
+def remove_silence_blocks(blocks, sample_rate, aggressiveness, frame_duration_ms=30, padding_duration_ms=600,
+                          output_duration_ms=1000):
+    ''' Remove the silence from audio that arrives in blocks, yielding the voiced audio as soon as it is known.
+    Only the current block, the padding ring buffer and at most output_duration_ms of voiced audio are held in
+    memory. Blocks that are not at a webrtcvad sample rate are resampled with a polyphase filter.
+    Args:
+        blocks (iterable(numpy.ndarray)): float samples shaped (frames,) or (frames, channels).
+        sample_rate (int): The sample rate of the blocks.
+        aggressiveness (int): The aggressiveness of the silence detector, from 0 to 3.
+        frame_duration_ms (int): The duration of each frame in milliseconds, either 10, 20 or 30.
+        padding_duration_ms (int): The duration of the sliding window in milliseconds.
+        output_duration_ms (int): The duration of voiced audio collected before it is yielded.
+    Yields:
+        bytes: Voiced monophonic 16-bits pcm audio data at analysis_vad_sample_rate(sample_rate).
+    '''
+    vad_sample_rate = analysis_vad_sample_rate(sample_rate)
+    vad = webrtcvad.Vad(aggressiveness)
+    trigger = SpeechTrigger(int(padding_duration_ms / frame_duration_ms))
+    frames_per_output = max(int(output_duration_ms / frame_duration_ms), 1)
+    voiced_frames = []
+    pcm_blocks = convert_blocks_to_meet_vad(blocks, sample_rate)
+    for frame in stream_frame_generator(frame_duration_ms, pcm_blocks, vad_sample_rate):
+        voiced_frames.extend(trigger.push(frame, vad.is_speech(frame.bytes, vad_sample_rate)))
+        if len(voiced_frames) >= frames_per_output:
+            yield b''.join([f.bytes for f in voiced_frames])
+            voiced_frames = []
+    if voiced_frames:
+        yield b''.join([f.bytes for f in voiced_frames])
+
+
+class BlockQueue(object):
+    ''' Sample blocks in arrival order, read by their position in the whole signal and dropped once not needed. '''
+
+    def __init__(self):
+        self.blocks = collections.deque()
+        # The positions of the first queued sample and one past the last one.
+        self.start = 0
+        self.end = 0
+
+    def append(self, block):
+        self.blocks.append(block)
+        self.end += len(block)
+
+    def read(self, start, end):
+        ''' The samples in [start, end), which must not have been dropped. '''
+        parts = []
+        offset = self.start
+        for block in self.blocks:
+            if offset >= end:
+                break
+            first, last = max(start - offset, 0), min(end - offset, len(block))
+            if last > first:
+                parts.append(block[first:last])
+            offset += len(block)
+        if not parts:
+            return np.zeros((0,) + (self.blocks[0].shape[1:] if self.blocks else ()), dtype=np.float32)
+        return np.concatenate(parts)
+
+    def drop(self, position):
+        ''' Drop the blocks that end before position. '''
+        while self.blocks and self.start + len(self.blocks[0]) <= position:
+            self.start += len(self.blocks.popleft())
+
+
+def remove_silence_stream(blocks, sample_rate, aggressiveness, frame_duration_ms=30, padding_duration_ms=600,
+                          crossfade_ms=10, output_duration_ms=1000, voiced_ranges=None):
+    ''' Remove the silence from audio that arrives in blocks, keeping its sample rate and channels.
+    Like remove_silence, speech is detected on a monophonic 16-bits analysis copy and the voiced parts are cut from
+    the blocks themselves with a crossfade at every cut. The copy is resampled block by block with
+    resampler.BlockResampler, which gives the same copy as analysis_copy, so the output is the same as the one of
+    remove_silence over the concatenated blocks. Only the blocks since the first sample a segment can still start
+    at, and output_duration_ms of voiced audio, are held in memory.
+    Args:
+        blocks (iterable(numpy.ndarray)): float samples shaped (frames,) or (frames, channels).
+        sample_rate (int): The sample rate of the blocks.
+        aggressiveness (int): The aggressiveness of the silence detector, from 0 to 3.
+        frame_duration_ms (int): The duration of each frame in milliseconds, either 10, 20 or 30.
+        padding_duration_ms (int): The duration of the sliding window in milliseconds.
+        crossfade_ms (int): The duration of the crossfade at every cut.
+        output_duration_ms (int): The duration of voiced audio collected before it is cut.
+        voiced_ranges (list): If set, the first sample and one past the last sample of every voiced segment of the
+                              blocks are appended to it, as detect_speech returns them.
+    Yields:
+        numpy.ndarray: The voiced float32 samples, with the channels of the blocks.
     '''
-    original_path = input_path
-    output_path = output_path
-    convert_wave_to_meet_vad(original_path, output_path)
-    audio, sample_rate = read_wave(output_path)
+    vad_sample_rate = analysis_vad_sample_rate(sample_rate)
     vad = webrtcvad.Vad(aggressiveness)
-    frames = frame_generator(30, audio, sample_rate)
-    frames = list(frames)
-    segments = vad_collector(sample_rate, 30, 600, vad, frames)
+    num_padding_frames = int(padding_duration_ms / frame_duration_ms)
+    trigger = SpeechTrigger(num_padding_frames)
+    # The samples of the source per frame, times vad_sample_rate, as in detect_speech.
+    scale = int(vad_sample_rate * (frame_duration_ms / 1000.0) * 2) // 2 * sample_rate
+    output_length = int(sample_rate * output_duration_ms / 1000)
+    splicer = StreamSplicer(int(sample_rate * crossfade_ms / 1000))
+    queue = BlockQueue()
+
+    def queued(blocks):
+        for block in blocks:
+            queue.append(block)
+            yield block
+
+    def position(frame):
+        return min(frame * scale // vad_sample_rate, queue.end)
 
-    concataudio = [segment for segment in segments]
+    frames = stream_frame_generator(frame_duration_ms, convert_blocks_to_meet_vad(queued(blocks), sample_rate),
+                                    vad_sample_rate)
+    segment_start = cut = None
+    index = -1
+    for index, frame in enumerate(frames):
+        changed = trigger.update(index, vad.is_speech(frame.bytes, vad_sample_rate))
+        if changed and trigger.triggered:
+            segment_start = cut = position(trigger.segment_start)
+        if cut is None:
+            # The next segment starts with the frames in the padding window at the earliest.
+            queue.drop(position(max(index + 2 - num_padding_frames, 0)))
+            continue
+        end = position(index + 1)
+        if not trigger.triggered or end - cut >= output_length:
+            output = splicer.add(queue.read(cut, end))
+            cut = end
+            if not trigger.triggered:
+                output += splicer.end_segment()
+                if voiced_ranges is not None:
+                    voiced_ranges.append((segment_start, end))
+                segment_start = cut = None
+            queue.drop(end)
+            for samples in output:
+                yield samples
+    output = []
+    if trigger.triggered:
+        # Every block is queued once the frames are exhausted.
+        end = position(index + 1)
+        output = splicer.add(queue.read(cut, end))
+        if voiced_ranges is not None:
+            voiced_ranges.append((segment_start, end))
+    for samples in output + splicer.flush():
+        yield samples
 
-    joinedaudio = b"".join(concataudio)
 
-    write_wave(output_path, joinedaudio, sample_rate)
+def generate_solo_audio_streaming(input_path, output_path, aggressiveness, frame_duration_ms=30,
+                                  padding_duration_ms=600, block_duration_ms=10000):
+    ''' Remove the silence audio segments from the audio file in constant memory.
+    The input is read in blocks and the voiced frames are written to the output as soon as they are known, so peak
+    memory does not depend on the length of the audio. Unlike generate_solo_audio, the output is the webrtcvad
+    format itself: monophonic, 16 bits and resampled with a polyphase filter to 8000 or 16000 Hz.
+
+    Args:
+        input_path (str): The path to the original audio file.
+        output_path (str): The path to the new audio file.
+        aggressiveness (int): The aggressiveness of the silence detector, from 0 to 3.
+        frame_duration_ms (int): The duration of each frame in milliseconds, either 10, 20 or 30.
+        padding_duration_ms (int): The duration of the sliding window in milliseconds.
+        block_duration_ms (int): The duration of audio read from the input at a time.
+    '''
+    with soundfile.SoundFile(input_path) as source, contextlib.closing(wave.open(output_path, 'wb')) as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(analysis_vad_sample_rate(source.samplerate))
+
+        block_size = int(source.samplerate * block_duration_ms / 1000)
+        blocks = source.blocks(blocksize=block_size, dtype='float32', always_2d=True)
+        for pcm in remove_silence_blocks(blocks, source.samplerate, aggressiveness, frame_duration_ms,
+                                         padding_duration_ms):
+            wf.writeframesraw(pcm)
@@ -1,3 +1,9 @@
+import audio_buffer
+import numpy as np
+import os
+import segments
+import soundfile
+import tempfile
 import unittest
 import vad
 import wave
@@ -5,6 +11,29 @@ import wave
 from unittest.mock import patch, ANY
 
 
+def make_speech_like_samples(sample_rate, seconds=2):
+    ''' Silence, a noisy amplitude-modulated tone, then silence again. '''
+    rng = np.random.RandomState(0)
+    time = np.arange(sample_rate * seconds) / sample_rate
+    speech = 0.5 * np.sin(2 * np.pi * 300 * time) * (1 + np.sin(2 * np.pi * 4 * time)) / 2
+    speech += 0.05 * rng.randn(len(time))
+    silence = np.zeros(sample_rate * seconds)
+    return np.concatenate([silence, speech, silence]).astype(np.float32)
+
+
+def make_noisy_speech_samples(sample_rate, seconds=20):
+    ''' Stereo bursts of a harmonic tone of changing loudness over a changing noise floor, which a webrtcvad
+    started in the middle of it classifies differently from one that saw it from the start.
+    '''
+    rng = np.random.RandomState(1)
+    time = np.arange(sample_rate * seconds) / sample_rate
+    envelope = (np.sin(2 * np.pi * 0.37 * time) + np.sin(2 * np.pi * 1.3 * time + 1) > 0.3) * 0.4
+    tone = np.sin(2 * np.pi * (200 + 80 * np.sin(2 * np.pi * 3 * time)) * time) * (1 + np.sin(2 * np.pi * 5 * time)) / 2
+    noise = (0.02 + 0.03 * np.abs(np.sin(2 * np.pi * 0.05 * time))) * rng.randn(len(time))
+    mono = envelope * tone + noise
+    return np.stack([mono, 0.8 * mono], axis=1).astype(np.float32)
+
+
 class TestVad(unittest.TestCase):
     def test_read_wave(self):
         test_audio_path = 'test_data/test.wav'
@@ -108,6 +137,19 @@ class TestVad(unittest.TestCase):
         self.assertEqual(expected_sample_width, sample_width)
         self.assertEqual(expected_num_channels, num_channels)
 
+    def test_convert_to_mono_in_place(self):
+        samples = np.stack([np.linspace(-0.5, 0.5, 16000), np.zeros(16000)], axis=1)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'stereo.wav')
+            soundfile.write(path, samples, 16000, subtype='PCM_16')
+
+            vad.convert_to_mono(path, path)
+            converted, sample_rate = soundfile.read(path)
+
+        self.assertEqual(16000, sample_rate)
+        self.assertEqual((16000,), converted.shape)
+        np.testing.assert_allclose(samples[:, 0] / 2, converted, atol=1e-4)
+
     def test_convert_to_mono_invalid_input_path(self):
         invalid_input_path = 'invalid/file/path.wav'
         valid_output_path = 'test_data/valid_output.wav'
@@ -129,3 +171,225 @@ class TestVad(unittest.TestCase):
         with patch('librosa.output.write_wav', return_value=1) as mock_write_wav:
             vad.resample_wave(test_audio_path, output_audio_path)
             mock_write_wav.assert_called_once_with(output_audio_path, ANY, expected_sample_rate)
+
+    def test_closest_vad_sample_rate(self):
+        self.assertEqual(16000, vad.closest_vad_sample_rate(22050))
+        self.assertEqual(48000, vad.closest_vad_sample_rate(44100))
+        self.assertEqual(8000, vad.closest_vad_sample_rate(8000))
+
+    def test_convert_samples_to_meet_vad(self):
+        samples = np.zeros((44100, 2), dtype=np.float32)
+        pcm, sample_rate = vad.convert_samples_to_meet_vad(samples, 44100)
+
+        self.assertEqual(16000, sample_rate)
+        self.assertEqual(np.int16, pcm.dtype)
+        self.assertEqual(1, pcm.ndim)
+        self.assertAlmostEqual(16000, len(pcm), delta=1)
+
+    def test_analysis_vad_sample_rate(self):
+        self.assertEqual(16000, vad.analysis_vad_sample_rate(44100))
+        self.assertEqual(16000, vad.analysis_vad_sample_rate(16000))
+        self.assertEqual(8000, vad.analysis_vad_sample_rate(8000))
+        self.assertEqual(8000, vad.analysis_vad_sample_rate(48000, 8000))
+
+    def test_remove_silence(self):
+        sample_rate = 16000
+        samples = make_speech_like_samples(sample_rate)
+
+        voiced, voiced_sample_rate = vad.remove_silence(samples, sample_rate, 3)
+
+        self.assertEqual(sample_rate, voiced_sample_rate)
+        self.assertGreater(len(voiced), 0)
+        self.assertLess(len(voiced), len(samples) - sample_rate)
+
+    def test_stream_frame_generator(self):
+        audio = bytes(range(256)) * 40
+        blocks = [audio[i:i + 333] for i in range(0, len(audio), 333)]
+        expected_frames = list(vad.frame_generator(10, audio, 8000))
+        frames = list(vad.stream_frame_generator(10, blocks, 8000))
+
+        self.assertEqual([f.bytes for f in expected_frames], [f.bytes for f in frames])
+        self.assertEqual([f.timestamp for f in expected_frames], [f.timestamp for f in frames])
+
+    def test_generate_solo_audio_streaming(self):
+        sample_rate = 16000
+        with tempfile.TemporaryDirectory() as directory:
+            input_path = os.path.join(directory, 'input.wav')
+            expected_path = os.path.join(directory, 'expected.wav')
+            output_path = os.path.join(directory, 'output.wav')
+            soundfile.write(input_path, make_speech_like_samples(sample_rate), sample_rate, subtype='PCM_16')
+
+            # A monophonic 16 kHz input is its own analysis copy, so without crossfades both cut the same samples.
+            vad.generate_solo_audio(input_path, expected_path, 3, crossfade_ms=0)
+            vad.generate_solo_audio_streaming(input_path, output_path, 3, block_duration_ms=250)
+            expected_pcm, expected_sample_rate = vad.read_wave(expected_path)
+            pcm, output_sample_rate = vad.read_wave(output_path)
+
+        self.assertEqual(expected_sample_rate, output_sample_rate)
+        self.assertGreater(len(pcm), 0)
+        self.assertEqual(expected_pcm, pcm)
+
+    def test_frame_index(self):
+        audio = np.arange(1000, dtype=np.int16).tobytes()
+        expected_frames = list(vad.frame_generator(10, audio, 16000))
+        frame_index = vad.FrameIndex(audio, 16000, 10)
+
+        self.assertEqual(len(expected_frames), len(frame_index))
+        for index, frame in enumerate(expected_frames):
+            self.assertEqual(frame.bytes, frame_index.frame_bytes[index].tobytes())
+            self.assertAlmostEqual(frame.timestamp, frame_index.timestamp(index))
+        self.assertEqual(expected_frames[1].bytes + expected_frames[2].bytes, frame_index.samples(1, 3).tobytes())
+
+    def test_speech_trigger(self):
+        trigger = vad.SpeechTrigger(4)
+        self.assertFalse(any(trigger.update(index, True) for index in range(3)))
+        self.assertTrue(trigger.update(3, True))
+        self.assertTrue(trigger.triggered)
+        self.assertEqual(0, trigger.segment_start)
+        self.assertEqual([0, 1, 2, 3], trigger.triggered_frames)
+        self.assertFalse(any(trigger.update(index, False) for index in range(4, 7)))
+        self.assertTrue(trigger.update(7, False))
+        self.assertFalse(trigger.triggered)
+
+    def test_collect_segments(self):
+        sample_rate = 16000
+        pcm = (make_speech_like_samples(sample_rate) * 32767).astype(np.int16)
+        frames = vad.frame_generator(30, pcm.tobytes(), sample_rate)
+        with patch('sys.stdout'):
+            expected_segments = list(vad.vad_collector(sample_rate, 30, 600, vad.webrtcvad.Vad(3), frames))
+
+        frame_index = vad.FrameIndex(pcm, sample_rate, 30)
+        segments = [frame_index.samples(start, end).tobytes()
+                    for start, end in vad.collect_segments(vad.webrtcvad.Vad(3), frame_index, 600)]
+
+        self.assertGreater(len(segments), 0)
+        self.assertEqual(expected_segments, segments)
+
+    def test_segments_from_decisions(self):
+        decisions = [False] * 3 + [True] * 6 + [False] * 6 + [True] * 4
+        self.assertEqual([(3, 13), (15, 19)], list(vad.segments_from_decisions(decisions, 4)))
+        self.assertEqual([], list(vad.segments_from_decisions([], 4)))
+
+    def test_analysis_copy(self):
+        sample_rate = 44100
+        samples = make_noisy_speech_samples(sample_rate, 5)
+
+        analysis = vad.analysis_copy(samples, sample_rate, 16000)
+        # 1.5 s shards split the 5 s signal between four tasks.
+        sharded = vad.analysis_copy(samples, sample_rate, 16000, workers=2, shard_duration_ms=1500)
+
+        self.assertEqual(np.int16, analysis.dtype)
+        self.assertEqual(80000, len(analysis))
+        np.testing.assert_array_equal(analysis, sharded)
+        np.testing.assert_array_equal(audio_buffer.to_pcm16(samples.mean(axis=1)),
+                                      vad.analysis_copy(samples, 16000, 16000))
+
+    def test_detect_speech_with_workers(self):
+        sample_rate = 44100
+        samples = make_noisy_speech_samples(sample_rate)
+        frame_index = vad.FrameIndex(vad.analysis_copy(samples, sample_rate, 16000), 16000, 30)
+        expected_ranges = [(start * 1323, min(end * 1323, len(samples)))
+                           for start, end in vad.collect_segments(vad.webrtcvad.Vad(1), frame_index, 600)]
+
+        ranges = vad.detect_speech(samples, sample_rate, 1, workers=2, shard_duration_ms=1500)
+
+        self.assertGreater(len(expected_ranges), 1)
+        self.assertEqual(expected_ranges, ranges)
+        self.assertEqual(expected_ranges, vad.detect_speech(samples, sample_rate, 1))
+
+    def test_remove_silence_keeps_source_format(self):
+        sample_rate = 44100
+        mono = make_speech_like_samples(sample_rate)
+        samples = np.stack([mono, 0.5 * mono], axis=1)
+
+        voiced, voiced_sample_rate = vad.remove_silence(samples, sample_rate, 1)
+
+        self.assertEqual(sample_rate, voiced_sample_rate)
+        self.assertEqual(2, voiced.shape[1])
+        self.assertGreater(len(voiced), 0)
+        self.assertLess(len(voiced), len(samples) - sample_rate)
+        np.testing.assert_allclose(0.5 * voiced[:, 0], voiced[:, 1])
+
+    def test_generate_solo_audio_segment_index(self):
+        sample_rate = 16000
+        with tempfile.TemporaryDirectory() as directory:
+            input_path = os.path.join(directory, 'input.wav')
+            output_path = os.path.join(directory, 'output.wav')
+            soundfile.write(input_path, make_speech_like_samples(sample_rate), sample_rate, subtype='PCM_16')
+            vad.generate_solo_audio(input_path, output_path, 1)
+            index = segments.SegmentIndex.load(os.path.join(directory, 'output.segments.json'))
+            info = soundfile.info(output_path)
+
+        self.assertEqual(sample_rate, index.sample_rate)
+        self.assertEqual(sample_rate * 6, index.source_length)
+        self.assertEqual(160, index.crossfade_samples)
+        self.assertEqual(info.frames, index.output_length())
+        self.assertGreater(index.speech_ratio(), 0.3)
+        self.assertLess(index.speech_ratio(), 0.6)
+
+    def test_detect_speech(self):
+        sample_rate = 44100
+        samples = make_speech_like_samples(sample_rate)
+        for analysis_sample_rate in (8000, 16000):
+            segments = vad.detect_speech(samples, sample_rate, 1, analysis_sample_rate=analysis_sample_rate)
+            self.assertEqual(1, len(segments))
+            start, end = segments[0]
+            # The tone lasts from 2 to 4 seconds, the padding adds up to 0.6 seconds on each side.
+            self.assertLessEqual(start, 2 * sample_rate)
+            self.assertGreaterEqual(end, 4 * sample_rate)
+            self.assertLessEqual(end, len(samples))
+
+    def test_splice_segments(self):
+        samples = np.ones((100, 2), dtype=np.float32)
+        samples[50:] = -1
+        spliced = vad.splice_segments(samples, [(0, 30), (60, 100), (100, 100)], 10)
+
+        self.assertEqual((60, 2), spliced.shape)
+        self.assertTrue((spliced[:20] == 1).all())
+        self.assertTrue((spliced[30:] == -1).all())
+        # The crossfade moves monotonically from the first segment to the second.
+        self.assertTrue((np.diff(spliced[20:30, 0]) < 0).all())
+        self.assertEqual(0, len(vad.splice_segments(samples, [], 10)))
+        np.testing.assert_array_equal(samples[10:20], vad.splice_segments(samples, [(10, 15), (15, 20)], 0))
+
+    def test_stream_splicer(self):
+        samples = np.random.RandomState(0).randn(1000, 2).astype(np.float32)
+        ranges = [(0, 300), (305, 310), (400, 700), (700, 1000)]
+        splicer = vad.StreamSplicer(20)
+        pieces = []
+        for start, end in ranges:
+            # The segments arrive in pieces shorter than the crossfade.
+            for piece_start in range(start, end, 7):
+                pieces += splicer.add(samples[piece_start:min(piece_start + 7, end)])
+            pieces += splicer.end_segment()
+        pieces += splicer.flush()
+
+        np.testing.assert_array_equal(vad.splice_segments(samples, ranges, 20), np.concatenate(pieces))
+
+    def test_remove_silence_stream(self):
+        sample_rate = 44100
+        samples = make_noisy_speech_samples(sample_rate)
+        expected_voiced, _ = vad.remove_silence(samples, sample_rate, 1)
+
+        voiced_ranges = []
+        blocks = (samples[start:start + 30000] for start in range(0, len(samples), 30000))
+        voiced = np.concatenate(list(vad.remove_silence_stream(blocks, sample_rate, 1, voiced_ranges=voiced_ranges)))
+
+        self.assertGreater(len(voiced_ranges), 1)
+        self.assertEqual(vad.detect_speech(samples, sample_rate, 1), voiced_ranges)
+        self.assertEqual(expected_voiced.shape, voiced.shape)
+        np.testing.assert_array_equal(expected_voiced, voiced)
+        self.assertEqual([], list(vad.remove_silence_stream([], sample_rate, 1)))
+
+    def test_remove_silence_with_workers(self):
+        sample_rate = 44100
+        samples = make_noisy_speech_samples(sample_rate)
+
+        expected_voiced, _ = vad.remove_silence(samples, sample_rate, 1)
+        # Shards far shorter than the 20 s signal, so the workers resample several of them.
+        voiced, voiced_sample_rate = vad.remove_silence(samples, sample_rate, 1, workers=2, shard_duration_ms=1500)
+
+        self.assertEqual(sample_rate, voiced_sample_rate)
+        self.assertGreater(len(voiced), 0)
+        self.assertEqual(expected_voiced.shape, voiced.shape)
+        self.assertTrue((expected_voiced == voiced).all())